@@ -0,0 +1 @@
+"""Performance benchmarks for tracker. Run with 'python -m benchmarks.run'."""
@@ -0,0 +1,133 @@
+"""Durability benchmark. Appends finished timings from a pool of threads
+spread over a few tasks, like many users stopping the same labels on a
+server, under each durability mode. Reports the throughput and the latency
+percentiles of one append, plus how many fsync rounds the group commit
+needed.
+
+    python -m benchmarks.durability --threads 16 --appends 200
+    python -m benchmarks.durability --modes batched --window-ms 0 1 5
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from benchmarks.load_server import percentile
+from tracker import durability
+from tracker.config import Config
+from tracker.store import TextStore
+
+DEFAULT_REPORT = Path("benchmarks/results/durability.json")
+
+
+def run_mode(
+    base_path: Path,
+    mode: str,
+    window: float,
+    threads: int,
+    appends: int,
+    tasks: int,
+) -> dict[str, float]:
+    """Times threads * appends appends to tasks tasks of a fresh
+    project"""
+    config = Config(base_path)
+    store = TextStore(config.current_project, durability_mode=mode)
+    committer = durability.group_commit(window)
+    syncs = committer.syncs
+    latencies: list[list[float]] = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(number: int) -> None:
+        task = f"_{number % tasks}"
+        barrier.wait()
+        for _ in range(appends):
+            start = time.perf_counter()
+            now = time.time()
+            store.append(task, f"{now}:{now}:0.0")
+            latencies[number].append(time.perf_counter() - start)
+
+    # The store picks its group commit by TRACKER_GROUP_COMMIT_MS.
+    os.environ[durability.GROUP_COMMIT_ENV] = str(window * 1000)
+    pool = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    config.delete()
+
+    ordered = sorted(latency for part in latencies for latency in part)
+    return {
+        "appends": len(ordered),
+        "throughput": len(ordered) / elapsed,
+        "p50": percentile(ordered, 0.50),
+        "p99": percentile(ordered, 0.99),
+        "syncs": committer.syncs - syncs if mode == "batched" else 0,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--appends", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=2)
+    parser.add_argument(
+        "--modes", nargs="+", default=list(durability.DURABILITY_MODES)
+    )
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        nargs="+",
+        default=[durability.DEFAULT_GROUP_COMMIT_MS],
+        help="group-commit windows to try under batched",
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_REPORT)
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'mode':16} {'appends/s':>10} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'syncs':>6}"
+    )
+    report = {}
+    home = Path(tempfile.mkdtemp(prefix="tracker-durability-"))
+    try:
+        for mode in args.modes:
+            windows = args.window_ms if mode == "batched" else [0.0]
+            for window_ms in windows:
+                name = f"{mode}@{window_ms:g}ms" if mode == "batched" else mode
+                report[name] = stats = run_mode(
+                    home / ".tracker",
+                    mode,
+                    window_ms / 1000,
+                    args.threads,
+                    args.appends,
+                    args.tasks,
+                )
+                print(
+                    f"{name:16} {stats['throughput']:10.1f}"
+                    f" {stats['p50'] * 1000:8.2f} {stats['p99'] * 1000:8.2f}"
+                    f" {stats['syncs']:6}"
+                )
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as wfile:
+        json.dump(report, wfile, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Synthetic data generator. Builds projects in tracker's on-disk format
+without going through LocalTimer, so large projects take seconds."""
+
+from __future__ import annotations
+import random
+import time
+from pathlib import Path
+from tracker.config import Config, Project
+from tracker.labels import LabelDictionary
+
+# Generated intervals are spread over the year before "now".
+HISTORY_SECS = 365 * 24 * 3600
+
+
+def generate_project(
+    project: Project,
+    tasks: int,
+    intervals: int,
+    users: int = 0,
+    active: int = 0,
+    seed: int = 0,
+) -> None:
+    """Fills a project with tasks x intervals finished timings, spread
+    across users (users=0 writes the single-user local format) and
+    leaves the first `active` tasks running."""
+    rng = random.Random(seed)
+    if not project.exists():
+        project.create()
+    labels = LabelDictionary(project)
+    user_names = [f"user{index}" for index in range(users)]
+    now = time.time()
+    step = HISTORY_SECS / max(intervals, 1)
+    for index in range(tasks):
+        lines = []
+        for interval in range(intervals):
+            start = now - HISTORY_SECS + interval * step + rng.random() * step
+            duration = rng.uniform(0.05, 0.5) * min(step, 4 * 3600)
+            user = f";{rng.choice(user_names)}" if users else ""
+            lines.append(f"{start}:{start + duration}:{duration}{user}\n")
+        task_stem = labels.stem(f"task{index}", create=True)
+        path = project.finished_timers_path / f"{task_stem}.txt"
+        with open(path, "w", encoding="utf-8") as wfile:
+            wfile.writelines(lines)
+        labels.mark_finished(task_stem)
+
+    for index in range(active):
+        user = f";{user_names[0]}" if users else ""
+        task_stem = labels.stem(f"task{index}", create=True)
+        path = project.active_timers_path / f"{task_stem}.txt"
+        with open(path, "w", encoding="utf-8") as wfile:
+            wfile.write(f"{now}{user}\n")
+
+
+def generate_home(
+    base_path: Path,
+    projects: int,
+    tasks: int,
+    intervals: int,
+    users: int = 0,
+    seed: int = 0,
+) -> Config:
+    """Creates a tracker home with `projects` generated projects, the first
+    of which ("default") is the current one."""
+    config = Config(base_path)
+    for index in range(projects):
+        name = "default" if index == 0 else f"project{index}"
+        generate_project(
+            Project(name, config),
+            tasks,
+            intervals,
+            users=users,
+            seed=seed + index,
+        )
+    return config
@@ -0,0 +1,230 @@
+"""HTTP load generator for tracker.server. Starts the server in-process on
+an ephemeral localhost port with a throwaway data directory, creates
+projects and drives a weighted mix of API routes from a pool of client
+threads, then reports throughput and latency percentiles per route.
+
+    python -m benchmarks.load_server --clients 16 --requests 5000
+    python -m benchmarks.load_server --mix start=2,stop=2,tasks=1,times=1
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+from requests.auth import HTTPBasicAuth
+from werkzeug.serving import make_server
+from tracker.durability import DURABILITY_MODES
+
+ROUTES = ("init", "start", "stop", "tasks", "times")
+DEFAULT_MIX = "init=0.1,start=4,stop=4,tasks=1,times=1"
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parses 'route=weight,...' into a dict"""
+    mix = {}
+    for item in text.split(","):
+        route, _, weight = item.partition("=")
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ServerThread:
+    """Runs tracker.server's Flask app on 127.0.0.1:<ephemeral port>"""
+
+    def __init__(self, data_path: Path, durability: str | None = None):
+        os.environ.setdefault("SECRET_KEY", "load-test-secret")
+        # Imported late so the environment is set first.
+        from tracker.server import __main__ as server
+
+        server.SERVER_CONFIG_ROOT = data_path
+        if durability is not None:
+            server.SERVER_DURABILITY = durability
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.thread.join()
+
+
+class Client:
+    """One simulated user of one project"""
+
+    def __init__(self, url: str, key: str, user: str, labels: int):
+        self.url = url
+        self.user = user
+        self.auth = HTTPBasicAuth(key, "")
+        self.labels = [f"task{index}" for index in range(labels)]
+        self.running: set[str] = set()
+        self.session = requests.Session()
+
+    def request(self, route: str) -> tuple[str, bool]:
+        """Performs one request, returning the route actually used and
+        whether the server reported success"""
+        if route == "start" and len(self.running) == len(self.labels):
+            route = "stop"
+        elif route == "stop" and not self.running:
+            route = "start"
+
+        if route == "init":
+            response = self.session.post(
+                self.url + "/api/init",
+                data={"project": f"extra{random.random()}", "username": "x"},
+            )
+            return route, response.ok
+        if route in ("tasks", "times"):
+            response = self.session.get(
+                f"{self.url}/api/{route}", auth=self.auth
+            )
+            return route, response.ok and response.json()["result"] == "ok"
+
+        if route == "start":
+            label = random.choice(
+                [label for label in self.labels if label not in self.running]
+            )
+            self.running.add(label)
+        else:
+            label = random.choice(sorted(self.running))
+            self.running.discard(label)
+        response = self.session.post(
+            f"{self.url}/api/{route}",
+            auth=self.auth,
+            data={"label": label, "user": self.user},
+        )
+        return route, response.ok and response.json()["result"] == "ok"
+
+
+def run_load(args: argparse.Namespace, url: str) -> dict:
+    """Creates the projects and runs the configured load against url"""
+    mix = parse_mix(args.mix)
+    routes, weights = list(mix), list(mix.values())
+
+    clients = []
+    for index in range(args.projects):
+        key = requests.post(
+            url + "/api/init",
+            data={"project": f"project{index}", "username": "user0"},
+        ).json()["key"]
+        for user in range(args.users):
+            clients.append(Client(url, key, f"user{user}", args.labels))
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    # A client is not thread safe, so each worker owns a slice of them.
+    slices = [clients[index :: args.clients] for index in range(args.clients)]
+    per_worker = args.requests // args.clients
+
+    def worker(owned: list[Client]) -> None:
+        rng = random.Random()
+        local: dict[str, list[float]] = defaultdict(list)
+        local_errors: dict[str, int] = defaultdict(int)
+        for _ in range(per_worker):
+            client = rng.choice(owned)
+            start = time.perf_counter()
+            try:
+                route, ok = client.request(rng.choices(routes, weights)[0])
+            except requests.RequestException:
+                route, ok = "connection", False
+            local[route].append(time.perf_counter() - start)
+            if not ok:
+                local_errors[route] += 1
+        with lock:
+            for route, times in local.items():
+                latencies[route].extend(times)
+            for route, count in local_errors.items():
+                errors[route] += count
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(worker, [owned for owned in slices if owned]))
+    elapsed = time.perf_counter() - began
+
+    report: dict = {"elapsed": elapsed, "routes": {}}
+    total = 0
+    for route, times in sorted(latencies.items()):
+        times.sort()
+        total += len(times)
+        report["routes"][route] = {
+            "requests": len(times),
+            "errors": errors[route],
+            "throughput": len(times) / elapsed,
+            "p50": percentile(times, 0.50),
+            "p95": percentile(times, 0.95),
+            "p99": percentile(times, 0.99),
+        }
+    report["throughput"] = total / elapsed
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--labels", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--durability", choices=DURABILITY_MODES)
+    args = parser.parse_args(argv)
+
+    data_path = Path(tempfile.mkdtemp(prefix="tracker-load-"))
+    try:
+        server_path = data_path / ".tracker-server"
+        with ServerThread(server_path, args.durability) as server:
+            report = run_load(args, server.url)
+    finally:
+        shutil.rmtree(data_path)
+
+    print(
+        f"{'route':12} {'requests':>9} {'errors':>7} {'req/s':>9}"
+        f" {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:12} {stats['requests']:9} {stats['errors']:7}"
+            f" {stats['throughput']:9.1f} {stats['p50'] * 1000:8.2f}"
+            f" {stats['p95'] * 1000:8.2f} {stats['p99'] * 1000:8.2f}"
+        )
+    print(f"total: {report['throughput']:.1f} req/s")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as wfile:
+            json.dump(report, wfile, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
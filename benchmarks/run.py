@@ -0,0 +1,209 @@
+"""Benchmark runner. Times the timer, config, backup and CLI code paths
+against generated projects and writes a JSON report, optionally comparing
+it with a stored baseline report.
+
+    python -m benchmarks.run --tasks 50 --intervals 2000 --users 10
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+from benchmarks.generate import generate_home
+from tracker import parallel
+from tracker.cli import BackupCommand, RestoreCommand
+from tracker.config import Config
+from tracker.store import MemoryStore
+from tracker.timer import LocalTimer
+
+DEFAULT_REPORT = Path("benchmarks/results/latest.json")
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Calls func `repeat` times and summarises the wall times"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "runs": repeat,
+    }
+
+
+def quietly(func: Callable[[], object]) -> Callable[[], object]:
+    """Drops whatever a command prints while it is being timed"""
+
+    def wrapper():
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")
+        try:
+            return func()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    return wrapper
+
+
+def run_suite(args: argparse.Namespace, home: Path) -> dict[str, dict]:
+    """Generates a tracker home under `home` and times every benchmark"""
+    base_path = home / ".tracker"
+    config = generate_home(
+        base_path,
+        args.projects,
+        args.tasks,
+        args.intervals,
+        users=args.users,
+        seed=args.seed,
+    )
+    timer = LocalTimer(config.current_project)
+    # The same timings in memory, for the storage-independent cost
+    memory = LocalTimer(
+        config.current_project, store=MemoryStore.copy_of(timer.store)
+    )
+    results = {}
+
+    def startstop(timer=timer):
+        timer.start("benchtask")
+        timer.stop("benchtask")
+
+    # The pool is used regardless of size here, on every core.
+    files = {
+        path.stem: path
+        for path in config.current_project.finished_timers_path.iterdir()
+    }
+
+    cases: list[tuple[str, Callable[[], object], int]] = [
+        ("config.init", lambda: Config(base_path), args.repeat),
+        ("timer.tasks", timer.tasks, args.repeat),
+        ("timer.summary", timer.summary, args.repeat),
+        ("timer.details", timer.details, args.repeat),
+        (
+            "parallel.summary",
+            lambda: parallel.task_totals(files),
+            args.repeat,
+        ),
+        ("timer.startstop", startstop, args.repeat),
+        ("memory.summary", memory.summary, args.repeat),
+        ("memory.details", memory.details, args.repeat),
+        ("memory.startstop", lambda: startstop(memory), args.repeat),
+        ("cli.backup", quietly(lambda: BackupCommand(config).run([])), 3),
+        ("cli.restore", quietly(lambda: RestoreCommand(config).run([])), 3),
+    ]
+    env = dict(os.environ, HOME=str(home))
+    for command in ("tasks", "summary", "details"):
+        argv = [sys.executable, "-m", "tracker", command]
+        cases.append(
+            (
+                f"cli.{command}",
+                lambda argv=argv: subprocess.run(
+                    argv, env=env, check=True, stdout=subprocess.DEVNULL
+                ),
+                args.repeat,
+            )
+        )
+
+    for name, func, repeat in cases:
+        if args.only and not any(name.startswith(o) for o in args.only):
+            continue
+        results[name] = measure(func, repeat)
+        print(f"{name:20} {results[name]['median'] * 1000:10.2f} ms")
+    return results
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints median ratios against the baseline and returns the names of
+    benchmarks that got slower by more than `tolerance`"""
+    regressions = []
+    print()
+    print(f"{'benchmark':20} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["median"]
+        after = result["median"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  <-- slower"
+        print(
+            f"{name:20} {before * 1000:8.2f}ms {after * 1000:8.2f}ms"
+            f" {ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--intervals", type=int, default=500)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", nargs="*", help="only run benchmarks with these prefixes"
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_REPORT)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="slowdown ratio allowed before a benchmark counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    home = Path(tempfile.mkdtemp(prefix="tracker-bench-"))
+    try:
+        results = run_suite(args, home)
+    finally:
+        shutil.rmtree(home)
+
+    report = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            "projects": args.projects,
+            "tasks": args.tasks,
+            "intervals": args.intervals,
+            "users": args.users,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as wfile:
+        json.dump(report, wfile, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as rfile:
+            baseline = json.load(rfile)
+        if baseline["parameters"] != report["parameters"]:
+            print("WARNING: baseline was run with different parameters.")
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Aggregation module. Per-task and per-(task, user) totals of a
+TimingTable, vectorized with NumPy when it is installed and plain Python
+otherwise."""
+
+from __future__ import annotations
+from tracker.table import TimingTable
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, see setup.py's "fast" extra
+    np = None
+
+# Below this many timings, building arrays costs more than it saves.
+NUMPY_MIN_TIMINGS = 1024
+
+
+def use_numpy(count: int) -> bool:
+    """Whether to take the NumPy path for this many timings"""
+    return np is not None and count >= NUMPY_MIN_TIMINGS
+
+
+def task_totals(
+    table: TimingTable, truncate: bool = False
+) -> dict[str, float]:
+    """Sums the durations of each task. With truncate, every duration is
+    cut to whole seconds before summing and the totals are ints."""
+    if not use_numpy(len(table)):
+        sums = [0] * len(table.tasks) if truncate else [0.0] * len(table.tasks)
+        for task, duration in zip(table.task_codes, table.durations):
+            sums[task] += int(duration) if truncate else duration
+        return dict(zip(table.tasks, sums))
+
+    # The array columns are shared with NumPy, not copied.
+    values = np.frombuffer(table.durations, dtype=np.float64)
+    if truncate:
+        values = np.trunc(values)
+    codes = np.frombuffer(table.task_codes, dtype=np.uint32)
+    sums = np.bincount(codes, weights=values, minlength=len(table.tasks))
+    if truncate:
+        return {task: int(total) for task, total in zip(table.tasks, sums)}
+    return {task: float(total) for task, total in zip(table.tasks, sums)}
+
+
+def user_totals(
+    table: TimingTable,
+) -> dict[str, tuple[float, dict[str, float]]]:
+    """Total time of each task, plus the time of each user within it.
+    Users are listed in the order they first appear in a task."""
+    if not use_numpy(len(table)):
+        result = {task: (0.0, {}) for task in table.tasks}
+        task_times = [0.0] * len(table.tasks)
+        entries = [result[task][1] for task in table.tasks]
+        for task, user, duration in zip(
+            table.task_codes, table.user_codes, table.durations
+        ):
+            name = table.users[user]
+            entries[task][name] = entries[task].get(name, 0) + duration
+            task_times[task] += duration
+        return {
+            task: (task_times[code], entries[code])
+            for code, task in enumerate(table.tasks)
+        }
+
+    durations = np.frombuffer(table.durations, dtype=np.float64)
+    tasks = np.frombuffer(table.task_codes, dtype=np.uint32).astype(np.int64)
+    pairs = tasks * len(table.users) + np.frombuffer(
+        table.user_codes, dtype=np.uint32
+    )
+    keys, first, codes = np.unique(
+        pairs, return_index=True, return_inverse=True
+    )
+    sums = np.bincount(codes, weights=durations, minlength=len(keys))
+    task_times = np.bincount(
+        tasks, weights=durations, minlength=len(table.tasks)
+    )
+    result = {
+        task: (float(task_times[code]), {})
+        for code, task in enumerate(table.tasks)
+    }
+    for index in np.argsort(first, kind="stable"):
+        task, user = divmod(int(keys[index]), len(table.users))
+        result[table.tasks[task]][1][table.users[user]] = float(sums[index])
+    return result
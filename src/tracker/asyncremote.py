@@ -0,0 +1,275 @@
+"""Async remote module. An asyncio variant of RemoteTimer, so commands that
+touch several remote projects or endpoints wait for the slowest round trip
+instead of the sum of them. Requests go through a transport: StreamTransport
+speaks HTTP/1.1 over asyncio streams, and tests or benchmarks can plug in a
+stand-in. Fan-out helpers run many calls with bounded parallelism."""
+
+from __future__ import annotations
+import asyncio
+import base64
+import json
+from typing import Awaitable, Callable, Protocol
+from urllib.parse import urlencode, urlsplit
+from tracker.config import Config, Project
+from tracker.stats import QuantileSketch
+from tracker.table import TimingTable
+from tracker.timer import TimerException, table_summary
+from tracker.tracing import inject
+
+# Requests in flight at once, per fan-out
+REMOTE_LIMIT = 8
+TIMEOUT_SECS = 3
+
+
+class Transport(Protocol):
+    """Sends one HTTP request and returns its status and body"""
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        key: str,
+        params: dict | None = None,
+        data: dict | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, bytes]:
+        ...
+
+
+def _query(values: dict | None) -> str:
+    """URL-encoded values, leaving out the None ones like requests does"""
+    values = {k: v for k, v in (values or {}).items() if v is not None}
+    return urlencode(values)
+
+
+class MalformedResponse(ConnectionError):
+    """The server closed the connection mid-response or sent something
+    that is not HTTP"""
+
+
+class StreamTransport:
+    """HTTP/1.1 over asyncio streams, one connection per request"""
+
+    def __init__(self, timeout: float = TIMEOUT_SECS):
+        self.timeout = timeout
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        key: str,
+        params: dict | None = None,
+        data: dict | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, bytes]:
+        return await asyncio.wait_for(
+            self._request(method, url, key, params, data, headers),
+            self.timeout,
+        )
+
+    async def _request(self, method, url, key, params, data, headers):
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        target = parts.path or "/"
+        if _query(params):
+            target += "?" + _query(params)
+        body = _query(data).encode("ascii")
+        auth = base64.b64encode(f"{key}:".encode("utf-8")).decode("ascii")
+        lines = [
+            f"{method} {target} HTTP/1.1",
+            f"Host: {parts.netloc}",
+            f"Authorization: Basic {auth}",
+            "Accept: application/json",
+            "Connection: close",
+            f"Content-Length: {len(body)}",
+        ]
+        if data is not None:
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        lines.extend(
+            f"{name}: {value}" for name, value in (headers or {}).items()
+        )
+        head = "".join(line + "\r\n" for line in lines) + "\r\n"
+
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=secure or None
+        )
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            return await self._read_response(reader)
+        except (IndexError, ValueError, asyncio.IncompleteReadError) as exc:
+            raise MalformedResponse(
+                f"Malformed response from {parts.netloc}"
+            ) from exc
+        finally:
+            writer.close()
+
+    async def _read_response(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[int, bytes]:
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get("transfer-encoding") == "chunked":
+            content = await self._read_chunked(reader)
+        elif "content-length" in response_headers:
+            length = int(response_headers["content-length"])
+            content = await reader.readexactly(length)
+        else:
+            content = await reader.read()
+        return status, content
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        return b"".join(chunks)
+
+
+class AsyncRemoteTimer:
+    """RemoteTimer's API as coroutines"""
+
+    def __init__(self, project: Project, transport: Transport | None = None):
+        self.project = project
+        self.transport = transport or StreamTransport()
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> dict:
+        """Sends a request to the project's server and returns the JSON
+        response, raising TimerException for errors"""
+        try:
+            status, body = await self.transport.request(
+                method,
+                f"{self.project.url}/api/{endpoint}",
+                self.project.key,
+                headers=inject(),
+                **kwargs,
+            )
+        except MalformedResponse:
+            raise TimerException("The remote server sent a broken response.")
+        except (OSError, asyncio.TimeoutError):
+            raise TimerException("Could not connect to remote server.")
+        if not 200 <= status < 300:
+            raise TimerException("A request to the remote server failed.")
+        try:
+            response = json.loads(body)
+        except ValueError:
+            raise TimerException("The remote server sent a broken response.")
+        if response.get("result") == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {response['type']}"
+            )
+        return response
+
+    async def start(self, task: str) -> None:
+        """Remote start"""
+        payload = {"label": task, "user": self.project.user}
+        await self._request("POST", "start", data=payload)
+
+    async def stop(self, task: str) -> None:
+        """Remote stop"""
+        payload = {"label": task, "user": self.project.user}
+        await self._request("POST", "stop", data=payload)
+
+    async def tasks(self) -> tuple[list[str], list[str]]:
+        """Remote tasks"""
+        response = await self._request("GET", "tasks")
+        return response["active"], response["finished"]
+
+    async def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Remote timings table"""
+        params = {"format": "table", "since": since, "until": until}
+        response = await self._request("GET", "times", params=params)
+        return TimingTable.from_dict(response["table"])
+
+    async def summary(self) -> dict[str, dict[str, float]]:
+        """Remote summary"""
+        return table_summary(await self.table())
+
+    async def details(
+        self, since: float | None = None, until: float | None = None
+    ) -> dict[str, list[tuple[float, str]]]:
+        """Remote details"""
+        params = {"since": since, "until": until}
+        response = await self._request("GET", "times", params=params)
+        return response["timings"]
+
+    async def stats(self) -> dict[str, dict[str, QuantileSketch]]:
+        """Remote stats"""
+        response = await self._request("GET", "stats")
+        return {
+            task: {
+                user: QuantileSketch.from_dict(sketch)
+                for user, sketch in users.items()
+            }
+            for task, users in response["stats"].items()
+        }
+
+    async def report(
+        self, by: str, first: str | None = None, last: str | None = None
+    ) -> dict[str, dict[str, dict[str, float]]]:
+        """Remote report"""
+        params = {"by": by, "from": first, "to": last}
+        response = await self._request("GET", "report", params=params)
+        return response["report"]
+
+
+async def bounded(
+    calls: dict[str, Callable[[], Awaitable]], limit: int = REMOTE_LIMIT
+) -> tuple[dict, dict[str, str]]:
+    """Awaits every call, at most limit at once. Returns the results by
+    name, plus an error message for each call that raised
+    TimerException."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    names = list(calls)
+    outcomes = await asyncio.gather(
+        *(run(calls[name]) for name in names), return_exceptions=True
+    )
+    results, errors = {}, {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, TimerException):
+            errors[name] = str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[name] = outcome
+    return results, errors
+
+
+async def collect_remote(
+    config: Config,
+    kind: str,
+    limit: int = REMOTE_LIMIT,
+    transport: Transport | None = None,
+) -> tuple[dict, dict[str, str]]:
+    """kind ("summary", "details" or "table") of every remote project,
+    requested concurrently"""
+    transport = transport or StreamTransport()
+    calls = {}
+    for name in config.get_remote_project_names():
+        timer = AsyncRemoteTimer(Project(name, config, "remote"), transport)
+        calls[name] = getattr(timer, kind)
+    return await bounded(calls, limit)
+
+
+async def start_many(
+    timer: AsyncRemoteTimer, tasks: list[str], limit: int = REMOTE_LIMIT
+) -> dict[str, str]:
+    """Starts several tasks concurrently; returns the error of each task
+    that could not be started"""
+    calls = {task: (lambda task=task: timer.start(task)) for task in tasks}
+    return (await bounded(calls, limit))[1]
@@ -0,0 +1,627 @@
+"""Backup module. Content-addressed, deduplicating storage for backups of
+the tracker home directory."""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Iterator
+from zipfile import ZipFile, ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED
+from tracker.index import file_lock, temp_path
+
+# Chunks are cut on line boundaries. Finished-timer files only ever grow at
+# the end, so cutting on the content of a line (rather than on a fixed
+# offset) keeps every earlier chunk byte-identical between backups.
+CHUNK_MIN_SIZE = 4 * 1024
+CHUNK_MAX_SIZE = 64 * 1024
+CHUNK_BOUNDARY_MASK = 0xFF
+
+COMPRESSION_METHODS = {
+    "stored": ZIP_STORED,
+    "deflated": ZIP_DEFLATED,
+    "bzip2": ZIP_BZIP2,
+    "lzma": ZIP_LZMA,
+}
+COMPRESSION_LEVELS = {
+    "stored": range(0),
+    "deflated": range(0, 10),
+    "bzip2": range(1, 10),
+    "lzma": range(0),
+}
+
+
+class BackupException(Exception):
+    """Backup Exception Class"""
+
+
+def chunk_bytes(data: bytes) -> list[bytes]:
+    """Splits data into content-defined chunks"""
+    chunks = []
+    start = pos = 0
+    size = len(data)
+    while pos < size:
+        newline = data.find(b"\n", pos)
+        end = size if newline == -1 else newline + 1
+        if end - start > CHUNK_MAX_SIZE:
+            # Cut before the line that overflows, or hard-cut a huge line.
+            cut = pos if pos > start else start + CHUNK_MAX_SIZE
+            chunks.append(data[start:cut])
+            start = pos = cut
+            continue
+        line_start, pos = pos, end
+        if (
+            end - start >= CHUNK_MIN_SIZE
+            and zlib.crc32(data[line_start:end]) & CHUNK_BOUNDARY_MASK == 0
+        ):
+            chunks.append(data[start:end])
+            start = end
+    if start < size:
+        chunks.append(data[start:])
+    return chunks
+
+
+def _compress_project(
+    project_path: Path,
+    base_path: Path,
+    part_path: Path,
+    method: str,
+    level: int | None,
+) -> Path:
+    """Compresses one project into its own zip part (runs in a worker)"""
+    with ZipFile(
+        part_path,
+        "w",
+        compression=COMPRESSION_METHODS[method],
+        compresslevel=level,
+    ) as zipf:
+        for path in [project_path] + sorted(project_path.rglob("*")):
+            zipf.write(path, arcname=path.relative_to(base_path))
+    return part_path
+
+
+# _append_part copies compressed members by doing ZipFile's own bookkeeping
+# (its private fp, filelist, NameToInfo and start_dir, as ZipFile does when
+# one of its write handles is closed), which is what lets the parts be
+# compressed on other processes. Those attributes are not a public API, so
+# the raw copy is only used on the CPython versions it was checked against;
+# elsewhere members are recompressed through writestr() instead.
+RAW_COPY_VERSIONS = ((3, 9), (3, 13))
+RAW_COPY = (
+    sys.implementation.name == "cpython"
+    and RAW_COPY_VERSIONS[0] <= sys.version_info[:2] <= RAW_COPY_VERSIONS[1]
+)
+_RAW_COPY_ATTRIBUTES = ("fp", "filelist", "NameToInfo", "start_dir")
+
+
+def _append_part(zipf: ZipFile, part_path: Path) -> None:
+    """Copies the members of a zip part into zipf, without decompressing
+    them where RAW_COPY allows"""
+    if not RAW_COPY or not all(
+        hasattr(zipf, name) for name in _RAW_COPY_ATTRIBUTES
+    ):
+        with ZipFile(part_path, "r") as part:
+            for info in part.infolist():
+                zipf.writestr(info, part.read(info))
+        return
+
+    with ZipFile(part_path, "r") as part, open(part_path, "rb") as rfile:
+        for info in part.infolist():
+            rfile.seek(info.header_offset)
+            header = rfile.read(30)
+            name_size, extra_size = struct.unpack("<HH", header[26:30])
+            rfile.seek(name_size + extra_size, os.SEEK_CUR)
+            data = rfile.read(info.compress_size)
+
+            info.header_offset = zipf.fp.tell()
+            zipf.fp.write(info.FileHeader())
+            zipf.fp.write(data)
+            zipf.filelist.append(info)
+            zipf.NameToInfo[info.filename] = info
+            zipf.start_dir = zipf.fp.tell()
+
+
+def write_backup(
+    base_path: Path,
+    archive_path: Path,
+    method: str = "stored",
+    level: int | None = None,
+    jobs: int | None = None,
+) -> None:
+    """Writes a zip backup of the projects and config under base_path.
+    Each project is compressed on its own worker process and the parts
+    are then stitched together into archive_path."""
+    if method not in COMPRESSION_METHODS:
+        raise BackupException(f"Unknown compression method {method}.")
+    if level is not None and level not in COMPRESSION_LEVELS[method]:
+        raise BackupException(
+            f"Compression level {level} is not valid for {method}."
+        )
+
+    projects = sorted((base_path / "projects").iterdir())
+    parts_path = Path(
+        tempfile.mkdtemp(prefix=".parts-", dir=archive_path.parent)
+    )
+    try:
+        args = [
+            (project, base_path, parts_path / f"{index}.zip", method, level)
+            for index, project in enumerate(projects)
+        ]
+        if jobs == 1 or len(projects) < 2:
+            parts = [_compress_project(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                parts = list(pool.map(_compress_project, *zip(*args)))
+
+        with ZipFile(
+            archive_path,
+            "w",
+            compression=COMPRESSION_METHODS[method],
+            compresslevel=level,
+        ) as zipf:
+            for part in parts:
+                _append_part(zipf, part)
+            zipf.write(base_path / "config", arcname="config")
+    finally:
+        shutil.rmtree(parts_path)
+
+
+def _file_digest(path: Path) -> str:
+    """sha256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as rfile:
+        for block in iter(lambda: rfile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _name_version(name: str) -> int:
+    """The N of tracker-YYYYmmddHHMM-N, or 0"""
+    suffix = name[len("tracker-YYYYmmddHHMM") :]
+    return int(suffix[1:]) if suffix[1:].isdigit() else 0
+
+
+class Catalog:
+    """Index of the backups under backup/, oldest first. It is kept in
+    backup/catalog.json so that finding the newest backup, naming the next
+    one and pruning old ones never have to list the backup directory.
+    add() and prune() run under locked(); so should writing a backup
+    between next_name() and add()."""
+
+    def __init__(self, backup_path: Path):
+        self.backup_path = backup_path
+        self.path = backup_path / "catalog.json"
+        self._entries: list[dict] | None = None
+        self._held = False
+
+    @contextmanager
+    def locked(self) -> Iterator[Catalog]:
+        """Holds the catalog's file lock and rereads the catalog, so that
+        no other backup or prune, in any process, changes it or collects
+        chunks until the block ends. Nested calls share the lock."""
+        if self._held:
+            yield self
+            return
+        with file_lock(self.path):
+            self._held = True
+            self._entries = None
+            try:
+                yield self
+            finally:
+                self._held = False
+
+    @property
+    def entries(self) -> list[dict]:
+        """Catalog entries, loading (or building) the catalog on first use"""
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as rfile:
+                    self._entries = json.load(rfile)["backups"]
+            except FileNotFoundError:
+                self._entries = self._scan()
+                if self._entries:
+                    self._save()
+        return self._entries
+
+    def _scan(self) -> list[dict]:
+        """Catalogs backups made before there was a catalog"""
+        paths = list(self.backup_path.glob("*.zip"))
+        snapshots_path = self.backup_path / "snapshots"
+        if snapshots_path.exists():
+            paths += snapshots_path.glob("*.json")
+        entries = []
+        for path in paths:
+            entry = self._describe(path)
+            try:
+                stamp = path.stem[len("tracker-") :][:12]
+                entry["created"] = time.mktime(
+                    time.strptime(stamp, "%Y%m%d%H%M")
+                )
+            except ValueError:
+                entry["created"] = path.stat().st_mtime
+            entries.append(entry)
+        entries.sort(
+            key=lambda entry: (entry["created"], _name_version(entry["name"]))
+        )
+        return entries
+
+    def _describe(self, path: Path) -> dict:
+        projects = {
+            PurePosixPath(name).parts[1]
+            for name in _archive_names(path)
+            if name.startswith("projects/")
+            and len(PurePosixPath(name).parts) > 1
+        }
+        return {
+            "name": path.stem,
+            "file": path.relative_to(self.backup_path).as_posix(),
+            "kind": "snapshot" if path.suffix == ".json" else "zip",
+            "created": time.time(),
+            "size": path.stat().st_size,
+            "sha256": _file_digest(path),
+            "projects": sorted(projects),
+        }
+
+    def _save(self) -> None:
+        temp = temp_path(self.path)
+        with open(temp, "w", encoding="utf-8") as wfile:
+            json.dump({"version": 1, "backups": self.entries}, wfile)
+        os.replace(temp, self.path)
+
+    def latest(self) -> dict | None:
+        """The newest backup, or None"""
+        return self.entries[-1] if self.entries else None
+
+    def file_of(self, entry: dict) -> Path:
+        """Path of a catalogued backup"""
+        return self.backup_path / entry["file"]
+
+    def next_name(self) -> str:
+        """Picks an unused tracker-YYYYmmddHHMM[-N] name for a new backup"""
+        filename = f"tracker-{time.strftime('%Y%m%d%H%M')}"
+        version = 0
+        latest = self.latest()
+        if latest and latest["name"][: len(filename)] == filename:
+            version = _name_version(latest["name"]) + 1
+        while True:
+            # Step over files copied in by hand that the catalog missed.
+            name = filename + (f"-{version}" if version else "")
+            if (
+                not (self.backup_path / (name + ".zip")).exists()
+                and not (
+                    self.backup_path / "snapshots" / (name + ".json")
+                ).exists()
+            ):
+                return name
+            version += 1
+
+    def add(self, path: Path) -> dict:
+        """Catalogs a newly written backup"""
+        with self.locked():
+            entry = self._describe(path)
+            self.entries.append(entry)
+            self._save()
+        return entry
+
+    def prune(self, keep_daily: int = 0, keep_weekly: int = 0) -> list[dict]:
+        """Deletes backups that no retention rule keeps. The newest backup
+        of each of the last keep_daily days and keep_weekly weeks is kept,
+        and so is the newest backup overall. Returns the removed entries."""
+        with self.locked():
+            return self._prune(keep_daily, keep_weekly)
+
+    def _prune(self, keep_daily: int, keep_weekly: int) -> list[dict]:
+        entries = self.entries
+        keep = {len(entries) - 1} if entries else set()
+        days: set[str] = set()
+        weeks: set[str] = set()
+        for index in range(len(entries) - 1, -1, -1):
+            created = time.localtime(entries[index]["created"])
+            day = time.strftime("%Y-%m-%d", created)
+            week = time.strftime("%G-%V", created)
+            if day not in days and len(days) < keep_daily:
+                days.add(day)
+                keep.add(index)
+            if week not in weeks and len(weeks) < keep_weekly:
+                weeks.add(week)
+                keep.add(index)
+
+        removed = [
+            entry for index, entry in enumerate(entries) if index not in keep
+        ]
+        self._entries = [entries[index] for index in sorted(keep)]
+        self._save()
+
+        removed_snapshots = [
+            self.file_of(entry)
+            for entry in removed
+            if entry["kind"] == "snapshot"
+        ]
+        if removed_snapshots:
+            kept = set()
+            for entry in self._entries:
+                if entry["kind"] == "snapshot":
+                    kept |= _snapshot_digests(self.file_of(entry))
+            garbage = set()
+            for path in removed_snapshots:
+                garbage |= _snapshot_digests(path)
+            store = ChunkStore(self.backup_path)
+            for digest in garbage - kept:
+                store.discard(digest)
+
+        for entry in removed:
+            self.file_of(entry).unlink(missing_ok=True)
+        return removed
+
+
+def _snapshot_digests(manifest_path: Path) -> set[str]:
+    """Every chunk hash referenced by a snapshot"""
+    try:
+        with open(manifest_path, encoding="utf-8") as rfile:
+            entries = json.load(rfile)["entries"]
+    except FileNotFoundError:
+        return set()
+    return {
+        digest
+        for entry in entries
+        if entry["type"] == "file"
+        for digest in entry["chunks"]
+    }
+
+
+def _verify_object(path: Path) -> str | None:
+    """Returns the object's name if its content does not match it"""
+    try:
+        data = zlib.decompress(path.read_bytes())
+    except (OSError, zlib.error):
+        return path.name
+    if hashlib.sha256(data).hexdigest() != path.name:
+        return path.name
+    return None
+
+
+class ChunkStore:
+    """Stores each distinct chunk once under backup/objects, and one small
+    manifest per backup under backup/snapshots."""
+
+    def __init__(self, backup_path: Path):
+        self.objects_path = backup_path / "objects"
+        self.snapshots_path = backup_path / "snapshots"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_path / digest[:2] / digest
+
+    def put(self, chunk: bytes) -> tuple[str, bool]:
+        """Stores a chunk, returning its hash and whether it was new"""
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self._object_path(digest)
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(digest + ".tmp")
+        tmp_path.write_bytes(zlib.compress(chunk))
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get(self, digest: str) -> bytes:
+        """Reads a chunk back out of the store"""
+        try:
+            return zlib.decompress(self._object_path(digest).read_bytes())
+        except FileNotFoundError:
+            raise BackupException(f"Missing backup object {digest}.")
+
+    def discard(self, digest: str) -> None:
+        """Removes a chunk that no snapshot uses any more"""
+        self._object_path(digest).unlink(missing_ok=True)
+
+    def snapshot(self, base_path: Path, name: str) -> dict[str, int]:
+        """Writes a snapshot of the projects and config under base_path.
+        Returns counts of new and reused chunks."""
+        counts = {"new": 0, "reused": 0}
+        entries = []
+        roots = [base_path / "projects", base_path / "config"]
+        for root in roots:
+            if not root.exists():
+                continue
+            paths = (
+                [root] + sorted(root.rglob("*")) if root.is_dir() else [root]
+            )
+            for path in paths:
+                relative = path.relative_to(base_path).as_posix()
+                if path.is_dir():
+                    entries.append({"path": relative, "type": "dir"})
+                    continue
+                digests = []
+                data = path.read_bytes()
+                for chunk in chunk_bytes(data):
+                    digest, new = self.put(chunk)
+                    counts["new" if new else "reused"] += 1
+                    digests.append(digest)
+                entries.append(
+                    {
+                        "path": relative,
+                        "type": "file",
+                        "size": len(data),
+                        "chunks": digests,
+                    }
+                )
+
+        self.snapshots_path.mkdir(parents=True, exist_ok=True)
+        manifest = {"version": 1, "created": time.time(), "entries": entries}
+        # Written aside and renamed, so a crash never leaves a truncated
+        # manifest whose chunks could be collected.
+        path = self.snapshots_path / (name + ".json")
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as wfile:
+            wfile.write(json.dumps(manifest))
+            wfile.flush()
+            os.fsync(wfile.fileno())
+        os.replace(tmp_path, path)
+        return counts
+
+    def verify(self, jobs: int | None = None) -> list[str]:
+        """Re-hashes every stored chunk across a process pool.
+        Returns the hashes of the corrupt ones."""
+        if not self.objects_path.exists():
+            return []
+        paths = [
+            path
+            for path in self.objects_path.glob("*/*")
+            if path.suffix != ".tmp"
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(_verify_object, paths, chunksize=256)
+            return sorted(digest for digest in results if digest)
+
+
+def _archive_names(archive: Path) -> list[str]:
+    """Lists member names of a zip or snapshot, directories ending in /"""
+    if archive.suffix == ".json":
+        with open(archive, encoding="utf-8") as rfile:
+            entries = json.load(rfile)["entries"]
+        return [
+            entry["path"] + ("/" if entry["type"] == "dir" else "")
+            for entry in entries
+        ]
+    with ZipFile(archive, "r") as zipf:
+        return zipf.namelist()
+
+
+def _extract_names(
+    archive: Path, names: list[str], dest: Path, store: ChunkStore
+) -> None:
+    """Streams the named members of a zip or snapshot out under dest,
+    reading a snapshot's chunks from store. Opens its own handle so
+    several projects can extract at once."""
+    if archive.suffix == ".json":
+        with open(archive, encoding="utf-8") as rfile:
+            chunks = {
+                entry["path"]: entry["chunks"]
+                for entry in json.load(rfile)["entries"]
+                if entry["type"] == "file"
+            }
+        for name in names:
+            path = dest / name
+            if name.endswith("/"):
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as wfile:
+                for digest in chunks[name]:
+                    wfile.write(store.get(digest))
+        return
+
+    with ZipFile(archive, "r") as zipf:
+        for name in names:
+            path = dest / name
+            if name.endswith("/"):
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with zipf.open(name) as rfile, open(path, "wb") as wfile:
+                shutil.copyfileobj(rfile, wfile)
+
+
+def restore_backup(
+    archive: Path,
+    base_path: Path,
+    project: str | None = None,
+    jobs: int = 1,
+    backup_path: Path | None = None,
+) -> list[str]:
+    """Restores projects from a zip backup or snapshot into base_path. A
+    snapshot's chunks are read from backup_path, base_path/backup unless
+    given, wherever the snapshot itself is.
+
+    Only the members of the requested project (or every project when
+    project is None) are read. Everything is first extracted into a
+    staging directory next to the live tree; only then are the projects
+    renamed into place, one after another, and if a rename fails the ones
+    already swapped are put back. A full restore also replaces the config
+    and drops projects that are not in the backup.
+    Returns the names of the restored projects.
+    """
+    by_project: dict[str, list[str]] = {}
+    config_names = []
+    for name in _archive_names(archive):
+        parts = PurePosixPath(name).parts
+        if PurePosixPath(name).is_absolute() or ".." in parts:
+            raise BackupException(f"Unsafe path {name} in backup.")
+        if parts == ("config",):
+            config_names.append(name)
+        elif len(parts) > 1 and parts[0] == "projects":
+            by_project.setdefault(parts[1], []).append(name)
+
+    if project is not None:
+        if project not in by_project:
+            raise BackupException(
+                f'Project "{project}" is not in backup {archive.name}.'
+            )
+        by_project = {project: by_project[project]}
+        config_names = []
+
+    store = ChunkStore(backup_path or base_path / "backup")
+    projects_path = base_path / "projects"
+    projects_path.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".restore-", dir=base_path))
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            list(
+                pool.map(
+                    lambda names: _extract_names(
+                        archive, names, staging, store
+                    ),
+                    [*by_project.values(), config_names],
+                )
+            )
+        # (live path, staged replacement or None to drop it)
+        swaps = [
+            (projects_path / name, staging / "projects" / name)
+            for name in by_project
+        ]
+        if project is None:
+            swaps.extend(
+                (live, None)
+                for live in sorted(projects_path.iterdir())
+                if live.name not in by_project
+            )
+            if config_names:
+                swaps.append((base_path / "config", staging / "config"))
+        _swap_all(swaps, staging / "trash")
+    finally:
+        shutil.rmtree(staging)
+    return sorted(by_project)
+
+
+def _swap_all(swaps: list[tuple[Path, Path | None]], trash: Path) -> None:
+    """Moves each live path to trash and its staged replacement, if any,
+    in its place. When a move fails, every swap done so far is undone
+    before the error is raised."""
+    trash.mkdir()
+    done: list[tuple[Path, Path, bool]] = []
+    try:
+        for index, (live, staged) in enumerate(swaps):
+            old = trash / str(index)
+            moved = live.exists()
+            if moved:
+                os.rename(live, old)
+            done.append((live, old, moved))
+            if staged is not None:
+                os.rename(staged, live)
+    except OSError:
+        for live, old, moved in reversed(done):
+            if moved and old.exists():
+                if live.exists():
+                    os.rename(live, trash / f"{old.name}-new")
+                os.rename(old, live)
+            elif not moved and live.exists():
+                os.rename(live, trash / f"{old.name}-new")
+        raise
@@ -6,11 +6,25 @@ from sys import argv
 import sys
 import os
 import time
-import shutil
 import pathlib
-from zipfile import ZipFile
+from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
+from tracker.aggregate import user_totals
+from tracker.backup import (
+    BackupException,
+    Catalog,
+    ChunkStore,
+    restore_backup,
+    write_backup,
+)
 from tracker.config import Config, Project, ConfigException
+from tracker.fanout import collect
+from tracker.prefix import SORTS
+from tracker.profiling import Profiler, phase, profile_path
+from tracker.rollup import GRANULARITIES
+from tracker.segments import compact
+from tracker.stats import HISTOGRAM_BOUNDS, describe, merged
+from tracker.table import TimingTable
 from tracker.timer import TimerException, TimerFactory
 
 
@@ -29,6 +43,9 @@ commands = [
     "connect",
     "restore",
     "backup",
+    "stats",
+    "report",
+    "compact",
 ]
 
 
@@ -38,6 +55,27 @@ class CommandException(Exception):
     # pass
 
 
+def parse_options(
+    args: list[str], names: tuple[str, ...], switches: tuple[str, ...] = ()
+) -> dict[str, str] | None:
+    """Parses '--name value', '--name=value' and bare '--switch' options.
+    Returns None if anything else is found."""
+    options = {}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        name, _, value = arg.partition("=")
+        if name in switches and not value:
+            options[name] = ""
+        elif name in names and value:
+            options[name] = value
+        elif name in names and args and arg == name:
+            options[name] = args.pop(0)
+        else:
+            return None
+    return options
+
+
 class Command(ABC):
     """Abstract Base Class all commands follow."""
 
@@ -99,18 +137,19 @@ class TasksCommand(Command):
 
         timer = TimerFactory.get_timer(self.config)
         running_tasks, completed_tasks = timer.tasks()
-        print("Started:")
-        if running_tasks:
-            for task in running_tasks:
-                print("  " + task)
-        else:
-            print("  <none>")
-        print("Completed:")
-        if completed_tasks:
-            for task in completed_tasks:
-                print("  " + task)
-        else:
-            print("  <none>")
+        with phase("render"):
+            print("Started:")
+            if running_tasks:
+                for task in running_tasks:
+                    print("  " + task)
+            else:
+                print("  <none>")
+            print("Completed:")
+            if completed_tasks:
+                for task in completed_tasks:
+                    print("  " + task)
+            else:
+                print("  <none>")
 
     def help_message(self) -> str:
         return f"""Usage: {os.path.basename(argv[0])} tasks"""
@@ -120,29 +159,68 @@ class SummaryCommand(Command):
     """Handles the running for 'summary'"""
 
     def run(self, args: list[str]) -> None:
-        if len(args) != 0:
+        options = parse_options(
+            args, ("--depth", "--prefix", "--top", "--sort"), ("--all",)
+        )
+        counts = {
+            name: (options or {}).get(name) for name in ("--depth", "--top")
+        }
+        if (
+            options is None
+            or ("--all" in options and len(options) > 1)
+            or options.get("--sort", "time") not in SORTS
+            or not all(
+                value is None or (value.isdigit() and int(value))
+                for value in counts.values()
+            )
+        ):
             print(self.help_message())
             sys.exit(1)
 
-        timer = TimerFactory.get_timer(self.config)
-        summary = timer.summary()
+        if "--all" in options:
+            summaries, errors = collect(self.config, "summary")
+            summary = {
+                f"{project}/{task}": summaries[project][task]
+                for project in summaries
+                for task in summaries[project]
+            }
+            summary = dict(sorted(summary.items()))
+        else:
+            depth, top = (
+                None if value is None else int(value)
+                for value in counts.values()
+            )
+            summary = TimerFactory.get_timer(self.config).summary(
+                options.get("--prefix"), depth, top, options.get("--sort")
+            )
+            errors = {}
+        self.render(summary)
+        print_errors(errors)
+
+    def render(self, summary: dict[str, dict[str, float]]) -> None:
+        """Prints the time and share of each task"""
         total_time = sum(summary[task]["time"] for task in summary)
         if not total_time:
             print("No time tracked yet.")
             return
 
-        for task in summary:
-            task_time = summary[task]["time"]
-            print(
-                f"{task+':':15} "
-                f"{summary[task]['hours']:02}:"
-                f"{summary[task]['minutes']:02}:"
-                f"{summary[task]['seconds']:02} "
-                f"({task_time*100.0/total_time:.2f}%)"
-            )
+        with phase("render"):
+            for task in summary:
+                task_time = summary[task]["time"]
+                print(
+                    f"{task+':':15} "
+                    f"{summary[task]['hours']:02}:"
+                    f"{summary[task]['minutes']:02}:"
+                    f"{summary[task]['seconds']:02} "
+                    f"({task_time*100.0/total_time:.2f}%)"
+                )
 
     def help_message(self) -> str:
-        return f"""Usage: {os.path.basename(argv[0])} summary"""
+        return (
+            f"Usage: {os.path.basename(argv[0])} summary"
+            " [--all | --depth <N> --prefix <label/>"
+            " --top <N> --sort time|name|recent]"
+        )
 
 
 class ShowCommand(Command):
@@ -313,34 +391,247 @@ class DetailsCommand(Command):
     """Handles the running for 'details'"""
 
     def run(self, args: list[str]) -> None:
-        if len(args) != 0:
+        options = parse_options(args, ("--from", "--to", "--user"), ("--all",))
+        try:
+            since, until = parse_dates(options or {})
+        except ValueError:
+            options = None
+        if options is None or (
+            ("--all" in options or "--user" in options) and len(options) > 1
+        ):
             print(self.help_message())
             sys.exit(1)
 
-        details = TimerFactory.get_timer(self.config).details()
-        total_time = sum(time for task in details for time, _ in details[task])
+        if "--user" in options:
+            timer = TimerFactory.get_timer(self.config)
+            self.render_user(
+                options["--user"], timer.user_times(options["--user"])
+            )
+            return
+        if "--all" in options:
+            tables, errors = collect(self.config, "table")
+            table = TimingTable()
+            for project in sorted(tables):
+                table.merge(tables[project], prefix=f"{project}/")
+        else:
+            timer = TimerFactory.get_timer(self.config)
+            table = timer.table(since, until)
+            errors = {}
+        self.render(table, ordered="--all" in options)
+        print_errors(errors)
+
+    def render(self, table: TimingTable, ordered: bool = False) -> None:
+        """Prints the time and share of each task and the time of each
+        user within it, with tasks sorted by name if ordered"""
+        if not len(table):
+            print("No time tracked yet.")
+            return
+
+        with phase("aggregate"):
+            total_time = sum(table.durations)
+            col1_size = max(len(user) for user in table.users)
+            totals = user_totals(table)
+            if ordered:
+                totals = dict(sorted(totals.items()))
+
+        with phase("render"):
+            for task, (task_time, entries) in totals.items():
+                task_percent = task_time * 100.0 / total_time
+                time_task = time.strftime("%H:%M:%S", time.gmtime(task_time))
+                print(
+                    f"{task+':':{col1_size}}    {time_task}  ({task_percent:2.0f}%)"
+                )
+                for user, duration in entries.items():
+                    time_dur = time.strftime("%H:%M:%S", time.gmtime(duration))
+                    print(f"  {user:{col1_size}}  {time_dur}")
+
+    def render_user(
+        self, user: str, times: dict[str, dict[str, float]]
+    ) -> None:
+        """Prints the time of one user and their share of it on each
+        task"""
+        total_time = sum(entry["time"] for entry in times.values())
+        if not total_time:
+            print(f'No time tracked by "{user}" yet.')
+            return
+
+        with phase("render"):
+            width = max([len(user) + 1] + [len(task) + 2 for task in times])
+            print(f"{user+':':{width}}  {format_duration(total_time)}")
+            for task, entry in times.items():
+                task_percent = entry["time"] * 100.0 / total_time
+                print(
+                    f"  {task:{width - 2}}  {format_duration(entry['time'])}"
+                    f"  ({task_percent:2.0f}%)"
+                )
+
+    def help_message(self) -> str:
+        return (
+            f"Usage: {os.path.basename(argv[0])} details [--all | --user <name>"
+            " | --from <YYYY-MM-DD> --to <YYYY-MM-DD>]"
+        )
+
+
+def parse_dates(options: dict[str, str]) -> tuple[float | None, ...]:
+    """Timestamps of the start of the --from day and the end of the --to
+    day, in local time"""
+    since = until = None
+    if "--from" in options:
+        since = datetime.fromisoformat(options["--from"]).timestamp()
+    if "--to" in options:
+        last_day = datetime.fromisoformat(options["--to"])
+        until = (last_day + timedelta(days=1)).timestamp()
+    return since, until
+
+
+def print_errors(errors: dict[str, str]) -> None:
+    """Reports the projects a --all command could not read"""
+    for project, message in sorted(errors.items()):
+        print(f"ERROR: {project}: {message}")
+
+
+def format_duration(secs: float) -> str:
+    """HH:MM:SS, with hours going past 24"""
+    secs = int(secs)
+    return f"{secs // 3600:02}:{secs % 3600 // 60:02}:{secs % 60:02}"
+
+
+def format_bound(secs: float) -> str:
+    """A histogram bound such as 5m or 2h"""
+    return f"{secs // 3600:g}h" if secs >= 3600 else f"{secs // 60:g}m"
+
+
+class StatsCommand(Command):
+    """Handles the running for 'stats'"""
+
+    def run(self, args: list[str]) -> None:
+        options = parse_options(args, ("--user",), ("--histogram",))
+        if options is None:
+            print(self.help_message())
+            sys.exit(1)
+
+        stats = TimerFactory.get_timer(self.config).stats()
+        user = options.get("--user")
+        with phase("aggregate"):
+            rows = []
+            for task, users in sorted(stats.items()):
+                if user is not None:
+                    users = {user: users[user]} if user in users else {}
+                if not users:
+                    continue
+                rows.append((task, describe(merged(users.values())), []))
+                if len(users) > 1 or "" not in users:
+                    rows[-1][2].extend(
+                        (name, describe(sketch))
+                        for name, sketch in sorted(users.items())
+                    )
+        if not rows:
+            print("No time tracked yet.")
+            return
+
+        labels = [f"<{format_bound(bound)}" for bound in HISTOGRAM_BOUNDS]
+        labels.append(f">={format_bound(HISTOGRAM_BOUNDS[-1])}")
         col1_size = max(
-            len(user) for task in details for _, user in details[task]
+            [len(task) + 1 for task, _, _ in rows]
+            + [len(name) + 2 for _, _, entries in rows for name, _ in entries]
+        )
+        with phase("render"):
+            for task, described, entries in rows:
+                for name, info, indent in [(task + ":", described, "")] + [
+                    (name, info, "  ") for name, info in entries
+                ]:
+                    width = col1_size - len(indent)
+                    print(
+                        f"{indent}{name:{width}}  {info['count']:6}"
+                        f"  mean {format_duration(info['mean'])}"
+                        f"  p50 {format_duration(info['p50'])}"
+                        f"  p90 {format_duration(info['p90'])}"
+                        f"  p99 {format_duration(info['p99'])}"
+                    )
+                    if "--histogram" in options:
+                        print(
+                            f"{indent}  "
+                            + "  ".join(
+                                f"{label} {count}"
+                                for label, count in zip(
+                                    labels, info["histogram"]
+                                )
+                            )
+                        )
+
+    def help_message(self) -> str:
+        return (
+            f"Usage: {os.path.basename(argv[0])} stats"
+            " [--user <name>] [--histogram]"
+        )
+
+
+class ReportCommand(Command):
+    """Handles the running for 'report'"""
+
+    def run(self, args: list[str]) -> None:
+        options = parse_options(args, ("--by", "--from", "--to"))
+        if options is None or options.get("--by", "day") not in GRANULARITIES:
+            print(self.help_message())
+            sys.exit(1)
+
+        report = TimerFactory.get_timer(self.config).report(
+            options.get("--by", "day"),
+            options.get("--from"),
+            options.get("--to"),
         )
+        if not report:
+            print("No time tracked yet.")
+            return
+
+        with phase("render"):
+            for bucket, tasks in report.items():
+                total = sum(sum(users.values()) for users in tasks.values())
+                print(f"{bucket+':':15} {format_duration(total)}")
+                for task, users in sorted(tasks.items()):
+                    print(
+                        f"  {task:13} {format_duration(sum(users.values()))}"
+                    )
+                    if len(users) > 1 or "" not in users:
+                        for user, secs in sorted(users.items()):
+                            print(f"    {user:11} {format_duration(secs)}")
+
+    def help_message(self) -> str:
+        return (
+            f"Usage: {os.path.basename(argv[0])} report"
+            " [--by day|week|month] [--from <bucket>] [--to <bucket>]"
+        )
+
+
+class CompactCommand(Command):
+    """Handles the running for 'compact'"""
+
+    def run(self, args: list[str]) -> None:
+        options = parse_options(args, ("--min-size", "--cold-after"))
+        if options is None or not all(
+            value.isdigit() for value in options.values()
+        ):
+            print(self.help_message())
+            sys.exit(1)
 
-        for task, timings in details.items():
-            task_time = 0.0
-            entries: dict[str, float] = {}
-            for entry in timings:
-                duration, user = entry
-                entries[user] = entries.get(user, 0) + duration
-                task_time += duration
-            task_percent = task_time * 100.0 / total_time
-            time_task = time.strftime("%H:%M:%S", time.gmtime(task_time))
-            print(
-                f"{task+':':{col1_size}}    {time_task}  ({task_percent:2.0f}%)"
+        project = self.config.current_project
+        if project.origin == "remote":
+            raise TimerException(
+                "Remote projects are compacted by the server."
             )
-            for user, duration in entries.items():
-                time_dur = time.strftime("%H:%M:%S", time.gmtime(duration))
-                print(f"  {user:{col1_size}}  {time_dur}")
+        cold_before = None
+        if "--cold-after" in options:
+            cold_before = time.time() - int(options["--cold-after"]) * 86400
+        segments = compact(
+            project, int(options.get("--min-size", 0)), cold_before
+        )
+        print(f"Compacted {len(segments)} segment(s).")
 
     def help_message(self) -> str:
-        return f"""Usage: {os.path.basename(argv[0])} details"""
+        return (
+            f"Usage: {os.path.basename(argv[0])} compact"
+            " [--min-size <bytes>] [--cold-after <days>]"
+        )
 
 
 class ConnectCommand(Command):
@@ -377,9 +668,13 @@ class ConnectCommand(Command):
 
 
 class RestoreCommand(Command):
-    """Reads from a backup zip file and restores information"""
+    """Reads from a backup zip file or snapshot and restores information"""
 
     def run(self, args: list[str]) -> None:
+        options = parse_options(args, ("--project", "--backup", "--jobs"))
+        if options is None or not options.get("--jobs", "1").isdigit():
+            print(self.help_message())
+            sys.exit(1)
         backup_directory_path = self.config.base_path / "backup/"
 
         if not (backup_directory_path).exists():
@@ -388,47 +683,85 @@ class RestoreCommand(Command):
             )
 
         print("Restoring...")
-        backup_directory_file = os.listdir(backup_directory_path)
-
-        if not backup_directory_file:
-            print("There are currently no backup files")
-            return
-
-        extraction_path = self.config.base_path
-
-        for direct in os.listdir(extraction_path):
-            path = os.path.join(extraction_path, direct)
-
-            if direct == "backup":
-                pass
-            elif direct == "config":
-                os.remove(path)
-            else:
-                shutil.rmtree(path)
-
-        restore_path = os.path.join(
-            backup_directory_path, max(backup_directory_file)
+        if "--backup" in options:
+            restore_path = pathlib.Path(options["--backup"])
+            if not restore_path.exists():
+                restore_path = backup_directory_path / options["--backup"]
+            if not restore_path.exists():
+                raise CommandException(
+                    f"No such backup file {options['--backup']}."
+                )
+        else:
+            catalog = Catalog(backup_directory_path)
+            latest = catalog.latest()
+            if latest is None:
+                print("There are currently no backup files")
+                return
+            restore_path = catalog.file_of(latest)
+
+        jobs = int(options.get("--jobs", "1"))
+        restored = restore_backup(
+            restore_path,
+            self.config.base_path,
+            project=options.get("--project"),
+            jobs=jobs,
+            backup_path=backup_directory_path,
         )
-
-        ZipFile(restore_path, "r").extractall(extraction_path)
-
+        print(f"Restored {', '.join(restored) or 'nothing'}")
         print("Restore successful")
 
     def help_message(self) -> str:
-        return "Usage: restore <There must be backup files present>"
+        path = os.path.basename(argv[0])
+        return (
+            f"Usage: {path} restore [--project <project_name>]"
+            " [--backup <file>] [--jobs <n>]"
+            "\nRestores the newest backup unless --backup is given."
+        )
 
 
 class BackupCommand(Command):
     """Backup all local projects"""
 
     def run(self, args: list[str]) -> None:
-        def add_files(zipf, path, root):
-            for file in path.iterdir():
-                zipf.write(file, arcname=file.relative_to(root))
-                if file.is_dir():
-                    add_files(zipf, file, root)
-
-        if len(args) != 0:
+        options = parse_options(
+            args,
+            (
+                "--compression",
+                "--level",
+                "--jobs",
+                "--keep-daily",
+                "--keep-weekly",
+            ),
+            ("--dedup", "--verify", "--prune"),
+        )
+        if options is None or not all(
+            options[name].isdigit()
+            for name in ("--level", "--jobs", "--keep-daily", "--keep-weekly")
+            if name in options
+        ):
+            print(self.help_message())
+            sys.exit(1)
+        if (
+            "--prune" in options
+            and "--keep-daily" not in options
+            and "--keep-weekly" not in options
+        ):
+            # Pruning with no rule would delete all but the newest backup.
+            print("--prune needs --keep-daily or --keep-weekly.")
+            print(self.help_message())
+            sys.exit(1)
+        zip_only = [
+            name
+            for name in ("--compression", "--level", "--jobs")
+            if name in options
+        ]
+        if "--dedup" in options and zip_only:
+            # Snapshots store their chunks as they are, one at a time.
+            print(f"--dedup cannot be combined with {', '.join(zip_only)}.")
+            print(self.help_message())
+            sys.exit(1)
+        if "--verify" in options and len(options) > 1:
+            print("--verify cannot be combined with other options.")
             print(self.help_message())
             sys.exit(1)
         base_path = self.config.base_path
@@ -436,31 +769,86 @@ class BackupCommand(Command):
 
         if not (backup_path).exists():
             backup_path.mkdir()
-        filename = f"tracker-{time.strftime('%Y%m%d%H%M')}"
-        version = 0
-        version_suffix = ""
-        while True:
-            new_filename = filename + version_suffix + ".zip"
-            if not (backup_path / new_filename).exists():
-                filename = new_filename
-                break
-            version += 1
-            version_suffix = f"-{version}"
-        with ZipFile(backup_path / filename, "w") as zipf:
-            add_files(zipf, base_path / "projects", base_path)
-            zipf.write(base_path / "config", arcname="config")
-        print(f"Backup created at {backup_path / filename}")
+
+        if "--verify" in options:
+            corrupt = ChunkStore(backup_path).verify()
+            for digest in corrupt:
+                print(f"Corrupt backup object {digest}")
+            print(f"Verified backup store ({len(corrupt)} corrupt objects)")
+            return
+
+        with Catalog(backup_path).locked() as catalog:
+            self._backup(catalog, options)
+
+    def _backup(self, catalog: Catalog, options: dict[str, str]) -> None:
+        """Writes and catalogs a backup and prunes old ones, as options
+        say, while the catalog is locked"""
+        base_path = self.config.base_path
+        backup_path = catalog.backup_path
+        if "--prune" not in options:
+            name = catalog.next_name()
+            if "--dedup" in options:
+                counts = ChunkStore(backup_path).snapshot(base_path, name)
+                catalog.add(backup_path / "snapshots" / (name + ".json"))
+                print(
+                    f"Snapshot created at {backup_path / 'snapshots' / name}"
+                    f".json ({counts['new']} new chunks,"
+                    f" {counts['reused']} reused)"
+                )
+            else:
+                filename = name + ".zip"
+                write_backup(
+                    base_path,
+                    backup_path / filename,
+                    method=options.get("--compression", "stored"),
+                    level=(
+                        int(options["--level"])
+                        if "--level" in options
+                        else None
+                    ),
+                    jobs=int(options.get("--jobs", "0")) or None,
+                )
+                catalog.add(backup_path / filename)
+                print(f"Backup created at {backup_path / filename}")
+
+        if (
+            "--prune" in options
+            or "--keep-daily" in options
+            or "--keep-weekly" in options
+        ):
+            removed = catalog.prune(
+                keep_daily=int(options.get("--keep-daily", "0")),
+                keep_weekly=int(options.get("--keep-weekly", "0")),
+            )
+            for entry in removed:
+                print(f"Pruned {entry['file']}")
 
     def help_message(self) -> str:
         path = os.path.basename(argv[0])
-        return f"Usage: {path} backup"
+        return (
+            f"Usage: {path} backup [--compression stored|deflated|bzip2|lzma]"
+            " [--level <n>] [--jobs <n>]"
+            " [--keep-daily <n>] [--keep-weekly <n>]"
+            f"\n       {path} backup --dedup"
+            " [--keep-daily <n>] [--keep-weekly <n>]"
+            f"\n       {path} backup --prune"
+            " --keep-daily <n> | --keep-weekly <n>"
+            f"\n       {path} backup --verify"
+        )
 
 
 class CLI:
     """Command Line Interface class"""
 
     def __init__(self):
-        self.config = Config()
+        # Profiling starts here so that loading the config is measured too.
+        self.profiler = None
+        path, _ = profile_path(argv[1:])
+        if path:
+            self.profiler = Profiler(path)
+            self.profiler.start()
+        with phase("config"):
+            self.config = Config()
 
     def print_usage(self):
         """Prints how a command is used"""
@@ -470,19 +858,33 @@ class CLI:
             print(f"\t{cmd}")
 
     def run(self):
-        """Runs the command"""
-        if len(argv) == 1 or argv[1] not in commands:
+        """Runs the command, profiling it if --profile or TRACKER_PROFILE
+        was given"""
+        path, args = profile_path(argv[1:])
+        if path and self.profiler is None:
+            self.profiler = Profiler(path)
+            self.profiler.start()
+        try:
+            self._dispatch(args)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+                self.profiler = None
+
+    def _dispatch(self, args: list[str]):
+        """Runs the subcommand named by args[0]"""
+        if not args or args[0] not in commands:
             self.print_usage()
-        elif len(argv) == 2 and argv[1] == "help":
+        elif len(args) == 1 and args[0] == "help":
             self.print_usage()
-        elif argv[1] == "help":
-            subcommandclass = eval(argv[2].capitalize() + "Command")
+        elif args[0] == "help":
+            subcommandclass = eval(args[1].capitalize() + "Command")
             print(subcommandclass(self.config).help_message())
         else:
-            command = argv[1]
+            command = args[0]
             commandclass = eval(command.capitalize() + "Command")
             try:
-                commandclass(self.config).run(argv[2:])
+                commandclass(self.config).run(args[1:])
             except CommandException as comm:
                 print(f"ERROR: {comm}")
                 print()
@@ -491,6 +893,8 @@ class CLI:
                 print(f"ERROR: {tim}")
             except ConfigException as conf:
                 print(f"ERROR: {conf}")
+            except BackupException as back:
+                print(f"ERROR: {back}")
             except:
                 print("ERROR: Unknown error occurred.")
                 print(
@@ -3,9 +3,12 @@
 from __future__ import annotations
 from pathlib import Path
 import shutil
+import threading
 import requests
 import os
 from requests.auth import HTTPBasicAuth
+from tracker.profiling import phase
+from tracker.tracing import inject, span
 
 default_tracker_path = Path.home() / ".tracker"
 
@@ -44,8 +47,13 @@ class Config:
     def _update_config(self, project: Project) -> None:
         """Updates the project config"""
         config_file_path = self.base_path / "config"
-        with open(config_file_path, "w", encoding="utf-8") as wfile:
+        # Replaced atomically: concurrent server requests read it meanwhile.
+        temp_path = config_file_path.with_name(
+            f".config.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(temp_path, "w", encoding="utf-8") as wfile:
             wfile.write(f"project_name:{project.name}")
+        os.replace(temp_path, config_file_path)
 
     def set_project(self, project: Project) -> None:
         """Sets the current running project"""
@@ -94,9 +102,11 @@ class Project:
         self.path = config.base_path / "projects" / self.name
         self.active_timers_path = self.path / "active-timers"
         self.finished_timers_path = self.path / "finished-timers"
+        self.segments_path = self.path / "segments"
         self.origin = origin
         self.url = url
         self.user = user
+        self.key: str | None = None
         if self.origin == "local" and (self.path / "remote").exists():
             self.origin = "remote"
         if self.origin == "remote" and (url is None or user is None):
@@ -120,16 +130,19 @@ class Project:
                 )
 
             try:
-                result = requests.post(
-                    (self.url or "") + "/api/init",
-                    data={"project": self.name, "username": self.user},
-                    timeout=3,
-                )
+                with phase("network"), span("http.request", endpoint="init"):
+                    result = requests.post(
+                        (self.url or "") + "/api/init",
+                        data={"project": self.name, "username": self.user},
+                        headers=inject(),
+                        timeout=3,
+                    )
             except requests.exceptions.ConnectionError:
                 raise ConfigException("Could not connect to remote server.")
             if not result.ok:
                 raise ConfigException("A request to the remote server failed.")
             key = result.json()["key"]
+            self.key = key
             self.path.mkdir(parents=True)
             with open(self.path / "remote", "w", encoding="utf-8") as remote:
                 remote.write(
@@ -145,11 +158,15 @@ class Project:
         if self.exists():
             if self.origin == "remote":
                 try:
-                    result = requests.delete(
-                        (self.url or "") + "/api/delete",
-                        auth=HTTPBasicAuth(self.key, ""),
-                        timeout=3,
-                    )
+                    with phase("network"), span(
+                        "http.request", endpoint="delete"
+                    ):
+                        result = requests.delete(
+                            (self.url or "") + "/api/delete",
+                            auth=HTTPBasicAuth(self.key, ""),
+                            headers=inject(),
+                            timeout=3,
+                        )
                 except requests.exceptions.ConnectionError:
                     raise ConfigException(
                         "Could not connect to remote server."
@@ -169,12 +186,14 @@ class Project:
     def connect(config: Config, url: str, user: str, key: str) -> "Project":
         """Connects to an existing remote project, returning a Project object."""
         try:
-            result = requests.get(
-                (url or "") + "/api/project",
-                data={"username": user},
-                auth=HTTPBasicAuth(key, ""),
-                timeout=3,
-            )
+            with phase("network"), span("http.request", endpoint="project"):
+                result = requests.get(
+                    (url or "") + "/api/project",
+                    data={"username": user},
+                    auth=HTTPBasicAuth(key, ""),
+                    headers=inject(),
+                    timeout=3,
+                )
         except requests.exceptions.ConnectionError:
             raise ConfigException("Could not connect to remote server.")
         if not result.ok:
@@ -0,0 +1,109 @@
+"""Durability module. How hard an appended finished timing is pushed to
+disk before stop() returns, from TRACKER_DURABILITY:
+    none     written to the OS page cache only, as before (the default)
+    always   fsync'd on every append
+    batched  fsync'd by a group commit: appends that arrive while a
+             round of fsyncs runs wait for the next round together, and
+             TRACKER_GROUP_COMMIT_MS makes a round wait that long first
+             to gather more
+Under "always" and "batched", stop() returns only once its timing is on
+disk. fsync works per file, so a round shares one fsync between every
+append to the same task file."""
+
+from __future__ import annotations
+import os
+import threading
+import time
+from pathlib import Path
+
+DURABILITY_ENV = "TRACKER_DURABILITY"
+GROUP_COMMIT_ENV = "TRACKER_GROUP_COMMIT_MS"
+DURABILITY_MODES = ("none", "batched", "always")
+DEFAULT_GROUP_COMMIT_MS = 0.0
+
+
+def durability(default: str = "none") -> str:
+    """The durability mode from TRACKER_DURABILITY, else default"""
+    mode = os.environ.get(DURABILITY_ENV) or default
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"Unknown durability {mode!r}")
+    return mode
+
+
+def group_commit_window() -> float:
+    """Seconds a group commit waits for more appends before syncing"""
+    millis = os.environ.get(GROUP_COMMIT_ENV)
+    return float(millis or DEFAULT_GROUP_COMMIT_MS) / 1000
+
+
+def sync_path(path: Path) -> None:
+    """fsyncs a file or directory that is not open"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommit:
+    """Shares fsyncs between threads. Every commit() takes a ticket; the
+    first waiting thread becomes the leader, waits out the window so more
+    appends can join, then syncs every file written so far and releases
+    all the tickets it covered. The others just wait."""
+
+    def __init__(self, window: float = 0.0):
+        self.window = window
+        self.syncs = 0
+        self._changed = threading.Condition()
+        self._pending: set[Path] = set()
+        self._issued = 0
+        self._synced = 0
+        self._leading = False
+
+    def commit(self, *paths: Path) -> None:
+        """Returns once paths, written before the call, are on disk"""
+        with self._changed:
+            self._pending.update(paths)
+            self._issued += 1
+            ticket = self._issued
+            while self._synced < ticket:
+                if self._leading:
+                    self._changed.wait()
+                else:
+                    self._lead()
+
+    def _lead(self) -> None:
+        """One round of syncs; called and returns with the lock held"""
+        self._leading = True
+        try:
+            if self.window:
+                self._changed.wait(self.window)
+            pending, self._pending = self._pending, set()
+            covered = self._issued
+            self._changed.release()
+            try:
+                for path in sorted(pending):
+                    sync_path(path)
+            except BaseException:
+                self._changed.acquire()
+                self._pending.update(pending)
+                raise
+            self._changed.acquire()
+            self._synced = covered
+            self.syncs += 1
+        finally:
+            self._leading = False
+            self._changed.notify_all()
+
+
+_committers: dict[float, GroupCommit] = {}
+_committers_guard = threading.Lock()
+
+
+def group_commit(window: float | None = None) -> GroupCommit:
+    """The process's group commit for a window, shared by every store so
+    appends to different projects share syncs too"""
+    if window is None:
+        window = group_commit_window()
+    with _committers_guard:
+        return _committers.setdefault(window, GroupCommit(window))
@@ -0,0 +1,78 @@
+"""Events module. An in-process publish/subscribe bus of start and stop
+events per project, behind the server's change feed. Every event gets the
+next version number of its project; subscribers wait on a condition for a
+version past their cursor, so idle subscribers cost a blocked thread and
+nothing else."""
+
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+
+# Events kept per project for subscribers catching up from a cursor
+HISTORY_SIZE = 1000
+
+
+class ProjectFeed:
+    """The recent events of one project, oldest first"""
+
+    def __init__(self):
+        self.version = 0
+        self.events: deque[dict] = deque(maxlen=HISTORY_SIZE)
+
+
+class EventBus:
+    """Versioned events by project key"""
+
+    def __init__(self):
+        self._feeds: dict[str, ProjectFeed] = {}
+        self._changed = threading.Condition()
+
+    def _feed(self, project: str) -> ProjectFeed:
+        """A project's feed; an empty one, not kept, before any event, so
+        reading never adds feeds"""
+        return self._feeds.get(project) or ProjectFeed()
+
+    def version(self, project: str) -> int:
+        """The version of a project's latest event, 0 before any"""
+        with self._changed:
+            return self._feed(project).version
+
+    def publish(self, project: str, kind: str, **fields) -> dict:
+        """Adds an event and wakes the project's subscribers. Only
+        publishing adds a project's feed."""
+        with self._changed:
+            feed = self._feeds.setdefault(project, ProjectFeed())
+            feed.version += 1
+            event = {"version": feed.version, "type": kind, **fields}
+            feed.events.append(event)
+            self._changed.notify_all()
+        return event
+
+    def since(
+        self, project: str, cursor: int, timeout: float = 0.0
+    ) -> tuple[int, list[dict], bool]:
+        """(version, events after cursor, reset), waiting up to timeout
+        seconds for one. reset says events after the cursor were dropped
+        or the cursor is from an earlier server, so the subscriber should
+        reread the tasks."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            feed = self._feed(project)
+            while feed.version == cursor:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+                # The first event of a project adds its feed.
+                feed = self._feed(project)
+            oldest = feed.events[0]["version"] if feed.events else 1
+            reset = cursor > feed.version or cursor < oldest - 1
+            events = [
+                event for event in feed.events if event["version"] > cursor
+            ]
+            return feed.version, [] if reset else events, reset
+
+
+# The bus of this process, fed by the server's start and stop routes
+BUS = EventBus()
@@ -0,0 +1,57 @@
+"""Fan-out module. Runs summary(), details() or table() on every project
+at once: local projects on a process pool, remote ones as concurrent
+asyncio requests. The current project and the config file are left
+alone."""
+
+from __future__ import annotations
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from tracker.asyncremote import REMOTE_LIMIT, collect_remote
+from tracker.config import Config, Project
+from tracker.parallel import default_jobs
+from tracker.timer import LocalTimer, TimerException
+
+KINDS = ("summary", "details", "table")
+
+
+def _local(config: Config, name: str, kind: str):
+    """kind of one local project; runs in a worker process"""
+    # Each worker parses its project on one core, the pool supplies the rest.
+    timer = LocalTimer(Project(name, config), jobs=1)
+    return getattr(timer, kind)()
+
+
+def collect(
+    config: Config, kind: str, jobs: int | None = None
+) -> tuple[dict, dict[str, str]]:
+    """kind ("summary", "details" or "table") of every project, by project
+    name, plus an error message for each project that could not be read"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown report {kind}")
+    remotes = set(config.get_remote_project_names())
+    names = config.get_project_names()
+    local_names = [name for name in names if name not in remotes]
+    futures: dict[str, Future] = {}
+    with ProcessPoolExecutor(
+        max_workers=min(jobs or default_jobs(), max(len(local_names), 1))
+    ) as processes:
+        for name in local_names:
+            futures[name] = processes.submit(_local, config, name, kind)
+        # The remote requests run while the workers parse.
+        remote_results, errors = asyncio.run(
+            collect_remote(config, kind, REMOTE_LIMIT)
+        )
+
+        results = {}
+        for name in names:
+            if name in remotes:
+                if name in remote_results:
+                    results[name] = remote_results[name]
+                continue
+            try:
+                results[name] = futures[name].result()
+            except TimerException as exc:
+                errors[name] = str(exc)
+            except Exception as exc:
+                errors[name] = f"Could not read the project: {exc!r}"
+    return results, errors
@@ -0,0 +1,195 @@
+"""Index module. Derived aggregates kept by the timer's store (a project's
+index/ directory for text projects) and updated by LocalTimer.stop(), so
+queries read the aggregate instead of rescanning every finished timer.
+Each index is split into small shards, so neither a stop() nor a query
+reads or writes more than the shards it touches. A missing index is
+rebuilt from the finished timers the first time it is needed."""
+
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # No flock() off POSIX; threads are still serialized
+    fcntl = None
+
+
+class Interval(NamedTuple):
+    """One finished timing"""
+
+    task: str
+    start: float
+    end: float
+    duration: float
+    user: str
+
+
+def parse_interval(task: str, line: str) -> Interval:
+    """Parses a "start:end:duration[;user]" finished-timer line"""
+    time_range, _, user = line.rstrip().partition(";")
+    start, end, duration = time_range.split(":")
+    return Interval(task, float(start), float(end), float(duration), user)
+
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def lock_for(path: Path) -> threading.Lock:
+    """One lock per index or timer file, shared by every thread of the
+    process"""
+    with _locks_guard:
+        return _locks.setdefault(str(path), threading.Lock())
+
+
+def lock_file(path: Path) -> Path:
+    """The file file_lock() flocks for path. Lock files live in a
+    per-user directory under the system's temporary directory, named
+    after a hash of path, so project directories, their listings and
+    their backups never see them."""
+    digest = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()
+    return (
+        Path(tempfile.gettempdir())
+        / f"tracker-locks-{os.getuid()}"
+        / (digest + ".lock")
+    )
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Holds path's lock_for() and an flock() on its lock_file(), so
+    read-modify-writes of path are serialized between processes as well
+    as threads"""
+    with lock_for(path):
+        if fcntl is None:
+            yield
+            return
+        lock_path = lock_file(path)
+        lock_path.parent.mkdir(mode=0o700, exist_ok=True)
+        with open(lock_path, "a") as wfile:
+            fcntl.flock(wfile, fcntl.LOCK_EX)
+            yield
+
+
+def temp_path(path: Path) -> Path:
+    """A temporary file beside path, to be os.replace()d over it, that no
+    other process or thread writes at the same time"""
+    name = f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    return path.with_name(name)
+
+
+class ProjectIndex(ABC):
+    """An aggregate over a timer's finished intervals, saved in the timer's
+    store as shards under key/. Subclasses say which shards an interval
+    falls in and how to fold it into one, so a stop() rewrites only those
+    shards and a query reads only the shards it needs. A marker saved
+    under key itself says the shards are complete."""
+
+    name = ""
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.key = self.name
+
+    @property
+    def path(self) -> Path:
+        """Where a text store keeps the index's marker"""
+        return self.timer.project.path / "index" / f"{self.key}.json"
+
+    @abstractmethod
+    def empty(self) -> Any:
+        """A shard without intervals, in the form add() folds into"""
+
+    def decode(self, data: dict) -> Any:
+        """A saved shard in the form add() folds into; by default the
+        saved dict itself"""
+        return data
+
+    def encode(self, shard: Any) -> dict:
+        """The dict a shard is saved as; inverse of decode()"""
+        return shard
+
+    def entries(self, interval: Interval) -> Iterable[tuple[str, Any]]:
+        """(shard, item) pairs to fold an interval into; by default the
+        whole interval goes to a single "all" shard"""
+        return (("all", interval),)
+
+    @abstractmethod
+    def add(self, data: Any, item: Any) -> None:
+        """Folds one item of entries() into a shard"""
+
+    def _shard_key(self, shard: str) -> str:
+        return f"{self.key}/{shard}"
+
+    def _is_built(self) -> bool:
+        marker = self.timer.store.load_index(self.key)
+        # Indexes from before shards were saved whole under key.
+        return marker is not None and marker.get("sharded") is True
+
+    def _rebuild(self) -> None:
+        store = self.timer.store
+        for key in store.index_keys(self.key):
+            store.delete_index(key)
+        # Shards stay decoded until every interval is folded in.
+        shards: dict[str, Any] = {}
+        intervals: Iterable[Interval] = self.timer.intervals()
+        for interval in intervals:
+            for shard, item in self.entries(interval):
+                data = shards.get(shard)
+                if data is None:
+                    data = shards[shard] = self.empty()
+                self.add(data, item)
+        for shard, data in shards.items():
+            store.save_index(self._shard_key(shard), self.encode(data))
+        store.save_index(self.key, {"sharded": True})
+
+    def ensure_built(self) -> None:
+        """Rebuilds the index from the finished timers if it does not
+        exist yet"""
+        if self._is_built():
+            return
+        with self.timer.store.index_lock(self.key):
+            if not self._is_built():
+                self._rebuild()
+
+    def shard(self, shard: str) -> dict:
+        """One shard, empty when no interval fell in it"""
+        self.ensure_built()
+        data = self.timer.store.load_index(self._shard_key(shard))
+        return self.encode(self.empty()) if data is None else data
+
+    def shard_names(self, under: str = "") -> list[str]:
+        """Names of the saved shards, or of those under a shard prefix
+        such as "day" """
+        self.ensure_built()
+        prefix = self._shard_key(under) if under else self.key
+        start = len(self.key) + 1
+        return [key[start:] for key in self.timer.store.index_keys(prefix)]
+
+    def update(self, interval: Interval) -> None:
+        """Adds an interval that was just appended to the finished timers
+        to the shards it falls in. When the index does not exist yet it is
+        rebuilt instead, which already includes the interval."""
+        store = self.timer.store
+        with store.index_lock(self.key):
+            if not self._is_built():
+                self._rebuild()
+                return
+            shards: dict[str, Any] = {}
+            for shard, item in self.entries(interval):
+                data = shards.get(shard)
+                if data is None:
+                    data = store.load_index(self._shard_key(shard))
+                    shards[shard] = data = (
+                        self.empty() if data is None else self.decode(data)
+                    )
+                self.add(data, item)
+            for shard, data in shards.items():
+                store.save_index(self._shard_key(shard), self.encode(data))
@@ -0,0 +1,159 @@
+"""Labels module. Each project keeps a dictionary of its task labels in
+labels.json, mapping every label to a small integer id. Timer files,
+segments and indexes are named after the id (as "_<id>"), so labels can
+hold any printable character and listing the finished tasks is a read of
+the dictionary."""
+
+from __future__ import annotations
+import json
+import os
+import shutil
+from tracker.config import Project
+from tracker.index import file_lock, temp_path
+
+LABELS_FILE = "labels.json"
+
+
+def stem(task_id: int) -> str:
+    """File name, without suffix, of a task id. Ids start with "_" so they
+    can never clash with the alphanumeric labels older projects used as
+    file names."""
+    return f"_{task_id}"
+
+
+class LabelDictionary:
+    """The label <-> id dictionary of one project, plus which labels have
+    finished timings"""
+
+    def __init__(self, project: Project):
+        self.project = project
+        self.path = project.path / LABELS_FILE
+        self.labels: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.finished: set[int] = set()
+        with self._lock():
+            data = self._read()
+            if data is None or data.get("migrating"):
+                data = self._migrate(data)
+            self._apply(data)
+
+    def _lock(self):
+        """Serializes reading, changing and saving the dictionary between
+        every timer of the project, in any process"""
+        return file_lock(self.path)
+
+    def _read(self) -> dict | None:
+        try:
+            with open(self.path, encoding="utf-8") as rfile:
+                return json.load(rfile)
+        except FileNotFoundError:
+            return None
+
+    def _reread(self) -> None:
+        """Applies the saved dictionary; a missing file is an empty one"""
+        data = self._read()
+        self._apply(data or {"labels": [], "finished": []})
+
+    def _apply(self, data: dict) -> None:
+        self.labels = data["labels"]
+        self.ids = {label: index for index, label in enumerate(self.labels)}
+        self.finished = set(data["finished"])
+
+    def _save(self, **extra) -> None:
+        data = {"labels": self.labels, "finished": sorted(self.finished)}
+        data.update(extra)
+        temp = temp_path(self.path)
+        with open(temp, "w", encoding="utf-8") as wfile:
+            json.dump(data, wfile)
+        os.replace(temp, self.path)
+
+    def _migrate(self, data: dict | None) -> dict:
+        """Renames the <label>.txt files of an older project after their
+        ids. The dictionary is saved first and marked as migrating, so an
+        interrupted migration picks up where it stopped."""
+        project = self.project
+        if data is None:
+            legacy = set()
+            finished = set()
+            for path in project.active_timers_path.iterdir():
+                legacy.add(path.stem)
+            for path in project.finished_timers_path.iterdir():
+                finished.add(path.stem)
+            if project.segments_path.exists():
+                finished.update(
+                    p.name for p in project.segments_path.iterdir()
+                )
+            labels = sorted(legacy | finished)
+            data = {
+                "labels": labels,
+                "finished": [
+                    index
+                    for index, label in enumerate(labels)
+                    if label in finished
+                ],
+            }
+            self._apply(data)
+            self._save(migrating=True)
+
+        for index, label in enumerate(data["labels"]):
+            for directory in (
+                project.active_timers_path,
+                project.finished_timers_path,
+            ):
+                legacy_path = directory / f"{label}.txt"
+                if legacy_path.exists():
+                    os.replace(legacy_path, directory / f"{stem(index)}.txt")
+            legacy_path = project.segments_path / label
+            if legacy_path.is_dir():
+                os.replace(legacy_path, project.segments_path / stem(index))
+        # Indexes are derived data keyed by file name; rebuild them.
+        shutil.rmtree(project.path / "index", ignore_errors=True)
+        self._apply(data)
+        self._save()
+        return {"labels": self.labels, "finished": sorted(self.finished)}
+
+    def refresh(self) -> None:
+        """Re-reads labels added by other timers of the project"""
+        with self._lock():
+            self._reread()
+
+    def stem(self, label: str, create: bool = False) -> str | None:
+        """File stem of a label, adding the label if create is set.
+        None for an unknown label."""
+        if label not in self.ids and not create:
+            self.refresh()
+        elif label not in self.ids:
+            with self._lock():
+                # Another timer may have added labels in the meantime.
+                self._reread()
+                if label not in self.ids:
+                    self.ids[label] = len(self.labels)
+                    self.labels.append(label)
+                    self._save()
+        task_id = self.ids.get(label)
+        return None if task_id is None else stem(task_id)
+
+    def label(self, task_stem: str) -> str:
+        """Label of a file stem; stems that are not ids are returned as
+        they are"""
+        if task_stem.startswith("_") and task_stem[1:].isdigit():
+            task_id = int(task_stem[1:])
+            if task_id >= len(self.labels):
+                self.refresh()
+            if task_id < len(self.labels):
+                return self.labels[task_id]
+        return task_stem
+
+    def mark_finished(self, task_stem: str) -> None:
+        """Records that a label has finished timings"""
+        task_id = int(task_stem[1:])
+        if task_id in self.finished:
+            return
+        with self._lock():
+            self._reread()
+            self.finished.add(task_id)
+            self._save()
+
+    def finished_labels(self) -> list[str]:
+        """Labels with finished timings"""
+        return sorted(self.labels[task_id] for task_id in self.finished)
@@ -0,0 +1,182 @@
+"""Metrics module. A small in-process registry of counters and histograms,
+rendered in the Prometheus text exposition format."""
+
+from __future__ import annotations
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+BYTES_BUCKETS = (0, 1024, 16384, 131072, 1048576, 8388608, 67108864)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(34), "")}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: dict[tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """Adds amount to the counter for these label values"""
+        with self.lock:
+            self.values[label_values] = (
+                self.values.get(label_values, 0) + amount
+            )
+
+    def render(self) -> list[str]:
+        """Exposition lines for this counter"""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self.lock:
+            for values, count in sorted(self.values.items()):
+                labels = _format_labels(self.labels, values)
+                lines.append(f"{self.name}{labels} {count}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds and optional labels"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...],
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket (+Inf last), sum, count]
+        self.values: dict[tuple[str, ...], list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Records one observation"""
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.values[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        """Exposition lines for this histogram"""
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            for values, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, bucket_count in zip(bounds, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(
+                        self.labels + ("le",), values + (bound,)
+                    )
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """A set of metrics that can be rendered together"""
+
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+
+    def counter(
+        self, name: str, help_text: str, labels: tuple[str, ...] = ()
+    ) -> Counter:
+        """Creates and registers a counter"""
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """Creates and registers a histogram"""
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """The whole registry in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.counter(
+    "tracker_requests_total",
+    "HTTP requests handled, by route and status code.",
+    ("route", "status"),
+)
+ERRORS = REGISTRY.counter(
+    "tracker_errors_total",
+    "Requests that failed, by route and error type.",
+    ("route", "type"),
+)
+LATENCY = REGISTRY.histogram(
+    "tracker_request_duration_seconds",
+    "Time spent handling a request, by route.",
+    ("route",),
+)
+STORAGE_BYTES = REGISTRY.histogram(
+    "tracker_storage_read_bytes",
+    "Bytes of timer storage read while handling a request, by route.",
+    ("route",),
+    BYTES_BUCKETS,
+)
+CACHE = REGISTRY.counter(
+    "tracker_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Counts one cache lookup"""
+    CACHE.inc(cache, "hit" if hit else "miss")
@@ -0,0 +1,104 @@
+"""Parallel parsing module. Splits finished-timer files into newline-aligned
+byte ranges, parses the ranges on a process pool and merges the partial
+results, so cold summaries of large projects use every core."""
+
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tracker.table import TimingTable
+
+# Below this many bytes in total, a pool costs more than it saves.
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+# Ranges are at least this long, and there are a few per worker.
+MIN_RANGE_BYTES = 1024 * 1024
+RANGES_PER_JOB = 4
+
+
+def default_jobs() -> int:
+    """Worker processes to use when none are asked for"""
+    return os.cpu_count() or 1
+
+
+def use_pool(total_bytes: int, jobs: int | None) -> bool:
+    """Whether files adding up to total_bytes are worth a process pool"""
+    return (jobs or default_jobs()) > 1 and total_bytes >= PARALLEL_MIN_BYTES
+
+
+def split_ranges(path: Path, size: int, pieces: int) -> list[tuple[int, int]]:
+    """Cuts a file into about `pieces` (start, stop) byte ranges, each
+    ending just after a newline"""
+    target = max(MIN_RANGE_BYTES, size // max(pieces, 1))
+    ranges = []
+    start = 0
+    with open(path, "rb") as rfile:
+        while start < size:
+            stop = start + target
+            if stop >= size:
+                stop = size
+            else:
+                rfile.seek(stop)
+                rfile.readline()
+                stop = min(rfile.tell(), size)
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def _read_range(path: str, start: int, stop: int) -> list[bytes]:
+    with open(path, "rb") as rfile:
+        rfile.seek(start)
+        return rfile.read(stop - start).splitlines()
+
+
+def _sum_range(path: str, start: int, stop: int) -> int:
+    """Sum of the durations in a range, each truncated to whole seconds"""
+    return sum(
+        int(float(line.split(b";")[0].split(b":")[2]))
+        for line in _read_range(path, start, stop)
+        if line
+    )
+
+
+def _table_range(path: str, start: int, stop: int) -> TimingTable:
+    """Timings of a range, as a table of one task named after the file"""
+    table = TimingTable()
+    table.add_lines(Path(path).stem, _read_range(path, start, stop))
+    return table
+
+
+def _map_ranges(worker, files: dict[str, Path], jobs: int | None) -> dict:
+    """Runs worker on the ranges of every file and returns the partial
+    results of each task, in file order"""
+    jobs = jobs or default_jobs()
+    sizes = {task: path.stat().st_size for task, path in files.items()}
+    total = sum(sizes.values()) or 1
+    futures = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for task, path in files.items():
+            pieces = round(jobs * RANGES_PER_JOB * sizes[task] / total)
+            futures[task] = [
+                pool.submit(worker, str(path), start, stop)
+                for start, stop in split_ranges(path, sizes[task], pieces)
+            ]
+        return {
+            task: [future.result() for future in parts]
+            for task, parts in futures.items()
+        }
+
+
+def task_totals(files: dict[str, Path], jobs: int | None = None) -> dict:
+    """Truncated duration totals of each task file, in parallel"""
+    partials = _map_ranges(_sum_range, files, jobs)
+    return {task: sum(parts) for task, parts in partials.items()}
+
+
+def task_table(files: dict[str, Path], jobs: int | None = None) -> TimingTable:
+    """Timings of every task file, in parallel"""
+    partials = _map_ranges(_table_range, files, jobs)
+    table = TimingTable()
+    for task, parts in partials.items():
+        table.task_code(task)
+        for part in parts:
+            table.merge(part)
+    return table
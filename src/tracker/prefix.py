@@ -0,0 +1,138 @@
+"""Prefix module. Labels such as "clientx/api/bugfix" form a hierarchy;
+the prefix index keeps it as a trie whose every node holds the total time
+of its subtree, so the totals below a prefix, or rolled up to a depth, are
+read from the nodes of that subtree alone. Each top-level part of the
+trie is a shard of its own, so a stop() rewrites, and a prefix query
+reads, only the subtree of the label's first part."""
+
+from __future__ import annotations
+import heapq
+import operator
+from typing import Iterator
+from tracker.index import Interval, ProjectIndex
+
+SEPARATOR = "/"
+# Row column each summary sort ranks by
+SORT_COLUMNS = {"time": 1, "name": 0, "recent": 2}
+SORTS = tuple(SORT_COLUMNS)
+
+
+def split_label(label: str) -> list[str]:
+    """The path of a label in the hierarchy; empty parts are ignored"""
+    return [part for part in label.split(SEPARATOR) if part]
+
+
+# Shard of the labels with no parts, such as "/"
+ROOT_SHARD = "root"
+
+
+def part_shard(part: str) -> str:
+    """Shard name of a top-level part; hex keeps any part file-safe"""
+    return f"s{part.encode('utf-8').hex()}"
+
+
+def shard_part(shard: str) -> str:
+    """Inverse of part_shard"""
+    return bytes.fromhex(shard[1:]).decode("utf-8")
+
+
+def _node() -> dict:
+    return {"time": 0, "children": {}}
+
+
+class PrefixIndex(ProjectIndex):
+    """Trie of labels. Every node is {"time": secs, "last": timestamp,
+    "children": {...}}, plus "own": secs and "own_last" when the node's
+    path is itself a label. "last" is the latest end of a timing in the
+    subtree. Seconds are truncated per timing, like LocalTimer.summary().
+    A shard holds the node of one top-level part."""
+
+    name = "prefix"
+
+    def empty(self) -> dict:
+        return _node()
+
+    def entries(self, interval: Interval):
+        path = split_label(self.timer.labels.label(interval.task))
+        shard = part_shard(path[0]) if path else ROOT_SHARD
+        return ((shard, (path[1:], int(interval.duration), interval.end)),)
+
+    def add(self, data: dict, item: tuple[list[str], int, float]) -> None:
+        path, secs, end = item
+        node = data
+        for part in [None] + path:
+            if part is not None:
+                node = node["children"].setdefault(part, _node())
+            node["time"] += secs
+            node["last"] = max(node.get("last", 0.0), end)
+        node["own"] = node.get("own", 0) + secs
+        node["own_last"] = max(node.get("own_last", 0.0), end)
+
+    def _load(self, shard: str) -> dict | None:
+        return self.timer.store.load_index(self._shard_key(shard))
+
+    def rows(
+        self, prefix: str | None = None, depth: int | None = None
+    ) -> Iterator[tuple[str, int, float]]:
+        """(label, seconds, last end) of every label under prefix, with
+        labels deeper than depth parts rolled up into their ancestor, in
+        no particular order"""
+        self.ensure_built()
+        path = split_label(prefix or "")
+        if path:
+            node = self._load(part_shard(path[0]))
+            for part in path[1:]:
+                if node is None:
+                    return
+                node = node["children"].get(part)
+            if node is None:
+                return
+            stack = [(path, node)]
+        else:
+            stack = []
+            for shard in self.shard_names():
+                node = self._load(shard)
+                if shard != ROOT_SHARD:
+                    stack.append(([shard_part(shard)], node))
+                elif "own" in node:
+                    yield "", node["own"], node["own_last"]
+        while stack:
+            path, node = stack.pop()
+            if depth is not None and len(path) >= depth:
+                yield SEPARATOR.join(path), node["time"], node["last"]
+                continue
+            if "own" in node:
+                yield SEPARATOR.join(path), node["own"], node["own_last"]
+            stack.extend(
+                (path + [part], child)
+                for part, child in node["children"].items()
+            )
+
+    def totals(
+        self, prefix: str | None = None, depth: int | None = None
+    ) -> dict[str, int]:
+        """Seconds of every label under prefix, by label"""
+        return dict(sorted(row[:2] for row in self.rows(prefix, depth)))
+
+    def top(
+        self,
+        count: int | None,
+        sort: str = "time",
+        prefix: str | None = None,
+        depth: int | None = None,
+    ) -> list[tuple[str, int]]:
+        """(label, seconds) of the first count labels under prefix (all
+        of them for None), most time, first name or most recently stopped
+        first. Selects them with a heap of count rows instead of sorting
+        every label."""
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort {sort}")
+        rows = self.rows(prefix, depth)
+        key = operator.itemgetter(SORT_COLUMNS[sort])
+        if count is None:
+            ranked = sorted(rows, key=key, reverse=sort != "name")
+        elif sort == "name":
+            ranked = heapq.nsmallest(count, rows, key=key)
+        else:
+            ranked = heapq.nlargest(count, rows, key=key)
+        return [row[:2] for row in ranked]
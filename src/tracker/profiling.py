@@ -0,0 +1,170 @@
+"""Profiling module. Opt-in cProfile and per-phase wall-clock timing for the
+CLI and the server. Everything here is a no-op unless profiling is on."""
+
+from __future__ import annotations
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+
+PROFILE_ENV = "TRACKER_PROFILE"
+SAMPLE_ENV = "TRACKER_PROFILE_SAMPLE"
+DEFAULT_SAMPLE = 0.1
+
+# Phase totals for the command or request being profiled, or None.
+_phases: ContextVar[dict[str, float] | None] = ContextVar(
+    "tracker_phases", default=None
+)
+_NO_PHASE = nullcontext()
+
+
+class _Phase:
+    """Adds the wall time of a block to a phase total"""
+
+    def __init__(self, totals: dict[str, float], name: str):
+        self.totals = totals
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.totals[self.name] = self.totals.get(self.name, 0.0) + elapsed
+
+
+def phase(name: str):
+    """Context manager timing a phase such as "storage" or "render".
+    Returns a shared do-nothing context when profiling is off."""
+    totals = _phases.get()
+    if totals is None:
+        return _NO_PHASE
+    return _Phase(totals, name)
+
+
+class Profiler:
+    """Profiles everything between start() and stop() with cProfile and
+    phase timers. stop() writes pstats data to path and the phase times
+    to path + ".phases.json"."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.profile = cProfile.Profile()
+        self.totals: dict[str, float] = {}
+        self.began = 0.0
+        self.token = None
+
+    def start(self) -> None:
+        """Starts profiling"""
+        self.token = _phases.set(self.totals)
+        self.began = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self) -> None:
+        """Stops profiling and writes the results"""
+        self.profile.disable()
+        wall = time.perf_counter() - self.began
+        _phases.reset(self.token)
+        self.profile.dump_stats(self.path)
+        with open(
+            str(self.path) + ".phases.json", "w", encoding="utf-8"
+        ) as wfile:
+            json.dump({"wall": wall, "phases": self.totals}, wfile, indent=2)
+        print(f"Profile written to {self.path}", file=sys.stderr)
+        for name, secs in sorted(self.totals.items()):
+            print(f"  {name:10} {secs * 1000:10.2f} ms", file=sys.stderr)
+        print(f"  {'wall':10} {wall * 1000:10.2f} ms", file=sys.stderr)
+
+
+def profile_path(args: list[str]) -> tuple[str | None, list[str]]:
+    """Finds a --profile[=path] option (or TRACKER_PROFILE) in front of
+    the subcommand. Returns the profile path and the remaining args."""
+    path = os.environ.get(PROFILE_ENV) or None
+    if args and args[0].split("=")[0] == "--profile":
+        path = args[0][len("--profile=") :] or "tracker.prof"
+        args = args[1:]
+    return path, args
+
+
+class RequestProfiler:
+    """Profiles a sampled fraction of server requests and merges them into
+    one pstats file per route under a directory."""
+
+    def __init__(self, directory: str | Path, sample: float):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sample = sample
+        self.stats: dict[str, pstats.Stats] = {}
+        self.phases: dict[str, dict[str, float]] = {}
+        self.lock = threading.Lock()
+        # cProfile can only profile one request at a time.
+        self.busy = threading.Lock()
+        self.local = threading.local()
+
+    def begin(self) -> None:
+        """Starts profiling the current request if it is sampled"""
+        self.local.current = None
+        if random.random() >= self.sample or not self.busy.acquire(False):
+            return
+        totals: dict[str, float] = {}
+        profile = cProfile.Profile()
+        self.local.current = (profile, totals)
+        _phases.set(totals)
+        profile.enable()
+
+    def end(self, route: str) -> None:
+        """Stops profiling the current request and merges the results"""
+        current = getattr(self.local, "current", None)
+        if current is None:
+            return
+        profile, totals = current
+        profile.disable()
+        self.local.current = None
+        _phases.set(None)
+        self.busy.release()
+        with self.lock:
+            if route in self.stats:
+                self.stats[route].add(profile)
+            else:
+                self.stats[route] = pstats.Stats(profile)
+            self.stats[route].dump_stats(self.directory / f"{route}.prof")
+            merged = self.phases.setdefault(route, {"requests": 0})
+            merged["requests"] += 1
+            for name, secs in totals.items():
+                merged[name] = merged.get(name, 0.0) + secs
+            with open(
+                self.directory / f"{route}.phases.json", "w", encoding="utf-8"
+            ) as wfile:
+                json.dump(merged, wfile, indent=2)
+
+
+def install_request_profiler(app) -> RequestProfiler | None:
+    """Hooks a RequestProfiler into a Flask app when TRACKER_PROFILE names
+    a directory. TRACKER_PROFILE_SAMPLE sets the sampled fraction."""
+    directory = os.environ.get(PROFILE_ENV)
+    if not directory:
+        return None
+    profiler = RequestProfiler(
+        directory, float(os.environ.get(SAMPLE_ENV, DEFAULT_SAMPLE))
+    )
+
+    @app.before_request
+    def begin_profile():
+        profiler.begin()
+
+    @app.teardown_request
+    def end_profile(_exc):
+        # Imported here so the CLI never needs flask.
+        from flask import request
+
+        profiler.end(request.endpoint or "unknown")
+
+    return profiler
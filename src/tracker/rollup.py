@@ -0,0 +1,96 @@
+"""Rollup module. Time per calendar day, ISO week and month for every task
+and user, kept in a project index. Intervals crossing a bucket boundary
+are split between the buckets, in local time."""
+
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from tracker.index import Interval, ProjectIndex
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def bucket_start(moment: datetime, by: str) -> date:
+    """First day of the bucket holding moment"""
+    day = moment.date()
+    if by == "day":
+        return day
+    if by == "week":
+        return day - timedelta(days=day.weekday())
+    if by == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown rollup granularity {by}")
+
+
+def next_bucket(start: date, by: str) -> date:
+    """First day of the bucket after the one starting on start"""
+    if by == "day":
+        return start + timedelta(days=1)
+    if by == "week":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def bucket_key(start: date, by: str) -> str:
+    """2023-10-31, 2023-W44 or 2023-10"""
+    if by == "day":
+        return start.isoformat()
+    if by == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02}"
+    return f"{start.year}-{start.month:02}"
+
+
+def split(start: float, end: float, by: str) -> list[tuple[str, float]]:
+    """Seconds of [start, end) falling in each bucket, by bucket key"""
+    parts = []
+    current = bucket_start(datetime.fromtimestamp(start), by)
+    while start < end:
+        following = next_bucket(current, by)
+        boundary = datetime.combine(following, datetime.min.time())
+        cut = min(end, boundary.timestamp())
+        parts.append((bucket_key(current, by), cut - start))
+        start, current = cut, following
+    return parts
+
+
+class RollupIndex(ProjectIndex):
+    """Seconds per task and user of every bucket, one "<granularity>/<bucket
+    key>" shard per bucket: {task: {user: secs}}. A stop() rewrites the
+    few buckets its interval falls in."""
+
+    name = "rollup"
+
+    def empty(self) -> dict:
+        return {}
+
+    def entries(self, interval: Interval):
+        return [
+            (f"{by}/{key}", (interval.task, interval.user, secs))
+            for by in GRANULARITIES
+            for key, secs in split(interval.start, interval.end, by)
+        ]
+
+    def add(self, data: dict, item: tuple[str, str, float]) -> None:
+        task, user, secs = item
+        users = data.setdefault(task, {})
+        users[user] = users.get(user, 0.0) + secs
+
+    def buckets(
+        self, by: str, first: str | None = None, last: str | None = None
+    ) -> dict[str, dict[str, dict[str, float]]]:
+        """The buckets of one granularity from first to last (inclusive
+        bucket keys), in order. Only the shards in that range are read."""
+        if by not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity {by}")
+        buckets = {}
+        for name in self.shard_names(by):
+            key = name[len(by) + 1 :]
+            if (first is None or key >= first) and (
+                last is None or key <= last
+            ):
+                buckets[key] = self.timer.store.load_index(
+                    self._shard_key(name)
+                )
+        return buckets
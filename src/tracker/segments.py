@@ -0,0 +1,272 @@
+"""Segments module. Compaction moves the finished timings of a task out of
+its growing finished-timers file into immutable segment files under
+<project>/segments/<task>/. A segment starts with a one-line JSON header
+holding its totals, per-user totals and time range, so aggregates read the
+header and never the timings below it.
+
+Timings older than a cutoff go to cold segments, whose timings are stored
+zlib-compressed and only decompressed when a caller needs them."""
+
+from __future__ import annotations
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from tracker.config import Project
+from tracker.index import file_lock
+
+AUTO_COMPACT_ENV = "TRACKER_AUTO_COMPACT"
+COLD_AFTER_ENV = "TRACKER_COLD_AFTER"
+COLD_COMPRESSION = "zlib"
+COLD_LEVEL = 6
+SEGMENT_SUFFIX = ".seg"
+# A segment's timings are moved here first, so a crash mid-compaction never
+# loses them: readers treat pending files like the live tail until every
+# segment sealed from one exists, then read only the segments.
+PENDING_SUFFIX = ".pending"
+
+
+def segment_dirs(project: Project) -> dict[str, Path]:
+    """The segment directory of every compacted task"""
+    if not project.segments_path.exists():
+        return {}
+    return {
+        path.name: path
+        for path in sorted(project.segments_path.iterdir())
+        if path.is_dir()
+    }
+
+
+def _sealed_names(pending: Path) -> tuple[str, str]:
+    """Segment names of a pending file split in two: the cold part, then
+    the rest. _seal() writes the second one last."""
+    return f"{pending.stem}-0", f"{pending.stem}-1"
+
+
+def _is_sealed(pending: Path) -> bool:
+    """Whether every segment of a pending file has been written, so the
+    pending file is only left over from a crash before its removal"""
+    last = _sealed_names(pending)[1]
+    return any(
+        pending.with_name(name + SEGMENT_SUFFIX).exists()
+        for name in (pending.stem, last)
+    )
+
+
+def segment_files(directory: Path) -> list[Path]:
+    """The segments of one task, oldest first. The first half of a pending
+    file still being sealed is left out; its timings are in the pending
+    file."""
+    segments = sorted(directory.glob("*" + SEGMENT_SUFFIX))
+    names = {path.stem for path in segments}
+    return [
+        path
+        for path in segments
+        if not path.stem.endswith("-0") or path.stem[:-2] + "-1" in names
+    ]
+
+
+def pending_files(directory: Path) -> list[Path]:
+    """Timings of one task taken out of the tail but not yet in a
+    segment. Pending files whose segments all exist are left out."""
+    return [
+        path
+        for path in sorted(directory.glob("*" + PENDING_SUFFIX))
+        if not _is_sealed(path)
+    ]
+
+
+def read_header(path: Path) -> dict:
+    """The header of a segment, without reading its timings"""
+    with open(path, "rb") as rfile:
+        return json.loads(rfile.readline())
+
+
+def read_body(path: Path) -> bytes:
+    """The finished-timer lines stored in a segment, decompressed if the
+    segment is cold"""
+    with open(path, "rb") as rfile:
+        header = json.loads(rfile.readline())
+        body = rfile.read()
+    if header.get("compression") == COLD_COMPRESSION:
+        return zlib.decompress(body)
+    return body
+
+
+def overlaps(header: dict, since: float | None, until: float | None) -> bool:
+    """Whether a segment may hold timings between since and until"""
+    if not header["count"]:
+        return False
+    if since is not None and header["last"] < since:
+        return False
+    return until is None or header["first"] <= until
+
+
+def build_header(task: str, lines: list[str]) -> dict:
+    """Totals, per-user totals and time range of finished-timer lines"""
+    header = {
+        "task": task,
+        "count": 0,
+        "total": 0.0,
+        "seconds": 0,
+        "users": {},
+        "first": None,
+        "last": None,
+        "created": time.time(),
+        "compression": None,
+    }
+    users = header["users"]
+    for line in lines:
+        time_range, _, user = line.rstrip().partition(";")
+        start, end, duration = (float(part) for part in time_range.split(":"))
+        header["count"] += 1
+        header["total"] += duration
+        # Matches LocalTimer.summary(), which truncates each duration.
+        header["seconds"] += int(duration)
+        users[user] = users.get(user, 0.0) + duration
+        if header["first"] is None or start < header["first"]:
+            header["first"] = start
+        if header["last"] is None or end > header["last"]:
+            header["last"] = end
+    return header
+
+
+def _write_segment(path: Path, header: dict, body: bytes) -> None:
+    """Atomically writes a segment, compressing the body if it is cold"""
+    if header["compression"] == COLD_COMPRESSION:
+        body = zlib.compress(body, COLD_LEVEL)
+    temp_path = path.with_name(f".{path.name}.tmp")
+    with open(temp_path, "wb") as wfile:
+        wfile.write(json.dumps(header).encode("utf-8") + b"\n")
+        wfile.write(body)
+        wfile.flush()
+        os.fsync(wfile.fileno())
+    os.replace(temp_path, path)
+
+
+def _seal(pending: Path, cold_before: float | None = None) -> list[Path]:
+    """Turns a pending file into segments: one of timings that ended
+    before cold_before, stored cold, and one of the rest. Segments left by
+    an earlier, interrupted seal are replaced; a pending file whose
+    segments were all written is just removed."""
+    if _is_sealed(pending):
+        pending.unlink()
+        return []
+    for name in _sealed_names(pending):
+        pending.with_name(name + SEGMENT_SUFFIX).unlink(missing_ok=True)
+    with open(pending, "rb") as rfile:
+        lines = rfile.read().decode("utf-8").splitlines()
+    old: list[str] = []
+    recent: list[str] = []
+    for line in lines:
+        if not line:
+            continue
+        end = float(line.partition(";")[0].split(":")[1])
+        if cold_before is not None and end < cold_before:
+            old.append(line)
+        else:
+            recent.append(line)
+    pieces = [
+        (part, cold) for part, cold in ((old, True), (recent, False)) if part
+    ]
+    names = [pending.stem]
+    if len(pieces) == 2:
+        names = list(_sealed_names(pending))
+    segments = []
+    for name, (part, cold) in zip(names, pieces):
+        header = build_header(pending.parent.name, part)
+        if cold:
+            header["compression"] = COLD_COMPRESSION
+        body = "".join(line + "\n" for line in part).encode("utf-8")
+        segment = pending.with_name(name + SEGMENT_SUFFIX)
+        _write_segment(segment, header, body)
+        segments.append(segment)
+    pending.unlink()
+    return segments
+
+
+def _interrupted(directory: Path) -> list[Path]:
+    return sorted(directory.glob("*" + PENDING_SUFFIX))
+
+
+def _next_number(directory: Path) -> int:
+    numbers = [
+        int(path.name[:6])
+        for path in directory.iterdir()
+        if path.name[:6].isdigit()
+    ]
+    return max(numbers, default=-1) + 1
+
+
+def compact_task(
+    project: Project, task: str, cold_before: float | None = None
+) -> list[Path]:
+    """Moves the live timings of one task into new segments, those that
+    ended before cold_before into a cold one"""
+    tail = project.finished_timers_path / (task + ".txt")
+    directory = project.segments_path / task
+    # The lock TextStore.append() takes, so a stop in another process
+    # appends either before the tail is moved or to the new tail.
+    with file_lock(tail):
+        segments = []
+        # Pending files left by an interrupted compaction, sealed or not
+        for pending in _interrupted(directory):
+            segments.extend(_seal(pending, cold_before))
+        if not tail.exists() or not tail.stat().st_size:
+            return segments
+        directory.mkdir(parents=True, exist_ok=True)
+        pending = directory / f"{_next_number(directory):06}{PENDING_SUFFIX}"
+        os.replace(tail, pending)
+        # An empty tail keeps the task listed until it is stopped again.
+        tail.touch()
+        return segments + _seal(pending, cold_before)
+
+
+def freeze(project: Project, cold_before: float) -> list[Path]:
+    """Compresses, in place, every segment whose timings all ended before
+    cold_before. Segments straddling the cutoff stay as they are."""
+    frozen = []
+    for directory in segment_dirs(project).values():
+        for segment in segment_files(directory):
+            header = read_header(segment)
+            if header.get("compression") or header["last"] >= cold_before:
+                continue
+            body = read_body(segment)
+            header["compression"] = COLD_COMPRESSION
+            _write_segment(segment, header, body)
+            frozen.append(segment)
+    return frozen
+
+
+def cold_cutoff() -> float | None:
+    """Timestamp before which timings go cold, from TRACKER_COLD_AFTER
+    (days); None when unset"""
+    days = os.environ.get(COLD_AFTER_ENV)
+    return time.time() - float(days) * 86400 if days else None
+
+
+def auto_compact_bytes() -> int:
+    """Live-file size at which stop() compacts a task, from
+    TRACKER_AUTO_COMPACT; 0 (the default) never compacts automatically"""
+    return int(os.environ.get(AUTO_COMPACT_ENV) or 0)
+
+
+def compact(
+    project: Project, min_bytes: int = 0, cold_before: float | None = None
+) -> list[Path]:
+    """Compacts every task whose live file holds at least min_bytes and,
+    given cold_before, moves older timings to cold segments. Returns the
+    new and compressed segments."""
+    segments = []
+    directories = segment_dirs(project)
+    for tail in sorted(project.finished_timers_path.iterdir()):
+        size = tail.stat().st_size
+        directory = directories.get(tail.stem)
+        if (size and size >= min_bytes) or (
+            directory and _interrupted(directory)
+        ):
+            segments.extend(compact_task(project, tail.stem, cold_before))
+    if cold_before is not None:
+        segments.extend(freeze(project, cold_before))
+    return segments
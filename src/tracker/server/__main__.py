@@ -1,8 +1,27 @@
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from flask import Flask, abort, request, jsonify
+from flask import Flask, Response, abort, g, request, jsonify
 from itsdangerous import URLSafeSerializer
 from tracker.config import Config, Project
+from tracker.durability import durability
+from tracker.events import BUS
+from tracker.metrics import (
+    ERRORS,
+    LATENCY,
+    REGISTRY,
+    REQUESTS,
+    STORAGE_BYTES,
+    record_cache,
+)
+from tracker.prefix import SORTS
+from tracker.profiling import install_request_profiler
+from tracker.rollup import GRANULARITIES
+from tracker.store import STORAGE_KINDS, MemoryStore, TextStore
+from tracker.tracing import TRACE_HEADER, span
 from tracker.timer import (
     LocalTimer,
     TimerException,
@@ -12,9 +31,89 @@ from tracker.timer import (
 )
 
 app = Flask(__name__)
+install_request_profiler(app)
 
 SERVER_CONFIG_ROOT = Path("./.tracker-server")
 AUTH_KEY = "username"
+TIMINGS_CACHE_SIZE = 128
+# Long polls wait at most CHANGES_MAX_WAIT, CHANGES_DEFAULT_WAIT unless
+# asked otherwise; event streams send a keep-alive comment every
+# CHANGES_DEFAULT_WAIT.
+CHANGES_MAX_WAIT = 60.0
+CHANGES_DEFAULT_WAIT = 25.0
+
+# "text" keeps timings in SERVER_CONFIG_ROOT; "memory" keeps them in this
+# process only, for benchmarks and throwaway servers
+SERVER_STORAGE = os.environ.get("TRACKER_SERVER_STORAGE", "text")
+if SERVER_STORAGE not in STORAGE_KINDS:
+    raise ValueError(f"Unknown TRACKER_SERVER_STORAGE {SERVER_STORAGE!r}")
+# Text storage syncs stopped timings in group commits unless
+# TRACKER_DURABILITY says otherwise: a server acknowledges a stop to a
+# client that will not send it again.
+SERVER_DURABILITY = durability("batched")
+
+# project key -> MemoryStore, when SERVER_STORAGE is "memory"
+memory_stores: dict[str, MemoryStore] = {}
+memory_stores_lock = threading.Lock()
+
+# project key -> (LocalTimer.fingerprint(), table()) for /api/times
+timings_cache: OrderedDict[str, tuple] = OrderedDict()
+timings_cache_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.bytes_read = 0
+    g.span = span(
+        f"server.{request.endpoint}",
+        parent=request.headers.get(TRACE_HEADER),
+    )
+    g.span.__enter__()
+
+
+@app.teardown_request
+def end_request_span(exc):
+    request_span = g.pop("span", None)
+    if request_span is not None:
+        request_span.__exit__(type(exc) if exc else None, exc, None)
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.endpoint or "unknown"
+    LATENCY.observe(time.perf_counter() - g.request_start, route)
+    REQUESTS.inc(route, str(response.status_code))
+    STORAGE_BYTES.observe(g.bytes_read, route)
+    if response.status_code >= 500:
+        ERRORS.inc(route, "internal")
+    return response
+
+
+def error(error_type):
+    """Counts an error and builds its JSON response"""
+    ERRORS.inc(request.endpoint or "unknown", error_type)
+    return jsonify({"result": "error", "type": error_type})
+
+
+def timer_for(proj: Project) -> LocalTimer:
+    """A timer of the project on the server's storage"""
+    if SERVER_STORAGE == "text":
+        return LocalTimer(
+            proj, store=TextStore(proj, durability_mode=SERVER_DURABILITY)
+        )
+    with memory_stores_lock:
+        store = memory_stores.setdefault(proj.name, MemoryStore())
+    return LocalTimer(proj, store=store)
+
+
+def existing_project(key: str) -> Project | None:
+    """The project of a key, None when the key names no project. Unlike
+    the start route, never creates one."""
+    if not key or key.startswith(".") or Path(key).name != key:
+        return None
+    proj = Project(key, config=Config(SERVER_CONFIG_ROOT))
+    return proj if proj.exists() else None
 
 
 def generate_key(project, username):
@@ -54,6 +153,8 @@ def delete_project():
     config = Config(SERVER_CONFIG_ROOT)
     proj = Project(key, config=config)
     proj.delete()
+    with memory_stores_lock:
+        memory_stores.pop(key, None)
 
     return jsonify({})
 
@@ -89,19 +190,21 @@ def start():
     config = Config(SERVER_CONFIG_ROOT)
     proj = Project(key, config=config, user=user)
     config.set_project(proj)
-    timer = LocalTimer(proj)
+    timer = timer_for(proj)
 
     try:
         timer.start(f["label"])
+        g.bytes_read = timer.bytes_read
+        BUS.publish(key, "start", task=f["label"], user=user, time=time.time())
 
     except BadLabelException:
-        return jsonify({"result": "error", "type": "bad_label"})
+        return error("bad_label")
 
     except DupStartException:
-        return jsonify({"result": "error", "type": "dup_start"})
+        return error("dup_start")
 
     except TimerException:
-        return jsonify({"result": "error", "type": "internal"})
+        return error("internal")
 
     return jsonify({"result": "ok"})
 
@@ -137,18 +240,20 @@ def stop():
     config = Config(SERVER_CONFIG_ROOT)
     proj = Project(key, config=config, user=user)
     config.set_project(proj)
-    timer = LocalTimer(proj)
+    timer = timer_for(proj)
 
     try:
         timer.stop(f["label"])
+        g.bytes_read = timer.bytes_read
+        BUS.publish(key, "stop", task=f["label"], user=user, time=time.time())
 
     except NoStartException:
-        return jsonify({"result": "error", "type": "no_start"})
+        return error("no_start")
 
     except BadLabelException:
-        return jsonify({"result": "error", "type": "bad_label"})
+        return error("bad_label")
     except TimerException:
-        return jsonify({"result": "error", "type": "internal"})
+        return error("internal")
 
     return jsonify({"result": "ok"})
 
@@ -178,12 +283,12 @@ def tasks():
     config = Config(SERVER_CONFIG_ROOT)
     proj = Project(key, config=config)
     config.set_project(proj)
-    timer = LocalTimer(proj)
+    timer = timer_for(proj)
 
     try:
         tuple_of_lists = timer.tasks()
     except TimerException:
-        return jsonify({"result": "error", "type": "internal"})
+        return error("internal")
 
     return jsonify(
         {
@@ -217,6 +322,11 @@ def task_times():
     If both are provided, the server will return either
         { "result": "ok", "timings": {...} }
     where 'timings': { 'task_name1': [(duration:float,user:str), ...], ... }
+    or, with ?format=table in the query string,
+        { "result": "ok", "table": {...} }
+    where 'table' holds the columns of tracker.table.TimingTable.to_dict()
+    'since' and 'until' (timestamps) in the query string limit the
+    timings to those overlapping that range
     or
         { "result": "error", "type": ERROR_STR }
     where ERROR_STR is currently one of
@@ -230,13 +340,294 @@ def task_times():
     config = Config(SERVER_CONFIG_ROOT)
     proj = Project(key, config=config)
     config.set_project(proj)
-    timer = LocalTimer(proj)
+    timer = timer_for(proj)
+    since = request.args.get("since", type=float)
+    until = request.args.get("until", type=float)
+    ranged = since is not None or until is not None
     try:
-        timings = timer.details()
+        fingerprint = timer.fingerprint()
+        with timings_cache_lock:
+            cached = timings_cache.get(key)
+        hit = cached is not None and cached[0] == fingerprint
+        record_cache("timings", hit)
+        capabilities = timer.store.capabilities
+        if hit:
+            table = cached[1].between(since, until) if ranged else cached[1]
+        elif "persistent" not in capabilities or (
+            ranged and "ranges" in capabilities
+        ):
+            # A store in memory is as fast as the cache, and a ranged
+            # read only reads the timings in range, so nothing is cached.
+            table = timer.table(since, until)
+            g.bytes_read = timer.bytes_read
+        else:
+            table = timer.table()
+            g.bytes_read = timer.bytes_read
+            with timings_cache_lock:
+                timings_cache[key] = (fingerprint, table)
+                timings_cache.move_to_end(key)
+                if len(timings_cache) > TIMINGS_CACHE_SIZE:
+                    timings_cache.popitem(last=False)
+            if ranged:
+                table = table.between(since, until)
     except TimerException:
-        return jsonify({"result": "error", "type": "internal"})
+        return error("internal")
+
+    if request.args.get("format") == "table":
+        return jsonify({"result": "ok", "table": table.to_dict()})
+    return jsonify({"result": "ok", "timings": table.details()})
+
+
+@app.route("/api/summary", methods=["GET"])
+def summary():
+    """
+    The client must provide a project key via BasicAuth,
+    optionally with a label 'prefix' such as clientx/, a
+    'depth' (number of label parts), a 'top' row count and a
+    'sort' (time, name or recent) in the query string.
+    Failure to do so, a depth or top that is not a positive
+    number, or an unknown sort will result in a 400 error.
+
+    If both are provided, the server will return either
+        { "result": "ok", "rows": [...] }
+    where 'rows': [ [ 'task', { 'hours': h, 'minutes': m,
+    'seconds': s, 'time': secs } ], ... ] in the order asked for,
+    holding at most 'top' rows
+    or
+        { "result": "error", "type": ERROR_STR }
+    where ERROR_STR is currently one of
+        "internal"  -- unknown internal error; could be undefined project
+    """
+    key = ""
+    if request.authorization:
+        key = request.authorization.get(AUTH_KEY)
+    args = request.args
+    counts = {}
+    for name in ("depth", "top"):
+        value = args.get(name)
+        if value is not None and (not value.isdigit() or not int(value)):
+            abort(400)
+        counts[name] = None if value is None else int(value)
+    if not key or args.get("sort", "time") not in SORTS:
+        abort(400)
+    config = Config(SERVER_CONFIG_ROOT)
+    proj = Project(key, config=config)
+    config.set_project(proj)
+    timer = timer_for(proj)
+    try:
+        summary_dict = timer.summary(
+            args.get("prefix"),
+            counts["depth"],
+            counts["top"],
+            args.get("sort"),
+        )
+        g.bytes_read = timer.bytes_read
+    except TimerException:
+        return error("internal")
+
+    # A list, as JSON objects are sent with sorted keys.
+    return jsonify({"result": "ok", "rows": list(summary_dict.items())})
+
+
+@app.route("/api/stats", methods=["GET"])
+def task_stats():
+    """
+    The client must provide a project key via
+    BasicAuth.
+    Failure to do so will result in a 400 error.
+
+    If both are provided, the server will return either
+        { "result": "ok", "stats": {...} }
+    where 'stats': { 'task_name1': { 'user': sketch, ... }, ... } and each
+    sketch is a tracker.stats.QuantileSketch in its to_dict() form
+    or
+        { "result": "error", "type": ERROR_STR }
+    where ERROR_STR is currently one of
+        "internal"  -- unknown internal error; could be undefined project
+    """
+    key = ""
+    if request.authorization:
+        key = request.authorization.get(AUTH_KEY)
+    if not key:
+        abort(400)
+    config = Config(SERVER_CONFIG_ROOT)
+    proj = Project(key, config=config)
+    config.set_project(proj)
+    timer = timer_for(proj)
+    try:
+        sketches = timer.stats()
+        g.bytes_read = timer.bytes_read
+    except TimerException:
+        return error("internal")
+
+    return jsonify(
+        {
+            "result": "ok",
+            "stats": {
+                task: {
+                    user: sketch.to_dict() for user, sketch in users.items()
+                }
+                for task, users in sketches.items()
+            },
+        }
+    )
+
+
+@app.route("/api/report", methods=["GET"])
+def report():
+    """
+    The client must provide a project key via BasicAuth
+    and 'by' (day, week or month) in the query string,
+    optionally with 'from' and 'to' bucket keys such as
+    2023-10-31, 2023-W44 or 2023-10.
+    Failure to do so will result in a 400 error.
+
+    If both are provided, the server will return either
+        { "result": "ok", "report": {...} }
+    where 'report': { 'bucket': { 'task': { 'user': secs, ... } } }
+    or
+        { "result": "error", "type": ERROR_STR }
+    where ERROR_STR is currently one of
+        "internal"  -- unknown internal error; could be undefined project
+    """
+    key = ""
+    if request.authorization:
+        key = request.authorization.get(AUTH_KEY)
+    args = request.args
+    if not key or args.get("by") not in GRANULARITIES:
+        abort(400)
+    config = Config(SERVER_CONFIG_ROOT)
+    proj = Project(key, config=config)
+    config.set_project(proj)
+    timer = timer_for(proj)
+    try:
+        buckets = timer.report(args["by"], args.get("from"), args.get("to"))
+        g.bytes_read = timer.bytes_read
+    except TimerException:
+        return error("internal")
+
+    return jsonify({"result": "ok", "report": buckets})
+
+
+@app.route("/api/users/<path:name>/times", methods=["GET"])
+def user_times(name):
+    """
+    The client must provide a project key via BasicAuth.
+    Failure to do so will result in a 400 error.
+
+    If both are provided, the server will return either
+        { "result": "ok", "times": {...} }
+    where 'times': { 'task': { 'time': secs, 'count': n,
+    'first': start, 'last': end }, ... } for the tasks user
+    'name' tracked time on, read from that user's index only
+    or
+        { "result": "error", "type": ERROR_STR }
+    where ERROR_STR is currently one of
+        "internal"  -- unknown internal error; could be undefined project
+    """
+    key = ""
+    if request.authorization:
+        key = request.authorization.get(AUTH_KEY)
+    if not key:
+        abort(400)
+    config = Config(SERVER_CONFIG_ROOT)
+    proj = Project(key, config=config)
+    config.set_project(proj)
+    timer = timer_for(proj)
+    try:
+        times = timer.user_times(name)
+        g.bytes_read = timer.bytes_read
+    except TimerException:
+        return error("internal")
+
+    return jsonify({"result": "ok", "times": times})
+
+
+def event_stream(key: str, cursor: int):
+    """Server-sent events of a project after cursor, forever"""
+    while True:
+        version, events, reset = BUS.since(key, cursor, CHANGES_DEFAULT_WAIT)
+        if reset:
+            yield f"id: {version}\nevent: reset\ndata: {{}}\n\n"
+        for event in events:
+            yield (
+                f"id: {event['version']}\nevent: {event['type']}\n"
+                f"data: {json.dumps(event)}\n\n"
+            )
+        if not events and not reset:
+            yield ": keep-alive\n\n"
+        cursor = version
+
+
+@app.route("/api/changes", methods=["GET"])
+def changes():
+    """
+    The client must provide a project key via BasicAuth,
+    optionally with a 'since' version cursor and a 'timeout'
+    in seconds (at most 60) in the query string.
+    Failure to do so, or a cursor or timeout that is not a
+    number, will result in a 400 error.
+
+    Without a cursor the server returns the current version
+    at once. Otherwise it waits until the project has a start
+    or stop event past the cursor, or the timeout passes, and
+    returns
+        { "result": "ok", "version": v, "events": [...],
+          "reset": bool }
+    where each event is { 'version': n, 'type': 'start' or
+    'stop', 'task': label, 'user': user, 'time': ts } and
+    'reset' means events past the cursor are no longer known,
+    so the client should reread /api/tasks.
+
+    With 'Accept: text/event-stream' or 'format=sse' the
+    server instead streams the events as server-sent events,
+    starting after 'since' or the Last-Event-ID header.
+
+    A key naming no project returns
+        { "result": "error", "type": "no_project" }
+    """
+    key = ""
+    if request.authorization:
+        key = request.authorization.get(AUTH_KEY)
+    args = request.args
+    cursor = args.get("since", request.headers.get("Last-Event-ID"))
+    try:
+        cursor = None if cursor is None else int(cursor)
+        timeout = float(args.get("timeout", CHANGES_DEFAULT_WAIT))
+    except ValueError:
+        abort(400)
+    if not key or (cursor is not None and cursor < 0):
+        abort(400)
+    if existing_project(key) is None:
+        return error("no_project")
+    if cursor is None:
+        cursor = BUS.version(key)
+
+    if (
+        args.get("format") == "sse"
+        or request.accept_mimetypes.best == "text/event-stream"
+    ):
+        return Response(
+            event_stream(key, cursor),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    if "since" not in args:
+        timeout = 0.0
+    version, events, reset = BUS.since(
+        key, cursor, min(max(timeout, 0.0), CHANGES_MAX_WAIT)
+    )
+    return jsonify(
+        {"result": "ok", "version": version, "events": events, "reset": reset}
+    )
+
 
-    return jsonify({"result": "ok", "timings": timings})
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Request, error, latency, storage and cache metrics in the
+    Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/")
@@ -244,4 +635,5 @@ def index():
     return "Server running... brief documentation should go here"
 
 
-app.run(host="0.0.0.0")
+if __name__ == "__main__":
+    app.run(host="0.0.0.0")
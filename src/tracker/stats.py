@@ -0,0 +1,174 @@
+"""Stats module. Mergeable quantile sketches of timing durations, kept per
+task and user in a project index so percentiles and histograms never need
+the individual intervals."""
+
+from __future__ import annotations
+import math
+from tracker.index import Interval, ProjectIndex
+from tracker.users import user_key, user_name
+
+RELATIVE_ACCURACY = 0.01
+# Upper bounds in seconds of the histogram buckets; the last bucket is open.
+HISTOGRAM_BOUNDS = (60, 300, 900, 1800, 3600, 7200, 14400)
+# Durations below this are counted as zero rather than given a bucket.
+MIN_VALUE = 1e-6
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch (as in DDSketch). Any quantile it
+    returns is within RELATIVE_ACCURACY of a recorded duration, and two
+    sketches merge exactly by adding their bucket counts."""
+
+    __slots__ = ("bins", "zeros", "count", "total", "low", "high")
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.bins: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+
+    def add(self, value: float) -> None:
+        """Records one duration"""
+        self.count += 1
+        self.total += value
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+        if value < MIN_VALUE:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other: QuantileSketch) -> QuantileSketch:
+        """Adds other's durations to this sketch and returns it"""
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        return self
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def mean(self) -> float:
+        """Mean duration, exact"""
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, fraction: float) -> float:
+        """Approximate duration at fraction (0 to 1) of the distribution"""
+        if not self.count:
+            return 0.0
+        rank = fraction * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return max(self.low, 0.0)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return min(max(self._value(key), self.low), self.high)
+        return self.high
+
+    def histogram(
+        self, bounds: tuple[float, ...] = HISTOGRAM_BOUNDS
+    ) -> list[int]:
+        """Counts per bucket of bounds, with one more for the open last
+        bucket. Durations near a bound may land in the next bucket."""
+        counts = [0] * (len(bounds) + 1)
+        counts[0] = self.zeros
+        for key, count in self.bins.items():
+            value = self._value(key)
+            index = next(
+                (i for i, bound in enumerate(bounds) if value < bound),
+                len(bounds),
+            )
+            counts[index] += count
+        return counts
+
+    def to_dict(self) -> dict:
+        """JSON-friendly form"""
+        return {
+            "bins": {str(key): count for key, count in self.bins.items()},
+            "zeros": self.zeros,
+            "count": self.count,
+            "total": self.total,
+            "min": self.low if self.count else None,
+            "max": self.high if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> QuantileSketch:
+        """Inverse of to_dict"""
+        sketch = cls()
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.zeros = data["zeros"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        if sketch.count:
+            sketch.low = data["min"]
+            sketch.high = data["max"]
+        return sketch
+
+
+def merged(sketches) -> QuantileSketch:
+    """A new sketch holding every duration of sketches"""
+    result = QuantileSketch()
+    for sketch in sketches:
+        result.merge(sketch)
+    return result
+
+
+def describe(sketch: QuantileSketch) -> dict:
+    """Count, mean, min/max, percentiles and histogram of a sketch"""
+    return {
+        "count": sketch.count,
+        "mean": sketch.mean(),
+        "min": sketch.low if sketch.count else 0.0,
+        "max": sketch.high if sketch.count else 0.0,
+        "p50": sketch.quantile(0.50),
+        "p90": sketch.quantile(0.90),
+        "p99": sketch.quantile(0.99),
+        "histogram": sketch.histogram(),
+    }
+
+
+class StatsIndex(ProjectIndex):
+    """A sketch per (task, user), each in its own "<task>/<user key>"
+    shard, so a stop() rewrites one sketch. Shards are folded as live
+    QuantileSketch objects and serialized once, when saved."""
+
+    name = "stats"
+
+    def empty(self) -> QuantileSketch:
+        return QuantileSketch()
+
+    def decode(self, data: dict) -> QuantileSketch:
+        return QuantileSketch.from_dict(data)
+
+    def encode(self, shard: QuantileSketch) -> dict:
+        return shard.to_dict()
+
+    def entries(self, interval: Interval):
+        shard = f"{interval.task}/{user_key(interval.user)}"
+        return ((shard, interval.duration),)
+
+    def add(self, data: QuantileSketch, item: float) -> None:
+        data.add(item)
+
+    def sketches(self) -> dict[str, dict[str, QuantileSketch]]:
+        """The sketch of every (task, user)"""
+        sketches: dict[str, dict[str, QuantileSketch]] = {}
+        for name in self.shard_names():
+            task, _, user = name.partition("/")
+            data = self.timer.store.load_index(self._shard_key(name))
+            sketches.setdefault(task, {})[
+                user_name(user)
+            ] = QuantileSketch.from_dict(data)
+        return sketches
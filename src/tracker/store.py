@@ -0,0 +1,496 @@
+"""Store module. LocalTimer keeps its timings in a TimingStore: TextStore is
+the on-disk layout of text timer files, segments and JSON indexes, and
+MemoryStore keeps everything in process memory for benchmarks, tests and an
+ephemeral server. Stores work on label-id stems, never on labels.
+
+Each store declares capabilities, so callers can take a fast path:
+    "persistent"  timings outlive the process, so caching what was read
+                  from them saves reading them again
+    "ranges"      table(since, until) skips stored timings outside the
+                  range without reading them, so it beats filtering a
+                  cached table"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator
+from tracker import parallel
+from tracker.aggregate import task_totals
+from tracker.config import Project
+from tracker.durability import (
+    DURABILITY_MODES,
+    durability,
+    group_commit,
+    sync_path,
+)
+from tracker.index import (
+    Interval,
+    file_lock,
+    lock_for,
+    parse_interval,
+    temp_path,
+)
+from tracker.labels import LabelDictionary
+from tracker.profiling import phase
+from tracker.segments import (
+    auto_compact_bytes,
+    cold_cutoff,
+    compact_task,
+    overlaps,
+    pending_files,
+    read_body,
+    read_header,
+    segment_dirs,
+    segment_files,
+)
+from tracker.table import TimingTable
+from tracker.tracing import span
+
+STORAGE_KINDS = ("text", "memory")
+
+
+class TimingStore(ABC):
+    """Active timers, finished timings and derived indexes of a project"""
+
+    capabilities: frozenset[str] = frozenset()
+
+    def __init__(self):
+        self.bytes_read = 0
+
+    @property
+    @abstractmethod
+    def labels(self) -> LabelDictionary:
+        """The label dictionary of the stored project"""
+
+    @abstractmethod
+    def active(self, task: str) -> list[str]:
+        """The "timestamp[;user]" lines of a running task, [] if stopped"""
+
+    @abstractmethod
+    def add_active(self, task: str, line: str) -> None:
+        """Adds a running timer to a task"""
+
+    @abstractmethod
+    def set_active(self, task: str, lines: list[str]) -> None:
+        """Replaces the running timers of a task; [] stops it"""
+
+    @abstractmethod
+    def active_tasks(self) -> list[str]:
+        """Every running task"""
+
+    def active_lock(self, task: str):
+        """The lock around reading and changing a task's running timers"""
+        return lock_for(Path(f"<store-{id(self)}>") / "active" / task)
+
+    @abstractmethod
+    def append(self, task: str, line: str) -> None:
+        """Adds a "start:end:duration[;user]" finished timing"""
+
+    @abstractmethod
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Finished timings, optionally only those overlapping
+        since..until"""
+
+    @abstractmethod
+    def totals(self) -> dict[str, int]:
+        """Seconds of each task, truncated per timing"""
+
+    @abstractmethod
+    def intervals(self) -> Iterator[Interval]:
+        """Every finished timing"""
+
+    @abstractmethod
+    def fingerprint(self) -> tuple:
+        """Changes whenever finished timings change"""
+
+    @abstractmethod
+    def load_index(self, key: str) -> dict | None:
+        """A derived index, None if it was never saved"""
+
+    @abstractmethod
+    def save_index(self, key: str, data: dict) -> None:
+        """Saves a derived index"""
+
+    @abstractmethod
+    def delete_index(self, key: str) -> None:
+        """Removes a derived index, if it exists"""
+
+    @abstractmethod
+    def index_keys(self, prefix: str) -> list[str]:
+        """Keys of the saved indexes under prefix/, sorted"""
+
+    def index_lock(self, key: str):
+        """The lock around rebuilding or updating an index"""
+        return lock_for(Path(f"<store-{id(self)}>") / key)
+
+    def appended(self, task: str) -> None:
+        """Called after a timing of task is appended and indexed"""
+
+
+class TextStore(TimingStore):
+    """Text timer files under the project directory"""
+
+    capabilities = frozenset({"persistent", "ranges"})
+
+    def __init__(
+        self,
+        project: Project,
+        jobs: int | None = None,
+        durability_mode: str | None = None,
+    ):
+        super().__init__()
+        self.project = project
+        # Worker processes for parsing large projects, None for all cores
+        self.jobs = jobs
+        # How appends reach the disk; TRACKER_DURABILITY when None
+        self.durability = durability_mode or durability()
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {self.durability!r}")
+        self._labels: LabelDictionary | None = None
+        if project.exists():
+            # Loaded up front so an older project is migrated to label ids
+            # before any of its files are read.
+            self._labels = LabelDictionary(project)
+
+    @property
+    def labels(self) -> LabelDictionary:
+        if self._labels is None:
+            self._labels = LabelDictionary(self.project)
+        return self._labels
+
+    def _active_path(self, task: str) -> Path:
+        return self.project.active_timers_path / (task + ".txt")
+
+    def _finished_path(self, task: str) -> Path:
+        return self.project.finished_timers_path / (task + ".txt")
+
+    def _read_lines(self, path: Path) -> list[str]:
+        """Reads a timer file's lines, counting the bytes read"""
+        with phase("storage"), span("storage.read", file=path.name):
+            with open(path, "rb") as fptr:
+                data = fptr.read()
+        self.bytes_read += len(data)
+        return data.decode("utf-8").splitlines()
+
+    def active(self, task: str) -> list[str]:
+        path = self._active_path(task)
+        return self._read_lines(path) if path.exists() else []
+
+    def add_active(self, task: str, line: str) -> None:
+        with open(self._active_path(task), "a", encoding="utf-8") as wfile:
+            wfile.write(line + "\n")
+
+    def set_active(self, task: str, lines: list[str]) -> None:
+        path = self._active_path(task)
+        if lines:
+            with open(path, "w", encoding="utf-8") as wfile:
+                wfile.write("".join(line + "\n" for line in lines))
+        else:
+            path.unlink(missing_ok=True)
+
+    def active_tasks(self) -> list[str]:
+        return [
+            path.stem for path in self.project.active_timers_path.iterdir()
+        ]
+
+    def active_lock(self, task: str):
+        return file_lock(self._active_path(task))
+
+    def append(self, task: str, line: str) -> None:
+        """Appends to the task's finished file, then makes it durable as
+        the store's durability mode says"""
+        path = self._finished_path(task)
+        with span("storage.write", file=path.name):
+            with file_lock(path):
+                created = not path.exists()
+                with open(path, "a", encoding="utf-8") as wfile:
+                    wfile.write(line + "\n")
+                    if self.durability == "always":
+                        wfile.flush()
+                        os.fsync(wfile.fileno())
+        if self.durability == "none":
+            return
+        # A new file is only found again once its directory entry is
+        # on disk as well.
+        synced = (path.parent,) if created else ()
+        with phase("storage"), span("storage.sync", file=path.name):
+            if self.durability == "batched":
+                group_commit().commit(path, *synced)
+            else:
+                for directory in synced:
+                    sync_path(directory)
+
+    def appended(self, task: str) -> None:
+        threshold = auto_compact_bytes()
+        path = self._finished_path(task)
+        if threshold and path.stat().st_size >= threshold:
+            compact_task(self.project, task, cold_cutoff())
+
+    def _pooled_files(self) -> dict[str, Path] | None:
+        """The finished-timer files by task if they are large enough to be
+        parsed on a process pool, otherwise None"""
+        files = {
+            path.stem: path
+            for path in self.project.finished_timers_path.iterdir()
+        }
+        total = sum(path.stat().st_size for path in files.values())
+        if not parallel.use_pool(total, self.jobs) or self._pending_files():
+            return None
+        self.bytes_read += total
+        return files
+
+    def _pending_files(self) -> list[tuple[str, Path]]:
+        """Timings of an interrupted compaction, read like live files"""
+        return [
+            (task, path)
+            for task, directory in segment_dirs(self.project).items()
+            for path in pending_files(directory)
+        ]
+
+    def _segments(self) -> list[tuple[str, Path]]:
+        """Every compacted segment, oldest first within a task"""
+        return [
+            (task, path)
+            for task, directory in segment_dirs(self.project).items()
+            for path in segment_files(directory)
+        ]
+
+    def _header(self, segment: Path) -> dict:
+        with phase("storage"), span("storage.read", file=segment.name):
+            return read_header(segment)
+
+    def _live_table(self) -> TimingTable:
+        """Timings not compacted into segments yet"""
+        files = self._pooled_files()
+        if files is not None:
+            with phase("parse"):
+                return parallel.task_table(files, self.jobs)
+
+        table = TimingTable()
+        finished_path = self.project.finished_timers_path
+        live = [(path.stem, path) for path in finished_path.iterdir()]
+        for task, path in live + self._pending_files():
+            lines = self._read_lines(path)
+            with phase("parse"):
+                table.add_lines(task, lines)
+        return table
+
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Compacted segments, then the live files. Segments outside
+        since..until are skipped by their header, so cold ones are only
+        decompressed when they are needed."""
+        table = TimingTable()
+        ranged = since is not None or until is not None
+        for task, segment in self._segments():
+            if ranged and not overlaps(self._header(segment), since, until):
+                continue
+            with phase("storage"), span("storage.read", file=segment.name):
+                body = read_body(segment)
+            self.bytes_read += len(body)
+            with phase("parse"):
+                table.add_lines(task, body.splitlines())
+        table.merge(self._live_table())
+        return table.between(since, until) if ranged else table
+
+    def totals(self) -> dict[str, int]:
+        files = self._pooled_files()
+        if files is not None:
+            with phase("parse"):
+                totals = parallel.task_totals(files, self.jobs)
+        else:
+            table = self._live_table()
+            with phase("aggregate"):
+                totals = task_totals(table, truncate=True)
+        # Compacted timings are summed from the segment headers.
+        for task, segment in self._segments():
+            totals[task] = (
+                totals.get(task, 0) + self._header(segment)["seconds"]
+            )
+        return totals
+
+    def intervals(self) -> Iterator[Interval]:
+        for task, segment in self._segments():
+            for line in read_body(segment).decode("utf-8").splitlines():
+                yield parse_interval(task, line)
+        finished_path = self.project.finished_timers_path
+        live = [(path.stem, path) for path in sorted(finished_path.iterdir())]
+        for task, path in live + self._pending_files():
+            for line in self._read_lines(path):
+                yield parse_interval(task, line)
+
+    def fingerprint(self) -> tuple:
+        entries = sorted(self.project.finished_timers_path.iterdir())
+        entries.extend(path for _, path in self._pending_files())
+        entries.extend(path for _, path in self._segments())
+        stats = ((str(entry), entry.stat()) for entry in entries)
+        return tuple(
+            (name, stat.st_size, stat.st_mtime_ns) for name, stat in stats
+        )
+
+    def _index_path(self, key: str) -> Path:
+        return self.project.path / "index" / f"{key}.json"
+
+    def load_index(self, key: str) -> dict | None:
+        try:
+            with open(self._index_path(key), encoding="utf-8") as rfile:
+                return json.load(rfile)
+        except FileNotFoundError:
+            return None
+
+    def save_index(self, key: str, data: dict) -> None:
+        path = self._index_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = temp_path(path)
+        with open(temp, "w", encoding="utf-8") as wfile:
+            # dumps() uses the C encoder; dump() streams in pure Python.
+            wfile.write(json.dumps(data, separators=(",", ":")))
+        os.replace(temp, path)
+
+    def delete_index(self, key: str) -> None:
+        self._index_path(key).unlink(missing_ok=True)
+
+    def index_keys(self, prefix: str) -> list[str]:
+        directory = self.project.path / "index" / prefix
+        if not directory.is_dir():
+            return []
+        return sorted(
+            f"{prefix}/{path.relative_to(directory).with_suffix('').as_posix()}"
+            for path in directory.rglob("*.json")
+        )
+
+    def index_lock(self, key: str):
+        return file_lock(self._index_path(key))
+
+
+class MemoryLabels(LabelDictionary):
+    """A label dictionary that lives only in memory"""
+
+    # pylint: disable=super-init-not-called
+    def __init__(self):
+        self.path = Path(f"<memory-{id(self)}>") / "labels.json"
+        self.labels = []
+        self.ids = {}
+        self.finished = set()
+
+    # The dictionary's own attributes are the only copy, so there is
+    # nothing to read back or save, and only threads to serialize.
+    def _lock(self):
+        return lock_for(self.path)
+
+    def _read(self) -> dict:
+        return {}
+
+    def _apply(self, data: dict) -> None:
+        pass
+
+    def _save(self, **extra) -> None:
+        pass
+
+
+class MemoryStore(TimingStore):
+    """Timings kept in a TimingTable, with running per-task totals.
+    Nothing is written anywhere; the store is gone with the process."""
+
+    def __init__(self):
+        super().__init__()
+        self._labels = MemoryLabels()
+        self._active: dict[str, list[str]] = {}
+        self._table = TimingTable()
+        self._totals: dict[str, int] = {}
+        self._indexes: dict[str, dict] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def copy_of(cls, source: TimingStore) -> MemoryStore:
+        """A memory store holding everything source holds but its indexes,
+        which are rebuilt when first needed"""
+        store = cls()
+        labels = source.labels
+        store.labels.labels = list(labels.labels)
+        store.labels.ids = dict(labels.ids)
+        store.labels.finished = set(labels.finished)
+        for task in source.active_tasks():
+            store.set_active(task, source.active(task))
+        store._table.merge(source.table())
+        store._totals = source.totals()
+        return store
+
+    @property
+    def labels(self) -> LabelDictionary:
+        return self._labels
+
+    def active(self, task: str) -> list[str]:
+        with self._lock:
+            return list(self._active.get(task, []))
+
+    def add_active(self, task: str, line: str) -> None:
+        with self._lock:
+            self._active.setdefault(task, []).append(line)
+
+    def set_active(self, task: str, lines: list[str]) -> None:
+        with self._lock:
+            if lines:
+                self._active[task] = list(lines)
+            else:
+                self._active.pop(task, None)
+
+    def active_tasks(self) -> list[str]:
+        with self._lock:
+            return list(self._active)
+
+    def append(self, task: str, line: str) -> None:
+        duration = float(line.partition(";")[0].split(":")[2])
+        with self._lock:
+            self._table.add_lines(task, [line])
+            self._totals[task] = self._totals.get(task, 0) + int(duration)
+            self._version += 1
+
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        with self._lock:
+            if since is not None or until is not None:
+                return self._table.between(since, until)
+            table = TimingTable()
+            table.merge(self._table)
+            return table
+
+    def totals(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+    def intervals(self) -> Iterator[Interval]:
+        table = self.table()
+        for row in range(len(table)):
+            yield Interval(
+                table.tasks[table.task_codes[row]],
+                table.starts[row],
+                table.ends[row],
+                table.durations[row],
+                table.users[table.user_codes[row]],
+            )
+
+    def fingerprint(self) -> tuple:
+        return (id(self), self._version)
+
+    def load_index(self, key: str) -> dict | None:
+        return self._indexes.get(key)
+
+    def save_index(self, key: str, data: dict) -> None:
+        self._indexes[key] = data
+
+    def delete_index(self, key: str) -> None:
+        self._indexes.pop(key, None)
+
+    def index_keys(self, prefix: str) -> list[str]:
+        return sorted(
+            key for key in self._indexes if key.startswith(prefix + "/")
+        )
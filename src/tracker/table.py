@@ -0,0 +1,157 @@
+"""Table module. TimingTable keeps finished timings in parallel typed columns
+with interned task and user names, instead of a tuple and a string per
+timing. The dict and list views of the older API are built on demand."""
+
+from __future__ import annotations
+from array import array
+
+
+class TimingTable:
+    """Finished timings as columns. Row i is the timing of task
+    tasks[task_codes[i]] by user users[user_codes[i]] from starts[i] to
+    ends[i], lasting durations[i] seconds."""
+
+    __slots__ = (
+        "tasks",
+        "users",
+        "task_codes",
+        "user_codes",
+        "starts",
+        "ends",
+        "durations",
+        "_task_ids",
+        "_user_ids",
+    )
+
+    def __init__(self):
+        self.tasks: list[str] = []
+        self.users: list[str] = []
+        self._task_ids: dict[str, int] = {}
+        self._user_ids: dict[str, int] = {}
+        self.task_codes = array("I")
+        self.user_codes = array("I")
+        self.starts = array("d")
+        self.ends = array("d")
+        self.durations = array("d")
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    def task_code(self, task: str) -> int:
+        """Code of a task, adding it to the table if it is new"""
+        code = self._task_ids.get(task)
+        if code is None:
+            code = self._task_ids[task] = len(self.tasks)
+            self.tasks.append(task)
+        return code
+
+    def user_code(self, user: str) -> int:
+        """Code of a user, adding it to the table if it is new"""
+        code = self._user_ids.get(user)
+        if code is None:
+            code = self._user_ids[user] = len(self.users)
+            self.users.append(user)
+        return code
+
+    def append(
+        self, task: str, start: float, end: float, duration: float, user: str
+    ) -> None:
+        """Adds one timing"""
+        self.task_codes.append(self.task_code(task))
+        self.user_codes.append(self.user_code(user))
+        self.starts.append(start)
+        self.ends.append(end)
+        self.durations.append(duration)
+
+    def add_lines(self, task: str, lines) -> None:
+        """Adds "start:end:duration[;user]" lines of one task, as str or
+        bytes"""
+        task_code = self.task_code(task)
+        user_code = self.user_code
+        for line in lines:
+            if not line:
+                continue
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            time_range, _, user = line.rstrip().partition(";")
+            start, end, duration = time_range.split(":")
+            self.task_codes.append(task_code)
+            self.user_codes.append(user_code(user))
+            self.starts.append(float(start))
+            self.ends.append(float(end))
+            self.durations.append(float(duration))
+
+    def merge(self, other: TimingTable, prefix: str = "") -> None:
+        """Appends other's timings, with prefix put before its task names"""
+        tasks = array("I", (self.task_code(prefix + t) for t in other.tasks))
+        users = array("I", (self.user_code(u) for u in other.users))
+        self.task_codes.extend(tasks[code] for code in other.task_codes)
+        self.user_codes.extend(users[code] for code in other.user_codes)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        self.durations.extend(other.durations)
+
+    def rename(self, name) -> TimingTable:
+        """Renames every task to name(task), in place; returns the table"""
+        self.tasks = [name(task) for task in self.tasks]
+        self._task_ids = {task: code for code, task in enumerate(self.tasks)}
+        return self
+
+    def between(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """A new table of the timings overlapping since..until"""
+        table = TimingTable()
+        for row in range(len(self)):
+            if since is not None and self.ends[row] < since:
+                continue
+            if until is not None and self.starts[row] > until:
+                continue
+            table.append(
+                self.tasks[self.task_codes[row]],
+                self.starts[row],
+                self.ends[row],
+                self.durations[row],
+                self.users[self.user_codes[row]],
+            )
+        return table
+
+    def details(self) -> dict[str, list[tuple[float, str]]]:
+        """The {task: [(duration, user), ...]} view"""
+        result: dict[str, list[tuple[float, str]]] = {
+            task: [] for task in self.tasks
+        }
+        rows = [result[task] for task in self.tasks]
+        users = self.users
+        for task, user, duration in zip(
+            self.task_codes, self.user_codes, self.durations
+        ):
+            rows[task].append((duration, users[user]))
+        return result
+
+    def to_dict(self) -> dict:
+        """JSON-friendly columns"""
+        return {
+            "tasks": self.tasks,
+            "users": self.users,
+            "task": self.task_codes.tolist(),
+            "user": self.user_codes.tolist(),
+            "start": self.starts.tolist(),
+            "end": self.ends.tolist(),
+            "duration": self.durations.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> TimingTable:
+        """Inverse of to_dict"""
+        table = cls()
+        for task in data["tasks"]:
+            table.task_code(task)
+        for user in data["users"]:
+            table.user_code(user)
+        table.task_codes = array("I", data["task"])
+        table.user_codes = array("I", data["user"])
+        table.starts = array("d", data["start"])
+        table.ends = array("d", data["end"])
+        table.durations = array("d", data["duration"])
+        return table
@@ -3,16 +3,43 @@
 import time
 from abc import abstractmethod, ABC
 from datetime import timedelta
+from urllib.parse import quote
 import requests
+from tracker.aggregate import task_totals
 from tracker.config import Config, Project
+from tracker.index import Interval
+from tracker.labels import LabelDictionary
+from tracker.prefix import SORTS, PrefixIndex
+from tracker.profiling import phase
+from tracker.rollup import GRANULARITIES, RollupIndex
+from tracker.stats import QuantileSketch, StatsIndex
+from tracker.store import TextStore, TimingStore
+from tracker.table import TimingTable
+from tracker.tracing import inject, span, traced
+from tracker.users import UserIndex
 
 
 def contains_invalid_char(task_name):
-    """Determines whether a character is illegal"""
-    for char in task_name:
-        if not char.isalnum():
-            return True
-    return False
+    """Determines whether a label is empty or holds a non-printable
+    character. Files are named after label ids, so anything else goes."""
+    return not task_name or not task_name.isprintable()
+
+
+def table_summary(table: TimingTable) -> dict[str, dict[str, float]]:
+    """Summary rows of a remote project's timings table"""
+    summary = {}
+    with phase("aggregate"):
+        totals = task_totals(table)
+        for task, total_time in totals.items():
+            time_str = time.strftime("%H:%M:%S", time.gmtime(total_time))
+            hrs, mins, secs = (int(x) for x in time_str.split(":"))
+            summary[task] = {
+                "hours": hrs,
+                "minutes": mins,
+                "seconds": secs,
+                "time": total_time,
+            }
+    return summary
 
 
 class TimerException(Exception):
@@ -51,99 +78,217 @@ class AbstractTimer(ABC):
         """Abstract Tasks"""
 
     @abstractmethod
-    def summary(self) -> dict[str, dict[str, float]]:
-        """Abstract Summary"""
+    def summary(
+        self,
+        prefix: str | None = None,
+        depth: int | None = None,
+        top: int | None = None,
+        sort: str | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """Gets the time of each task, optionally only of the labels under
+        prefix and rolled up to depth parts ("clientx/api" is 2 parts).
+        Given top or sort, only the first top tasks by time, name or most
+        recent stop are returned, in that order."""
 
     @abstractmethod
-    def details(self) -> dict[str, list[tuple[float, str]]]:
-        """Gets the timings and associated user for each task"""
+    def details(
+        self, since: float | None = None, until: float | None = None
+    ) -> dict[str, list[tuple[float, str]]]:
+        """Gets the timings and associated user for each task, optionally
+        only those overlapping since..until (timestamps)"""
+
+    @abstractmethod
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Gets the finished timings as a TimingTable, optionally only
+        those overlapping since..until (timestamps)"""
+
+    @abstractmethod
+    def stats(self) -> dict[str, dict[str, QuantileSketch]]:
+        """Gets a duration sketch for each task and user"""
+
+    @abstractmethod
+    def report(
+        self, by: str, first: str | None = None, last: str | None = None
+    ) -> dict[str, dict[str, dict[str, float]]]:
+        """Gets the time of each task and user per day, week or month"""
+
+    @abstractmethod
+    def user_times(self, user: str) -> dict[str, dict[str, float]]:
+        """Gets the time, count, first start and last end of each task one
+        user tracked time on"""
 
 
 class LocalTimer(AbstractTimer):
     """Local yokel timer"""
 
+    # Derived indexes updated on every stop()
+    indexes = (StatsIndex, RollupIndex, PrefixIndex, UserIndex)
+
+    def __init__(
+        self,
+        project: Project,
+        jobs: int | None = None,
+        store: TimingStore | None = None,
+    ):
+        super().__init__(project)
+        # The project's text files unless another store is given; jobs is
+        # the worker processes a text store parses with, None for all cores
+        self.store = store or TextStore(project, jobs)
+
+    @property
+    def labels(self) -> LabelDictionary:
+        """The project's label dictionary. Timer files, segments and
+        indexes are named after label ids; results use the labels."""
+        return self.store.labels
+
+    @property
+    def bytes_read(self) -> int:
+        """Bytes of timings read from storage so far"""
+        return self.store.bytes_read
+
+    def fingerprint(self) -> tuple:
+        """Changes whenever finished timings are added or compacted, so
+        results computed from them can be cached"""
+        return self.store.fingerprint()
+
+    def intervals(self):
+        """Yields every finished interval of the project"""
+        return self.store.intervals()
+
+    @traced("timer.start")
     def start(self, task: str):
         """Local start"""
         if contains_invalid_char(task):
             raise BadLabelException("Illegal character in task name.")
 
-        active_path = self.project.active_timers_path / (task + ".txt")
-        if active_path.exists():
-            if not self.project.user:
-                raise DupStartException(f'"{task}" already started.')
-            with open(active_path, "r") as fptr:
-                users = (
-                    line.strip().split(";")[1] for line in fptr.readlines()
-                )
+        task_stem = self.labels.stem(task, create=True)
+        with self.store.active_lock(task_stem):
+            running = self.store.active(task_stem)
+            if running:
+                if not self.project.user:
+                    raise DupStartException(f'"{task}" already started.')
+                users = (line.strip().split(";")[1] for line in running)
                 if self.project.user in users:
                     raise DupStartException(
                         f'"{task}" already started by user "{self.project.user}".'
                     )
-        user = "" if not self.project.user else ";" + self.project.user
-        with open(active_path, "a", encoding="utf-8") as wfile:
-            wfile.write(f"{time.time()}{user}\n")
+            user = "" if not self.project.user else ";" + self.project.user
+            self.store.add_active(task_stem, f"{time.time()}{user}")
 
+    @traced("timer.stop")
     def stop(self, task: str):
         """Local stop"""
         if contains_invalid_char(task):
             raise BadLabelException("Illegal character in task name.")
 
-        active_path = self.project.active_timers_path / (task + ".txt")
-        if not active_path.exists():
+        task_stem = self.labels.stem(task)
+        if task_stem is None:
+            raise NoStartException(f'"{task}" was never started.')
+        # Held until this user's timer is gone, so a concurrent stop of
+        # another user's timer of the task cannot write this one back.
+        with self.store.active_lock(task_stem):
+            start_time, end_time = self._stop_active(task, task_stem)
+
+        interval = Interval(
+            task_stem,
+            start_time,
+            end_time,
+            end_time - start_time,
+            self.project.user or "",
+        )
+        with phase("index"):
+            for index in self.indexes:
+                index(self).update(interval)
+        self.store.appended(task_stem)
+
+    def _stop_active(self, task: str, task_stem: str) -> tuple[float, float]:
+        """Moves this user's running timer of a task to the finished
+        timings; returns its start and end"""
+        lines = self.store.active(task_stem)
+        if not lines:
             raise NoStartException(f'"{task}" was never started.')
 
-        with open(active_path, "r", encoding="utf-8") as rfile:
-            if self.project.user:  # self is a remote-hosted local timer
-                for line in rfile.read().splitlines():
-                    timestamp, user_name = line.split(";")
-                    if user_name == self.project.user:
-                        start_time = float(timestamp)
-                        break
-                if not start_time:
-                    raise NoStartException(
-                        f'"{task}" was never started by user "{self.project.user}".'
-                    )
-            else:  # self is a pure local timer
-                start_time = float(rfile.read().rstrip())
+        remaining = []
+        if self.project.user:  # self is a remote-hosted local timer
+            start_time = None
+            for line in lines:
+                timestamp, user_name = line.split(";")
+                if start_time is None and user_name == self.project.user:
+                    start_time = float(timestamp)
+                else:
+                    remaining.append(line)
+            if start_time is None:
+                raise NoStartException(
+                    f'"{task}" was never started by user "{self.project.user}".'
+                )
+        else:  # self is a pure local timer
+            start_time = float(lines[0].rstrip())
         end_time = time.time()
 
         user = "" if not self.project.user else ";" + self.project.user
-        finished_path = self.project.finished_timers_path / (task + ".txt")
-        with open(finished_path, "a", encoding="utf-8") as wfile:
-            wfile.write(
-                f"{start_time}:{end_time}:{end_time - start_time}{user}\n"
-            )
+        self.store.append(
+            task_stem, f"{start_time}:{end_time}:{end_time - start_time}{user}"
+        )
+        self.labels.mark_finished(task_stem)
 
-        active_path.unlink()
+        # Other users' timers of the same task keep running.
+        self.store.set_active(task_stem, remaining)
+        return start_time, end_time
 
+    @traced("timer.tasks")
     def tasks(self) -> tuple[list[str], list[str]]:
-        """Local tasks"""
-        active_path = self.project.active_timers_path
-        finished_path = self.project.finished_timers_path
+        """Local tasks: the running ones from the active timers, the
+        finished ones from the label dictionary"""
+        self.labels.refresh()
         return (
-            sorted([path.stem for path in active_path.iterdir()]),
-            sorted([path.stem for path in finished_path.iterdir()]),
+            sorted(
+                self.labels.label(task) for task in self.store.active_tasks()
+            ),
+            self.labels.finished_labels(),
         )
 
-    def summary(self) -> dict[str, dict[str, float]]:
-        """Local summary"""
-        summary_dict = {}
-        finished_path = self.project.finished_timers_path
-        for task_file in finished_path.iterdir():
-            task_name = task_file.stem
-            with open(task_file, encoding="utf-8") as fptr:
-                task_total_secs = sum(
-                    int(float(line.rstrip().split(";")[0].split(":")[2]))
-                    for line in fptr
-                )
-            hrs, mins, secs = self._hrs_mins_secs(task_total_secs)
+    @traced("timer.summary")
+    def summary(
+        self,
+        prefix: str | None = None,
+        depth: int | None = None,
+        top: int | None = None,
+        sort: str | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """Local summary. Prefix, depth and top queries read the prefix
+        index, in time proportional to the subtree; only the top rows are
+        formatted."""
+        if top is not None or sort is not None:
+            if (sort or "time") not in SORTS:
+                raise TimerException(f"Cannot sort by {sort}.")
+            index = PrefixIndex(self)
+            rows = index.top(top, sort or "time", prefix, depth)
+            return self._summary_dict(rows)
+        if prefix is not None or depth is not None:
+            totals = PrefixIndex(self).totals(prefix, depth)
+            return self._summary_dict(totals.items())
+
+        totals = self.store.totals()
+        # By label, as listing the files named after labels used to be.
+        labelled = sorted(
+            (self.labels.label(task), total) for task, total in totals.items()
+        )
+        return self._summary_dict(labelled)
 
-            summary_dict[task_name] = {
-                "hours": hrs,
-                "minutes": mins,
-                "seconds": secs,
-                "time": task_total_secs,
-            }
+    def _summary_dict(self, totals) -> dict[str, dict[str, float]]:
+        """Summary rows of (label, seconds) pairs"""
+        summary_dict = {}
+        with phase("aggregate"):
+            for task_name, task_total_secs in totals:
+                hrs, mins, secs = self._hrs_mins_secs(task_total_secs)
+                summary_dict[task_name] = {
+                    "hours": hrs,
+                    "minutes": mins,
+                    "seconds": secs,
+                    "time": task_total_secs,
+                }
 
         return summary_dict
 
@@ -160,128 +305,208 @@ class LocalTimer(AbstractTimer):
         hrs += days * 24
         return hrs, mins, secs
 
-    def details(self) -> dict[str, list[tuple[float, str]]]:
-        details_dict = {}
-        finished_path = self.project.finished_timers_path
-        for task_file in finished_path.iterdir():
-            task_name = task_file.stem
-            with open(task_file, encoding="utf-8") as fptr:
-                task_details = []
-                for line in fptr:
-                    data = line.rstrip().split(";")
-                    time_range, user = (
-                        data[0],
-                        data[1] if len(data) > 1 else "",
-                    )
-                    _, _, duration = time_range.split(":")
-                    task_details.append((float(duration), user))
-            details_dict[task_name] = task_details
-        return details_dict
+    @traced("timer.table")
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Local timings table, read from the store"""
+        return self.store.table(since, until).rename(self.labels.label)
+
+    @traced("timer.details")
+    def details(
+        self, since: float | None = None, until: float | None = None
+    ) -> dict[str, list[tuple[float, str]]]:
+        return self.table(since, until).details()
+
+    @traced("timer.stats")
+    def stats(self) -> dict[str, dict[str, QuantileSketch]]:
+        """Local stats, read from the stats index"""
+        return {
+            self.labels.label(task): users
+            for task, users in StatsIndex(self).sketches().items()
+        }
+
+    @traced("timer.report")
+    def report(
+        self, by: str, first: str | None = None, last: str | None = None
+    ) -> dict[str, dict[str, dict[str, float]]]:
+        """Local report, read from the rollup index"""
+        if by not in GRANULARITIES:
+            raise TimerException(f"Cannot report by {by}.")
+        return {
+            key: {
+                self.labels.label(task): users for task, users in tasks.items()
+            }
+            for key, tasks in RollupIndex(self)
+            .buckets(by, first, last)
+            .items()
+        }
+
+    @traced("timer.user_times")
+    def user_times(self, user: str) -> dict[str, dict[str, float]]:
+        """Local per-user times, read from that user's index file only"""
+        tasks = UserIndex(self, user).tasks()
+        return dict(
+            sorted(
+                (self.labels.label(task), entry)
+                for task, entry in tasks.items()
+            )
+        )
 
 
 class RemoteTimer(AbstractTimer):
     """Server-based remote timer."""
 
-    def start(self, task: str) -> None:
-        """Remote start"""
-        print(self.project.path)
-        with open(
-            str(self.project.path) + "/remote", "r", encoding="utf-8"
-        ) as rfile:
-            params = rfile.readlines()
-            url = params[0][4:] + "/api/start"
-            # username = params[1][9:]
-            key = params[1][4:].strip()
-            payload = {"label": task, "user": self.project.user}
-            auth = requests.auth.HTTPBasicAuth(key, "")
+    def _request(self, method: str, endpoint: str, **kwargs) -> dict:
+        """Sends a request to the project's server and returns the JSON
+        response"""
+        auth = requests.auth.HTTPBasicAuth(self.project.key, "")
         try:
-            response = requests.post(url, auth=auth, data=payload, timeout=3)
+            with phase("network"), span(
+                "http.request", method=method, endpoint=endpoint
+            ):
+                kwargs.setdefault("timeout", 3)
+                response = requests.request(
+                    method,
+                    f"{self.project.url}/api/{endpoint}",
+                    auth=auth,
+                    headers=inject(),
+                    **kwargs,
+                )
         except requests.exceptions.ConnectionError:
             raise TimerException("Could not connect to remote server.")
         if not response.ok:
             raise TimerException("A request to the remote server failed.")
-        if response.json()["result"] == "error":
-            raise TimerException(response.json()["type"])
+        with phase("parse"):
+            return response.json()
 
+    @traced("timer.start")
+    def start(self, task: str) -> None:
+        """Remote start"""
+        payload = {"label": task, "user": self.project.user}
+        json = self._request("POST", "start", data=payload)
+        if json["result"] == "error":
+            raise TimerException(json["type"])
+
+    @traced("timer.stop")
     def stop(self, task: str) -> None:
         """remote stop"""
-        print(self.project.path)
-        with open(
-            str(self.project.path) + "/remote", "r", encoding="utf-8"
-        ) as rfile:
-            params = rfile.readlines()
-            url = params[0][4:] + "/api/stop"
-            key = params[1][4:].strip()
-            payload = {"label": task, "user": self.project.user}
-            auth = requests.auth.HTTPBasicAuth(key, "")
-            try:
-                response = requests.post(
-                    url, auth=auth, data=payload, timeout=3
-                )
-            except requests.exceptions.ConnectionError:
-                raise TimerException("Could not connect to remote server.")
-        if not response.ok:
-            raise TimerException("A request to the remote server failed.")
-        if response.json()["result"] == "error":
-            raise TimerException(response.json()["type"])
+        payload = {"label": task, "user": self.project.user}
+        json = self._request("POST", "stop", data=payload)
+        if json["result"] == "error":
+            raise TimerException(json["type"])
 
+    @traced("timer.tasks")
     def tasks(self) -> tuple[list[str], list[str]]:
         """Remote tasks"""
-        with open(
-            str(self.project.path) + "/remote", "r", encoding="utf-8"
-        ) as rfile:
-            params = rfile.readlines()
-            url = params[0][4:].strip() + "/api/tasks"
-            key = params[1][4:].strip()
-            auth = requests.auth.HTTPBasicAuth(key, "")
-        try:
-            response = requests.get(url, auth=auth, timeout=3)
-        except requests.exceptions.ConnectionError:
-            raise TimerException("Could not connect to remote server.")
-        if not response.ok:
-            raise Exception("A request to the remote server failed.")
-        json = response.json()
+        json = self._request("GET", "tasks")
         if json["result"] == "error":
-            raise Exception(
+            raise TimerException(
                 f"A request to the remote server failed with error: {json['type']}"
             )
         return json["active"], json["finished"]
 
-    def summary(self) -> dict[str, dict[str, float]]:
-        timings = self.details()
-        summary = {}
-        for task in timings:
-            total_time = sum(time for time, _ in timings[task])
-            time_str = time.strftime("%H:%M:%S", time.gmtime(total_time))
-            hrs, mins, secs = (int(x) for x in time_str.split(":"))
-            summary[task] = {
-                "hours": hrs,
-                "minutes": mins,
-                "seconds": secs,
-                "time": total_time,
-            }
-        return summary
+    @traced("timer.summary")
+    def summary(
+        self,
+        prefix: str | None = None,
+        depth: int | None = None,
+        top: int | None = None,
+        sort: str | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """Remote summary; prefix, depth and top queries are answered by
+        the server's prefix index, which sends only the rows asked for"""
+        query = {"prefix": prefix, "depth": depth, "top": top, "sort": sort}
+        if any(value is not None for value in query.values()):
+            json = self._request("GET", "summary", params=query)
+            if json["result"] == "error":
+                raise TimerException(
+                    f"A request to the remote server failed with error: {json['type']}"
+                )
+            return dict(json["rows"])
+        return table_summary(self.table())
+
+    @traced("timer.details")
+    def details(
+        self, since: float | None = None, until: float | None = None
+    ) -> dict[str, list[tuple[float, str]]]:
+        params = {"since": since, "until": until}
+        json = self._request("GET", "times", params=params)
+        if json["result"] == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {json['type']}"
+            )
+        return json["timings"]
 
-    def details(self) -> dict[str, list[tuple[float, str]]]:
-        key = self.project.key
-        remote = self.project.url
-        auth = requests.auth.HTTPBasicAuth(key, "")
+    @traced("timer.table")
+    def table(
+        self, since: float | None = None, until: float | None = None
+    ) -> TimingTable:
+        """Remote timings table, sent as columns"""
+        params = {"format": "table", "since": since, "until": until}
+        json = self._request("GET", "times", params=params)
+        if json["result"] == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {json['type']}"
+            )
+        return TimingTable.from_dict(json["table"])
 
-        try:
-            response = requests.get(
-                str(remote) + "/api/times", auth=auth, timeout=3
+    @traced("timer.stats")
+    def stats(self) -> dict[str, dict[str, QuantileSketch]]:
+        """Remote stats; the server sends its sketches, not intervals"""
+        json = self._request("GET", "stats")
+        if json["result"] == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {json['type']}"
             )
-        except requests.exceptions.ConnectionError:
-            raise TimerException("Could not connect to remote server.")
+        return {
+            task: {
+                user: QuantileSketch.from_dict(sketch)
+                for user, sketch in users.items()
+            }
+            for task, users in json["stats"].items()
+        }
+
+    @traced("timer.report")
+    def report(
+        self, by: str, first: str | None = None, last: str | None = None
+    ) -> dict[str, dict[str, dict[str, float]]]:
+        """Remote report"""
+        params = {"by": by, "from": first, "to": last}
+        json = self._request("GET", "report", params=params)
+        if json["result"] == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {json['type']}"
+            )
+        return json["report"]
+
+    @traced("timer.changes")
+    def changes(
+        self, since: int | None = None, timeout: float = 25.0
+    ) -> tuple[int, list[dict], bool]:
+        """(version, events, reset) of the project's start and stop events
+        after the since cursor, waiting up to timeout seconds for one.
+        Without a cursor, returns the current version to start from."""
+        params = {"since": since, "timeout": timeout}
+        json = self._request(
+            "GET", "changes", params=params, timeout=timeout + 3
+        )
+        if json["result"] == "error":
+            raise TimerException(
+                f"A request to the remote server failed with error: {json['type']}"
+            )
+        return json["version"], json["events"], json["reset"]
 
-        if not response.ok:
-            raise TimerException("A request to the remote server failed.")
-        json = response.json()
+    @traced("timer.user_times")
+    def user_times(self, user: str) -> dict[str, dict[str, float]]:
+        """Remote per-user times"""
+        endpoint = f"users/{quote(user, safe='')}/times"
+        json = self._request("GET", endpoint)
         if json["result"] == "error":
             raise TimerException(
                 f"A request to the remote server failed with error: {json['type']}"
             )
-        return json["timings"]
+        return json["times"]
 
 
 class TimerFactory:
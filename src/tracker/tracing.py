@@ -0,0 +1,135 @@
+"""Tracing module. Minimal spans with parent/child links that are written as
+JSON lines to the file named by TRACKER_TRACE. The trace is carried from
+RemoteTimer to tracker.server in the X-Tracker-Trace header."""
+
+from __future__ import annotations
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+TRACE_ENV = "TRACKER_TRACE"
+TRACE_HEADER = "X-Tracker-Trace"
+
+_current: ContextVar[Span | None] = ContextVar("tracker_span", default=None)
+_NO_SPAN = nullcontext()
+
+
+class _Exporter:
+    """Appends finished spans to a JSON-lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as wfile:
+                wfile.write(line)
+
+
+_exporter: _Exporter | None = (
+    _Exporter(os.environ[TRACE_ENV]) if os.environ.get(TRACE_ENV) else None
+)
+
+
+def configure(path: str | None) -> None:
+    """Sends spans to path from now on, or turns tracing off for None"""
+    global _exporter
+    _exporter = _Exporter(path) if path else None
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "began",
+        "token",
+    )
+
+    def __init__(self, name: str, attributes: dict, parent: str | None):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = secrets.token_hex(8)
+        current = _current.get()
+        if parent and "-" in parent:
+            self.trace_id, self.parent_id = parent.split("-", 1)
+        elif current is not None:
+            self.trace_id = current.trace_id
+            self.parent_id = current.span_id
+        else:
+            self.trace_id = secrets.token_hex(16)
+            self.parent_id = None
+        self.start = 0.0
+        self.began = 0.0
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self)
+        self.start = time.time()
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration = time.perf_counter() - self.began
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(
+                {
+                    "trace_id": self.trace_id,
+                    "span_id": self.span_id,
+                    "parent_id": self.parent_id,
+                    "name": self.name,
+                    "start": self.start,
+                    "duration": duration,
+                    "attributes": self.attributes,
+                }
+            )
+
+
+def span(name: str, parent: str | None = None, **attributes):
+    """Context manager recording a span. parent is an X-Tracker-Trace
+    header value to continue a trace from another process. Returns a
+    shared do-nothing context when tracing is off."""
+    if _exporter is None:
+        return _NO_SPAN
+    return Span(name, attributes, parent)
+
+
+def traced(name: str):
+    """Decorator recording a span around every call of a method"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _exporter is None:
+                return method(self, *args, **kwargs)
+            with Span(name, {"class": type(self).__name__}, None):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inject(headers: dict[str, str] | None = None) -> dict[str, str]:
+    """Adds the current span to outgoing HTTP headers"""
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers[TRACE_HEADER] = f"{current.trace_id}-{current.span_id}"
+    return headers
@@ -0,0 +1,59 @@
+"""Users module. The time of every (user, task), kept in one index per user
+(a file under index/users/ in a text store), so one user's report reads
+that user's index and none of the other users' timings."""
+
+from __future__ import annotations
+from tracker.index import Interval, ProjectIndex
+
+
+def user_key(user: str) -> str:
+    """Index shard name of a user; hex keeps any user name file-safe"""
+    return f"u{user.encode('utf-8').hex()}"
+
+
+def user_name(key: str) -> str:
+    """Inverse of user_key"""
+    return bytes.fromhex(key[1:]).decode("utf-8")
+
+
+def user_file(user: str) -> str:
+    """Index file name of a user's shard"""
+    return f"{user_key(user)}.json"
+
+
+class UserIndex(ProjectIndex):
+    """Per-task totals of one user (the timer's own by default):
+    {"tasks": {task: {"time": secs, "count": n, "first": ts, "last": ts}}}.
+    Intervals of other users are ignored."""
+
+    name = "users"
+
+    def __init__(self, timer, user: str | None = None):
+        super().__init__(timer)
+        if user is None:
+            user = timer.project.user or ""
+        self.user = user
+
+    def empty(self) -> dict:
+        return {"tasks": {}}
+
+    def entries(self, interval: Interval):
+        # Every user's shard is built at once; only the timer's user is
+        # read.
+        return ((user_key(interval.user), interval),)
+
+    def add(self, data: dict, interval: Interval) -> None:
+        entry = data["tasks"].setdefault(
+            interval.task,
+            {"time": 0.0, "count": 0, "first": None, "last": None},
+        )
+        entry["time"] += interval.duration
+        entry["count"] += 1
+        if entry["first"] is None or interval.start < entry["first"]:
+            entry["first"] = interval.start
+        if entry["last"] is None or interval.end > entry["last"]:
+            entry["last"] = interval.end
+
+    def tasks(self) -> dict[str, dict[str, float]]:
+        """The totals of every task the user tracked time on"""
+        return self.shard(user_key(self.user))["tasks"]
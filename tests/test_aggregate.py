@@ -0,0 +1,84 @@
+import random
+import pytest
+from tracker import aggregate
+from tracker.table import TimingTable
+
+
+@pytest.fixture(scope="function")
+def details():
+    rng = random.Random(1)
+    return {
+        f"task{task}": [
+            (rng.uniform(0, 5000), f"user{rng.randrange(5)}")
+            for _ in range(rng.randrange(0, 3000))
+        ]
+        for task in range(6)
+    }
+
+
+@pytest.fixture(scope="function")
+def table(details):
+    # Rows of different tasks are interleaved, as after a merge.
+    rows = [(task, row) for task, rows in details.items() for row in rows]
+    random.Random(2).shuffle(rows)
+    table = TimingTable()
+    for task in details:
+        table.task_code(task)
+    for task, (duration, user) in rows:
+        table.append(task, 0.0, duration, duration, user)
+    return table
+
+
+def test_task_totals_python(monkeypatch, details, table):
+    monkeypatch.setattr(aggregate, "np", None)
+    durations = {task: [d for d, _ in rows] for task, rows in details.items()}
+
+    totals = aggregate.task_totals(table, truncate=True)
+
+    assert totals == {
+        task: sum(int(d) for d in values) for task, values in durations.items()
+    }
+
+
+def test_task_totals_numpy_matches_python(monkeypatch, table):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(aggregate, "NUMPY_MIN_TIMINGS", 0)
+    vectorized = aggregate.task_totals(table, truncate=True)
+    vectorized_float = aggregate.task_totals(table)
+    monkeypatch.setattr(aggregate, "np", None)
+
+    assert vectorized == aggregate.task_totals(table, truncate=True)
+    for task, total in aggregate.task_totals(table).items():
+        assert vectorized_float[task] == pytest.approx(total)
+
+
+def test_user_totals_python(monkeypatch, table):
+    monkeypatch.setattr(aggregate, "np", None)
+    expected = {}
+    for task, rows in table.details().items():
+        entries = {}
+        for duration, user in rows:
+            entries[user] = entries.get(user, 0) + duration
+        expected[task] = (sum(duration for duration, _ in rows), entries)
+
+    totals = aggregate.user_totals(table)
+
+    assert list(totals) == list(expected)
+    for task, (task_time, entries) in expected.items():
+        assert totals[task][0] == pytest.approx(task_time)
+        assert list(totals[task][1]) == list(entries)
+
+
+def test_user_totals_numpy_matches_python(monkeypatch, table):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(aggregate, "NUMPY_MIN_TIMINGS", 0)
+    vectorized = aggregate.user_totals(table)
+    monkeypatch.setattr(aggregate, "np", None)
+    expected = aggregate.user_totals(table)
+
+    assert list(vectorized) == list(expected)
+    for task, (task_time, entries) in expected.items():
+        assert vectorized[task][0] == pytest.approx(task_time)
+        assert list(vectorized[task][1]) == list(entries)
+        for user, total in entries.items():
+            assert vectorized[task][1][user] == pytest.approx(total)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import pytest
+from pathlib import Path
+from benchmarks.load_server import ServerThread
+from tracker.asyncremote import (
+    AsyncRemoteTimer,
+    StreamTransport,
+    bounded,
+    collect_remote,
+    start_many,
+)
+from tracker.config import Config, Project
+from tracker.timer import RemoteTimer, TimerException
+
+
+class StandIn:
+    """A transport answering /api/tasks after a delay, counting how many
+    requests are in flight"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.urls = []
+
+    async def request(self, method, url, key, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        self.urls.append(url)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        body = {"result": "ok", "active": [key], "finished": []}
+        return 200, json.dumps(body).encode("utf-8")
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+@pytest.fixture(scope="function")
+def server_url(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    with ServerThread(tmp_path / "server") as thread:
+        yield thread.url
+
+
+def remote(cfg, name, url):
+    Project(name, cfg, "remote", url, "tester_chester").create()
+    return Project(name, cfg, "remote")
+
+
+def test_bounded_parallelism():
+    transport = StandIn()
+    project = Project("p", Config(base_path=Path("./.tracker_test")))
+    project.url, project.key = "http://stand.in", "k"
+    timer = AsyncRemoteTimer(project, transport)
+    calls = {str(i): timer.tasks for i in range(10)}
+
+    results, errors = asyncio.run(bounded(calls, limit=3))
+
+    assert transport.peak == 3
+    assert len(results) == 10 and not errors
+    assert transport.urls[0] == "http://stand.in/api/tasks"
+
+
+def test_collect_remote(new_config, server_url):
+    for name in ("one", "two"):
+        remote(new_config, name, server_url)
+    # A remote project whose server is not running
+    down = Project("down", new_config).path
+    (down / "finished-timers").mkdir(parents=True)
+    (down / "active-timers").mkdir()
+    (down / "remote").write_text(
+        "url:http://127.0.0.1:9\nkey:nokey\nusername:nobody\n"
+    )
+    transport = StreamTransport()
+
+    results, errors = asyncio.run(
+        collect_remote(new_config, "summary", transport=transport)
+    )
+
+    assert sorted(results) == ["one", "two"]
+    assert (
+        results["one"]
+        == RemoteTimer(Project("one", new_config, "remote")).summary()
+    )
+    assert errors == {"down": "Could not connect to remote server."}
+
+
+def test_start_many(new_config, server_url):
+    project = remote(new_config, "batch", server_url)
+    timer = AsyncRemoteTimer(project)
+
+    asyncio.run(timer.start("a"))
+    errors = asyncio.run(start_many(timer, ["a", "b", "c"], limit=2))
+    active, _ = asyncio.run(timer.tasks())
+    for task in ("a", "b", "c"):
+        asyncio.run(timer.stop(task))
+
+    assert list(errors) == ["a"]
+    assert {"a", "b", "c"} <= set(active)
+
+
+def test_server_errors(new_config, server_url):
+    timer = AsyncRemoteTimer(remote(new_config, "errs", server_url))
+
+    with pytest.raises(TimerException):
+        asyncio.run(timer.stop("never-started"))
+    with pytest.raises(TimerException):
+        asyncio.run(timer.report("year"))
+
+
+async def collect_with_broken_server(config, response):
+    async def answer(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    broken = Project("broken", config).path
+    (broken / "finished-timers").mkdir(parents=True)
+    (broken / "active-timers").mkdir()
+    (broken / "remote").write_text(
+        f"url:http://127.0.0.1:{port}\nkey:k\nusername:nobody\n"
+    )
+    async with server:
+        return await collect_remote(config, "summary")
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"",
+        b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n{"result"',
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\n{x}",
+    ],
+)
+def test_broken_responses(new_config, server_url, response):
+    remote(new_config, "one", server_url)
+
+    results, errors = asyncio.run(
+        collect_with_broken_server(new_config, response)
+    )
+
+    assert list(results) == ["one"]
+    assert errors == {"broken": "The remote server sent a broken response."}
@@ -0,0 +1,309 @@
+import os
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from zipfile import ZipFile
+from tracker import backup
+from tracker.backup import (
+    BackupException,
+    Catalog,
+    ChunkStore,
+    chunk_bytes,
+    CHUNK_MAX_SIZE,
+    COMPRESSION_METHODS,
+)
+from tracker.cli import BackupCommand, InitCommand, RestoreCommand
+from tracker.config import Config, Project
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+def test_chunk_bytes_roundtrip():
+    data = b"".join(
+        f"{i}.5:{i + 60}.5:60.0;user{i % 7}\n".encode() for i in range(20000)
+    )
+    chunks = chunk_bytes(data)
+
+    assert b"".join(chunks) == data
+    assert len(chunks) > 1
+    assert max(len(chunk) for chunk in chunks) <= CHUNK_MAX_SIZE
+
+
+def test_chunk_bytes_append_keeps_prefix():
+    data = b"".join(f"{i}:{i}:0.0\n".encode() for i in range(20000))
+    before = chunk_bytes(data)
+    after = chunk_bytes(data + b"99999:99999:0.0\n")
+
+    assert after[: len(before) - 1] == before[:-1]
+
+
+def test_dedup_backup_reuses_chunks(new_config, capsys):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    timer.stop("task1")
+    BackupCommand(new_config).run(["--dedup"])
+    BackupCommand(new_config).run(["--dedup"])
+    captured = capsys.readouterr().out.splitlines()
+
+    assert "0 new chunks" in captured[1]
+    snapshots = list((new_config.base_path / "backup/snapshots").iterdir())
+    assert len(snapshots) == 2
+
+
+def test_dedup_restore(new_config):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    timer.stop("task1")
+    BackupCommand(new_config).run(["--dedup"])
+    timer.start("task2")
+
+    RestoreCommand(new_config).run([])
+
+    assert timer.tasks() == ([], ["task1"])
+
+
+def test_verify_finds_corrupt_object(new_config):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    timer.stop("task1")
+    BackupCommand(new_config).run(["--dedup"])
+    store = ChunkStore(new_config.base_path / "backup")
+    assert store.verify() == []
+
+    victim = next(store.objects_path.glob("*/*"))
+    victim.write_bytes(b"garbage")
+
+    assert store.verify() == [victim.name]
+
+
+def test_restore_single_project(new_config):
+    InitCommand(new_config).run(["other"])
+    other = LocalTimer(new_config.current_project)
+    default = LocalTimer(Project("default", new_config))
+    default.start("task1")
+    BackupCommand(new_config).run([])
+    default.stop("task1")
+    other.start("task2")
+
+    RestoreCommand(new_config).run(["--project", "default"])
+
+    assert default.tasks() == (["task1"], [])
+    assert other.tasks() == (["task2"], [])
+    assert not list(new_config.base_path.glob(".restore-*"))
+
+
+def test_restore_keeps_project_when_swap_fails(new_config, monkeypatch):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    BackupCommand(new_config).run([])
+    timer.stop("task1")
+    rename = os.rename
+
+    def failing_rename(src, dst):
+        if Path(src).parent.name == "projects" and ".restore-" in str(src):
+            raise OSError("disk full")
+        rename(src, dst)
+
+    monkeypatch.setattr(backup.os, "rename", failing_rename)
+    with pytest.raises(OSError):
+        RestoreCommand(new_config).run([])
+
+    assert LocalTimer(new_config.current_project).tasks() == ([], ["task1"])
+    assert not list(new_config.base_path.glob(".restore-*"))
+
+
+def test_full_restore_rolls_back_when_a_swap_fails(new_config, monkeypatch):
+    InitCommand(new_config).run(["other"])
+    timers = [
+        LocalTimer(Project(name, new_config)) for name in ("default", "other")
+    ]
+    for timer in timers:
+        timer.start("task1")
+    BackupCommand(new_config).run([])
+    for timer in timers:
+        timer.stop("task1")
+    rename = os.rename
+    staged = []
+
+    def failing_rename(src, dst):
+        if Path(src).parent.name == "projects" and ".restore-" in str(src):
+            staged.append(src)
+            if len(staged) == 2:
+                raise OSError("disk full")
+        rename(src, dst)
+
+    monkeypatch.setattr(backup.os, "rename", failing_rename)
+    with pytest.raises(OSError):
+        RestoreCommand(new_config).run([])
+
+    for timer in timers:
+        assert timer.tasks() == ([], ["task1"])
+    assert not list(new_config.base_path.glob(".restore-*"))
+
+
+def test_dedup_restore_from_moved_snapshot(new_config, tmp_path):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    timer.stop("task1")
+    BackupCommand(new_config).run(["--dedup"])
+    (snapshot,) = (new_config.base_path / "backup/snapshots").iterdir()
+    moved = tmp_path / snapshot.name
+    moved.write_bytes(snapshot.read_bytes())
+    timer.start("task2")
+
+    RestoreCommand(new_config).run(["--backup", str(moved)])
+
+    assert timer.tasks() == ([], ["task1"])
+
+
+def test_restore_from_named_backup(new_config):
+    timer = LocalTimer(new_config.current_project)
+    timer.start("task1")
+    BackupCommand(new_config).run([])
+    first = max((new_config.base_path / "backup").glob("*.zip"))
+    timer.stop("task1")
+    BackupCommand(new_config).run([])
+
+    RestoreCommand(new_config).run(["--backup", first.name, "--jobs=4"])
+
+    assert timer.tasks() == (["task1"], [])
+
+
+def test_restore_unknown_project(new_config):
+    BackupCommand(new_config).run([])
+
+    with pytest.raises(BackupException):
+        RestoreCommand(new_config).run(["--project=nope"])
+
+
+@pytest.mark.parametrize("raw_copy", [True, False])
+@pytest.mark.parametrize("method", ["stored", "deflated", "bzip2", "lzma"])
+def test_parallel_compressed_backup(new_config, monkeypatch, method, raw_copy):
+    monkeypatch.setattr(backup, "RAW_COPY", raw_copy)
+    InitCommand(new_config).run(["other"])
+    for name in ("default", "other"):
+        timer = LocalTimer(Project(name, new_config))
+        timer.start(f"{name}task")
+        timer.stop(f"{name}task")
+    BackupCommand(new_config).run(["--compression", method, "--jobs=2"])
+    archive = next((new_config.base_path / "backup").glob("*.zip"))
+
+    with ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        files = [info for info in zipf.infolist() if not info.is_dir()]
+        assert {info.compress_type for info in files} == {
+            COMPRESSION_METHODS[method]
+        }
+        assert "projects/other/finished-timers/_0.txt" in zipf.namelist()
+        assert "projects/other/labels.json" in zipf.namelist()
+        assert "config" in zipf.namelist()
+
+    RestoreCommand(new_config).run([])
+    assert LocalTimer(Project("other", new_config)).tasks() == (
+        [],
+        ["othertask"],
+    )
+
+
+def test_backup_bad_level(new_config):
+    with pytest.raises(BackupException):
+        BackupCommand(new_config).run(["--compression=bzip2", "--level=0"])
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--dedup", "--compression=lzma"],
+        ["--dedup", "--level=5"],
+        ["--verify", "--dedup"],
+        ["--verify", "--prune", "--keep-daily=1"],
+    ],
+)
+def test_backup_conflicting_options(new_config, capsys, args):
+    with pytest.raises(SystemExit):
+        BackupCommand(new_config).run(args)
+
+    assert "cannot be combined" in capsys.readouterr().out
+    assert not (new_config.base_path / "backup").exists()
+
+
+def test_catalog_latest_and_names(new_config):
+    BackupCommand(new_config).run([])
+    BackupCommand(new_config).run(["--dedup"])
+    catalog = Catalog(new_config.base_path / "backup")
+
+    assert [entry["kind"] for entry in catalog.entries] == ["zip", "snapshot"]
+    assert catalog.latest()["name"].endswith("-1")
+    assert catalog.latest()["projects"] == ["default"]
+    assert len(catalog.latest()["sha256"]) == 64
+
+
+def test_catalog_rebuilds_from_existing_backups(new_config):
+    BackupCommand(new_config).run([])
+    BackupCommand(new_config).run([])
+    (new_config.base_path / "backup" / "catalog.json").unlink()
+
+    catalog = Catalog(new_config.base_path / "backup")
+
+    assert len(catalog.entries) == 2
+    assert catalog.latest()["name"].endswith("-1")
+
+
+def test_bare_prune_is_refused(new_config, capsys):
+    BackupCommand(new_config).run([])
+    BackupCommand(new_config).run([])
+
+    with pytest.raises(SystemExit):
+        BackupCommand(new_config).run(["--prune"])
+
+    assert "--keep-daily" in capsys.readouterr().out
+    assert len(Catalog(new_config.base_path / "backup").entries) == 2
+    assert len(list((new_config.base_path / "backup").glob("*.zip"))) == 2
+
+
+def test_prune_keeps_newest_per_day(new_config, capsys):
+    BackupCommand(new_config).run(["--dedup"])
+    BackupCommand(new_config).run(["--dedup"])
+    BackupCommand(new_config).run([])
+    catalog = Catalog(new_config.base_path / "backup")
+    with catalog.locked():
+        entries = catalog.entries
+        entries[0]["created"] -= 2 * 86400
+        entries[1]["created"] -= 86400
+
+        removed = catalog.prune(keep_daily=2)
+
+    assert [entry["name"] for entry in removed] == [entries[0]["name"]]
+    assert not (catalog.file_of(entries[0])).exists()
+    assert catalog.file_of(entries[1]).exists()
+    assert ChunkStore(catalog.backup_path).verify() == []
+    assert len(Catalog(catalog.backup_path).entries) == 2
+
+
+def _catalog_backups(backup_path, count):
+    catalog = Catalog(backup_path)
+    for _ in range(count):
+        with catalog.locked():
+            path = backup_path / (catalog.next_name() + ".zip")
+            with ZipFile(path, "w"):
+                pass
+            catalog.add(path)
+
+
+def test_catalog_adds_from_processes(new_config):
+    backup_path = new_config.base_path / "backup"
+    backup_path.mkdir()
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(_catalog_backups, [backup_path] * 4, [10] * 4))
+
+    entries = Catalog(backup_path).entries
+    assert len({entry["name"] for entry in entries}) == len(entries) == 40
+    assert len(list(backup_path.glob("*.zip"))) == 40
+    assert not list(backup_path.glob("*.tmp"))
@@ -266,7 +266,10 @@ def test_summary_help(monkeypatch, new_config):
 
     actual = cmd_class.help_message()
 
-    assert actual == "Usage: tracker summary"
+    assert actual == (
+        "Usage: tracker summary [--all | --depth <N> --prefix <label/>"
+        " --top <N> --sort time|name|recent]"
+    )
 
 
 def test_detail(new_config, capsys):
@@ -326,7 +329,10 @@ def test_detail_help(monkeypatch, new_config):
 
     actual = cmd_class.help_message()
 
-    assert actual == "Usage: tracker details"
+    assert actual == (
+        "Usage: tracker details [--all | --user <name>"
+        " | --from <YYYY-MM-DD> --to <YYYY-MM-DD>]"
+    )
 
 
 def test_init(new_config):
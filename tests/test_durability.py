@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+from tracker import durability
+from tracker.config import Config
+from tracker.durability import GroupCommit
+from tracker.store import TextStore
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+def test_durability_from_env(monkeypatch):
+    monkeypatch.delenv(durability.DURABILITY_ENV, raising=False)
+    assert durability.durability() == "none"
+    assert durability.durability("batched") == "batched"
+    monkeypatch.setenv(durability.DURABILITY_ENV, "always")
+    assert durability.durability("batched") == "always"
+    monkeypatch.setenv(durability.DURABILITY_ENV, "sometimes")
+    with pytest.raises(ValueError):
+        durability.durability()
+
+
+def test_group_commit_shares_syncs(monkeypatch):
+    synced = []
+
+    def slow_sync(path):
+        time.sleep(0.01)
+        synced.append(path)
+
+    monkeypatch.setattr(durability, "sync_path", slow_sync)
+    committer = GroupCommit()
+    barrier = threading.Barrier(8)
+
+    def commit():
+        barrier.wait()
+        committer.commit(Path("shared.txt"))
+
+    threads = [threading.Thread(target=commit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert committer.syncs < 8
+    assert len(synced) == committer.syncs
+
+
+def test_group_commit_retries_failed_sync(monkeypatch):
+    failures = [OSError("disk")]
+    synced = []
+
+    def flaky_sync(path):
+        if failures:
+            raise failures.pop()
+        synced.append(path)
+
+    monkeypatch.setattr(durability, "sync_path", flaky_sync)
+    committer = GroupCommit()
+    with pytest.raises(OSError):
+        committer.commit(Path("a.txt"))
+    committer.commit(Path("b.txt"))
+
+    assert synced == [Path("a.txt"), Path("b.txt")]
+
+
+@pytest.mark.parametrize("mode", durability.DURABILITY_MODES)
+def test_durable_stops(new_config, mode):
+    project = new_config.current_project
+    timer = LocalTimer(project, store=TextStore(project, durability_mode=mode))
+    for _ in range(3):
+        timer.start("a")
+        timer.stop("a")
+
+    assert len(timer.details()["a"]) == 3
+
+
+def test_unknown_durability(new_config):
+    with pytest.raises(ValueError):
+        TextStore(new_config.current_project, durability_mode="sometimes")
@@ -0,0 +1,121 @@
+import threading
+import time
+import pytest
+import requests
+from pathlib import Path
+from benchmarks.load_server import ServerThread
+from tracker.config import Config, Project
+from tracker.events import HISTORY_SIZE, EventBus
+from tracker.timer import RemoteTimer
+
+
+@pytest.fixture(scope="function")
+def remote_project(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    cfg = Config(base_path=Path("./.tracker_test"))
+    with ServerThread(tmp_path / "server") as thread:
+        Project("feed", cfg, "remote", thread.url, "tester_chester").create()
+        project = Project("feed", cfg, "remote")
+        yield project
+        project.delete()
+    cfg.delete()
+
+
+def test_publish_and_since():
+    bus = EventBus()
+    bus.publish("p", "start", task="a")
+    bus.publish("other", "start", task="b")
+
+    version, events, reset = bus.since("p", 0)
+
+    assert (version, reset) == (1, False)
+    assert events == [{"version": 1, "type": "start", "task": "a"}]
+    assert bus.since("p", 1) == (1, [], False)
+
+
+def test_since_waits_for_an_event():
+    bus = EventBus()
+    timer = threading.Timer(0.05, bus.publish, ("p", "stop"))
+    timer.start()
+
+    began = time.monotonic()
+    version, events, _ = bus.since("p", 0, timeout=5)
+
+    assert version == 1 and events[0]["type"] == "stop"
+    assert time.monotonic() - began < 1
+
+
+def test_since_resets_lost_cursor():
+    bus = EventBus()
+    for _ in range(HISTORY_SIZE + 2):
+        bus.publish("p", "start")
+
+    assert bus.since("p", 1)[2] is True
+    assert bus.since("p", 10**6)[2] is True
+    assert bus.since("p", 2)[2] is False
+
+
+def test_reads_add_no_feeds():
+    bus = EventBus()
+
+    assert bus.version("p") == 0
+    assert bus.since("p", 0, timeout=0.01) == (0, [], False)
+    assert "p" not in bus._feeds
+    threading.Timer(0.05, bus.publish, ("p", "start")).start()
+    assert bus.since("p", 0, timeout=5)[0] == 1
+
+
+@pytest.mark.parametrize("key", ["no-such-project", "..", "../feed"])
+def test_changes_of_unknown_project(remote_project, key):
+    response = requests.get(
+        f"{remote_project.url}/api/changes",
+        params={"since": 0, "timeout": 0},
+        auth=(key, ""),
+        timeout=5,
+    )
+
+    assert response.json() == {"result": "error", "type": "no_project"}
+
+
+def test_remote_long_poll(remote_project):
+    timer = RemoteTimer(remote_project)
+    cursor, events, _ = timer.changes()
+    assert events == []
+
+    threading.Timer(0.2, timer.start, ("watched",)).start()
+    version, events, reset = timer.changes(cursor, timeout=5)
+    timer.stop("watched")
+
+    assert version == cursor + 1 and not reset
+    assert events[0]["type"] == "start"
+    assert events[0]["task"] == "watched"
+    assert events[0]["user"] == "tester_chester"
+    assert timer.changes(version, timeout=5)[1][0]["type"] == "stop"
+
+
+def test_remote_event_stream(remote_project):
+    timer = RemoteTimer(remote_project)
+    cursor = timer.changes()[0]
+    timer.start("streamed")
+    timer.stop("streamed")
+
+    with requests.get(
+        f"{remote_project.url}/api/changes",
+        params={"since": cursor},
+        headers={"Accept": "text/event-stream"},
+        auth=(remote_project.key, ""),
+        stream=True,
+        timeout=5,
+    ) as response:
+        lines = []
+        for line in response.iter_lines(decode_unicode=True):
+            lines.append(line)
+            if len(lines) == 6:
+                break
+
+    assert lines[0] == f"id: {cursor + 1}"
+    assert lines[1] == "event: start"
+    assert lines[5] == "event: stop"
@@ -0,0 +1,77 @@
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from tracker.cli import DetailsCommand, SummaryCommand
+from tracker.config import Config, Project
+from tracker.fanout import collect
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    for index, name in enumerate(("alpha", "beta")):
+        generate_project(Project(name, cfg), tasks=2, intervals=50, seed=index)
+    # A remote project whose server is not running
+    remote = Project("gamma", cfg).path
+    (remote / "finished-timers").mkdir(parents=True)
+    (remote / "active-timers").mkdir()
+    (remote / "remote").write_text(
+        "url:http://127.0.0.1:9\nkey:nokey\nusername:nobody\n"
+    )
+    yield cfg
+    cfg.delete()
+
+
+def test_collect(new_config):
+    summaries, errors = collect(new_config, "summary", jobs=2)
+
+    assert sorted(summaries) == ["alpha", "beta", "default"]
+    assert (
+        summaries["alpha"]
+        == LocalTimer(Project("alpha", new_config)).summary()
+    )
+    assert list(errors) == ["gamma"]
+
+
+def test_collect_reports_corrupt_project(new_config):
+    finished = Project("beta", new_config).path / "finished-timers"
+    with sorted(finished.iterdir())[0].open("a") as timings:
+        timings.write("not:a:timing\n")
+
+    summaries, errors = collect(new_config, "summary", jobs=2)
+
+    assert sorted(summaries) == ["alpha", "default"]
+    assert sorted(errors) == ["beta", "gamma"]
+    assert errors["beta"].startswith("Could not read the project")
+
+
+def test_summary_all(new_config, capsys):
+    (new_config.base_path / "config").write_text("project_name:default")
+
+    SummaryCommand(new_config).run(["--all"])
+    lines = capsys.readouterr().out.splitlines()
+
+    assert [line.split(":")[0] for line in lines] == [
+        "alpha/task0",
+        "alpha/task1",
+        "beta/task0",
+        "beta/task1",
+        "ERROR",
+    ]
+    assert new_config.current_project.name == "default"
+    assert (
+        new_config.base_path / "config"
+    ).read_text() == "project_name:default"
+
+
+def test_details_all(new_config, capsys):
+    DetailsCommand(new_config).run(["--all"])
+    lines = capsys.readouterr().out.splitlines()
+
+    assert [line.split(":")[0] for line in lines if "/" in line] == [
+        "alpha/task0",
+        "alpha/task1",
+        "beta/task0",
+        "beta/task1",
+    ]
@@ -0,0 +1,106 @@
+import json
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tracker.config import Config
+from tracker.labels import LabelDictionary
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_project():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg.current_project
+    cfg.delete()
+
+
+def test_free_form_labels(new_project):
+    timer = LocalTimer(new_project)
+    label = "client/web: fix #12"
+
+    timer.start(label)
+    timer.stop(label)
+
+    assert timer.tasks() == ([], [label])
+    assert list(timer.summary()) == [label]
+    assert list(timer.details()) == [label]
+    assert list(timer.stats()) == [label]
+    files = [p.name for p in new_project.finished_timers_path.iterdir()]
+    assert files == ["_0.txt"]
+
+
+def test_ids_are_stable(new_project):
+    labels = LabelDictionary(new_project)
+
+    assert labels.stem("a", create=True) == "_0"
+    assert labels.stem("b", create=True) == "_1"
+    assert LabelDictionary(new_project).stem("a") == "_0"
+    assert labels.stem("missing") is None
+    assert labels.label("_1") == "b"
+
+
+def test_labels_added_elsewhere(new_project):
+    labels = LabelDictionary(new_project)
+    LabelDictionary(new_project).stem("late", create=True)
+
+    assert labels.label("_0") == "late"
+    assert labels.stem("late") == "_0"
+
+
+def _add_labels(project, labels):
+    dictionary = LabelDictionary(project)
+    return {label: dictionary.stem(label, create=True) for label in labels}
+
+
+def test_labels_added_by_processes(new_project):
+    LabelDictionary(new_project)
+    batches = [[f"p{worker}-{n}" for n in range(20)] for worker in range(4)]
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(_add_labels, [new_project] * 4, batches))
+
+    stems = [stem for result in results for stem in result.values()]
+    assert len(set(stems)) == 80
+    labels = LabelDictionary(new_project)
+    for result in results:
+        for label, stem in result.items():
+            assert labels.stem(label) == stem
+
+
+def test_refresh_without_file(new_project):
+    labels = LabelDictionary(new_project)
+    labels.stem("a", create=True)
+    (new_project.path / "labels.json").unlink()
+
+    labels.refresh()
+
+    assert labels.stem("a") is None
+    assert labels.stem("b", create=True) == "_0"
+    assert not list(new_project.path.rglob("*.lock"))
+
+
+def test_migrate_legacy_project(new_project):
+    (new_project.finished_timers_path / "old.txt").write_text("1:3:2\n")
+    (new_project.active_timers_path / "busy.txt").write_text("5\n")
+
+    timer = LocalTimer(new_project)
+
+    assert timer.tasks() == (["busy"], ["old"])
+    assert timer.summary()["old"]["time"] == 2
+    files = [p.name for p in new_project.finished_timers_path.iterdir()]
+    assert files == ["_1.txt"]
+    timer.stop("busy")
+    assert timer.tasks() == ([], ["busy", "old"])
+
+
+def test_interrupted_migration_resumes(new_project):
+    (new_project.finished_timers_path / "old.txt").write_text("1:3:2\n")
+    data = {"labels": ["old"], "finished": [0], "migrating": True}
+    (new_project.path / "labels.json").write_text(json.dumps(data))
+
+    timer = LocalTimer(new_project)
+
+    assert timer.tasks() == ([], ["old"])
+    assert (new_project.finished_timers_path / "_0.txt").exists()
+    saved = json.loads((new_project.path / "labels.json").read_text())
+    assert "migrating" not in saved
@@ -0,0 +1,62 @@
+import pytest
+from tracker.metrics import Registry
+
+
+@pytest.fixture(scope="function")
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    yield server.app.test_client()
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = registry.counter("things_total", "Things.", ("kind",))
+    counter.inc("a")
+    counter.inc("a")
+    counter.inc("b", amount=3)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE things_total counter" in lines
+    assert 'things_total{kind="a"} 2' in lines
+    assert 'things_total{kind="b"} 3' in lines
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.histogram("wait_seconds", "Waits.", buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'wait_seconds_bucket{le="1"} 2' in lines
+    assert 'wait_seconds_bucket{le="5"} 3' in lines
+    assert 'wait_seconds_bucket{le="+Inf"} 4' in lines
+    assert "wait_seconds_sum 14.5" in lines
+    assert "wait_seconds_count 4" in lines
+
+
+def test_metrics_endpoint(client):
+    key = client.post(
+        "/api/init", data={"project": "p", "username": "u"}
+    ).json["key"]
+    auth = (key, "")
+    client.post("/api/start", data={"label": "a", "user": "u"}, auth=auth)
+    client.post("/api/start", data={"label": "a", "user": "u"}, auth=auth)
+    client.post("/api/stop", data={"label": "a", "user": "u"}, auth=auth)
+    client.get("/api/times", auth=auth)
+    client.get("/api/times", auth=auth)
+
+    response = client.get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/plain"
+    assert 'tracker_errors_total{route="start",type="dup_start"}' in text
+    assert 'tracker_requests_total{route="task_times",status="200"}' in text
+    assert 'tracker_cache_requests_total{cache="timings",result="hit"}' in text
+    assert 'tracker_storage_read_bytes_count{route="stop"}' in text
+    assert 'tracker_request_duration_seconds_bucket{route="start"' in text
@@ -0,0 +1,42 @@
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from tracker import parallel
+from tracker.config import Config
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_project():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    generate_project(cfg.current_project, tasks=3, intervals=2000, users=4)
+    yield cfg.current_project
+    cfg.delete()
+
+
+def test_split_ranges_align_to_lines(tmp_path):
+    path = tmp_path / "task.txt"
+    lines = [f"{i}:{i + 1}:1.5;user{i % 3}\n".encode() for i in range(5000)]
+    path.write_bytes(b"".join(lines))
+    size = path.stat().st_size
+
+    ranges = parallel.split_ranges(path, size, 7)
+    data = path.read_bytes()
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == size
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(data[stop - 1 : stop] == b"\n" for _, stop in ranges)
+
+
+def test_pooled_matches_serial(monkeypatch, new_project):
+    serial = LocalTimer(new_project)
+    expected_summary = serial.summary()
+    expected_details = serial.details()
+
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(parallel, "MIN_RANGE_BYTES", 4096)
+    pooled = LocalTimer(new_project, jobs=3)
+
+    assert pooled.summary() == expected_summary
+    assert pooled.details() == expected_details
+    assert pooled.bytes_read == serial.bytes_read
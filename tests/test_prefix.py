@@ -0,0 +1,178 @@
+import pytest
+from pathlib import Path
+from benchmarks.load_server import ServerThread
+from tracker.cli import SummaryCommand
+from tracker.config import Config, Project
+from tracker.index import Interval
+from tracker.prefix import PrefixIndex, part_shard, split_label
+from tracker.timer import LocalTimer, RemoteTimer
+
+LABELS = {
+    "clientx/api/bugfix": 60,
+    "clientx/api/review": 30,
+    "clientx/web": 20,
+    "clientx": 5,
+    "clienty/api": 7,
+}
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+@pytest.fixture(scope="function")
+def server_url(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    with ServerThread(tmp_path / "server") as thread:
+        yield thread.url
+
+
+@pytest.fixture(scope="function")
+def timer(new_config):
+    timer = LocalTimer(new_config.current_project)
+    index = PrefixIndex(timer)
+    index.ensure_built()
+    for label, secs in LABELS.items():
+        task = timer.labels.stem(label, create=True)
+        index.update(Interval(task, 0.0, secs + 0.5, secs + 0.5, ""))
+    return timer
+
+
+def test_split_label():
+    assert split_label("clientx/api/bugfix") == ["clientx", "api", "bugfix"]
+    assert split_label("/clientx//api/") == ["clientx", "api"]
+
+
+def test_totals(timer):
+    index = PrefixIndex(timer)
+
+    assert index.totals() == dict(sorted(LABELS.items()))
+    assert index.totals(depth=1) == {"clientx": 115, "clienty": 7}
+    assert index.totals("clientx/", depth=2) == {
+        "clientx": 5,
+        "clientx/api": 90,
+        "clientx/web": 20,
+    }
+    assert index.totals("clientx/api") == {
+        "clientx/api/bugfix": 60,
+        "clientx/api/review": 30,
+    }
+    assert index.totals("nope/") == {}
+
+
+def test_queries_read_one_subtree(timer, monkeypatch):
+    index = PrefixIndex(timer)
+    index.ensure_built()
+    loaded = []
+    load_index = timer.store.load_index
+
+    def recording(key):
+        loaded.append(key)
+        return load_index(key)
+
+    monkeypatch.setattr(timer.store, "load_index", recording)
+    assert index.totals("clienty/") == {"clienty/api": 7}
+    assert loaded == ["prefix", f"prefix/{part_shard('clienty')}"]
+
+
+def test_summary_matches_index(new_config):
+    timer = LocalTimer(new_config.current_project)
+    for label in ("a/b", "a/c", "d"):
+        timer.start(label)
+        timer.stop(label)
+
+    assert (
+        LocalTimer(new_config.current_project).summary(prefix="")
+        == timer.summary()
+    )
+    assert list(timer.summary(depth=1)) == ["a", "d"]
+
+
+def test_summary_command(timer, new_config, capsys):
+    SummaryCommand(new_config).run(["--prefix", "clientx/api/"])
+    SummaryCommand(new_config).run(["--depth=1"])
+
+    assert capsys.readouterr().out.splitlines() == [
+        "clientx/api/bugfix: 00:01:00 (66.67%)",
+        "clientx/api/review: 00:00:30 (33.33%)",
+        "clientx:        00:01:55 (94.26%)",
+        "clienty:        00:00:07 (5.74%)",
+    ]
+
+
+@pytest.mark.parametrize("args", [["--depth=0"], ["--all", "--depth=1"]])
+def test_summary_command_bad_args(new_config, args):
+    with pytest.raises(SystemExit):
+        SummaryCommand(new_config).run(args)
+
+
+def test_remote_prefix_summary(new_config, server_url):
+    Project(
+        "test", new_config, "remote", server_url, "tester_chester"
+    ).create()
+    project = Project("test", new_config, "remote")
+    timer = RemoteTimer(project)
+    for label in ("clientx/api", "clientx/web", "clienty"):
+        timer.start(label)
+        timer.stop(label)
+
+    assert list(timer.summary(depth=1)) == ["clientx", "clienty"]
+    assert list(timer.summary(prefix="clientx/")) == [
+        "clientx/api",
+        "clientx/web",
+    ]
+    project.delete()
+
+
+def test_top(timer):
+    index = PrefixIndex(timer)
+
+    assert index.top(2) == [
+        ("clientx/api/bugfix", 60),
+        ("clientx/api/review", 30),
+    ]
+    assert index.top(2, "name") == [("clientx", 5), ("clientx/api/bugfix", 60)]
+    assert index.top(1, "recent", depth=1) == [("clientx", 115)]
+    assert index.top(None, "time", "clientx/", 2) == [
+        ("clientx/api", 90),
+        ("clientx/web", 20),
+        ("clientx", 5),
+    ]
+
+
+def test_top_summary_command(timer, new_config, capsys):
+    SummaryCommand(new_config).run(["--top", "2", "--sort", "recent"])
+
+    assert capsys.readouterr().out.splitlines() == [
+        "clientx/api/bugfix: 00:01:00 (66.67%)",
+        "clientx/api/review: 00:00:30 (33.33%)",
+    ]
+
+
+@pytest.mark.parametrize(
+    "args", [["--top=0"], ["--sort=size"], ["--all", "--top=1"]]
+)
+def test_top_summary_command_bad_args(new_config, args):
+    with pytest.raises(SystemExit):
+        SummaryCommand(new_config).run(args)
+
+
+def test_remote_top_summary(new_config, server_url):
+    Project(
+        "test", new_config, "remote", server_url, "tester_chester"
+    ).create()
+    project = Project("test", new_config, "remote")
+    timer = RemoteTimer(project)
+    for label in ("b", "a", "c"):
+        timer.start(label)
+        timer.stop(label)
+
+    assert list(timer.summary(top=2, sort="recent")) == ["c", "a"]
+    assert list(timer.summary(top=1, sort="name")) == ["a"]
+    project.delete()
@@ -0,0 +1,67 @@
+import json
+import time
+import pstats
+import pytest
+from pathlib import Path
+from tracker.cli import CLI, StartCommand, StopCommand
+from tracker.config import Config
+from tracker.profiling import Profiler, phase, profile_path
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+def test_phase_is_noop_when_not_profiling():
+    with phase("storage"):
+        pass
+    assert phase("storage") is phase("parse")
+
+
+def test_profile_path(monkeypatch):
+    monkeypatch.delenv("TRACKER_PROFILE", raising=False)
+    assert profile_path(["summary"]) == (None, ["summary"])
+    assert profile_path(["--profile", "summary"]) == (
+        "tracker.prof",
+        ["summary"],
+    )
+    assert profile_path(["--profile=out.prof", "summary"]) == (
+        "out.prof",
+        ["summary"],
+    )
+    monkeypatch.setenv("TRACKER_PROFILE", "env.prof")
+    assert profile_path(["summary"]) == ("env.prof", ["summary"])
+
+
+def test_profiler_records_phases(tmp_path):
+    profiler = Profiler(tmp_path / "out.prof")
+    profiler.start()
+    with phase("storage"):
+        sum(range(1000))
+    profiler.stop()
+
+    phases = json.loads((tmp_path / "out.prof.phases.json").read_text())
+    assert "storage" in phases["phases"]
+    assert phases["wall"] >= phases["phases"]["storage"]
+    pstats.Stats(str(tmp_path / "out.prof"))
+
+
+def test_cli_profile_flag(monkeypatch, new_config, tmp_path, capsys):
+    StartCommand(new_config).run(["test"])
+    time.sleep(1)
+    StopCommand(new_config).run(["test"])
+    cli = CLI()
+    cli.config = new_config
+    path = tmp_path / "summary.prof"
+    monkeypatch.setattr(
+        "tracker.cli.argv", ["tracker", f"--profile={path}", "summary"]
+    )
+
+    cli.run()
+
+    assert "test:" in capsys.readouterr().out.splitlines()[-1]
+    phases = json.loads(Path(str(path) + ".phases.json").read_text())
+    assert {"storage", "parse", "aggregate", "render"} <= set(phases["phases"])
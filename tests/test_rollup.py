@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime
+from pathlib import Path
+from tracker.config import Config
+from tracker.index import Interval
+from tracker.rollup import RollupIndex, split
+from tracker.timer import LocalTimer, TimerException
+
+
+@pytest.fixture(scope="function")
+def new_project():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg.current_project
+    cfg.delete()
+
+
+def stamp(*args):
+    return datetime(*args).timestamp()
+
+
+def test_split_across_midnight():
+    parts = split(stamp(2023, 10, 31, 23, 0), stamp(2023, 11, 1, 1, 30), "day")
+
+    assert parts == [("2023-10-31", 3600.0), ("2023-11-01", 5400.0)]
+
+
+def test_split_weeks_and_months():
+    start, end = stamp(2023, 12, 30, 12), stamp(2024, 1, 2, 12)
+
+    assert split(start, end, "week") == [
+        ("2023-W52", stamp(2024, 1, 1) - start),
+        ("2024-W01", end - stamp(2024, 1, 1)),
+    ]
+    assert split(start, end, "month") == [
+        ("2023-12", stamp(2024, 1, 1) - start),
+        ("2024-01", end - stamp(2024, 1, 1)),
+    ]
+
+
+def test_rollup_index(new_project):
+    timer = LocalTimer(new_project)
+    index = RollupIndex(timer)
+    shards = {}
+    start, end = stamp(2023, 10, 31, 22), stamp(2023, 11, 1, 2)
+    for interval in (
+        Interval("a", start, end, end - start, "ann"),
+        Interval("a", start, start + 60, 60, "bob"),
+    ):
+        for shard, item in index.entries(interval):
+            index.add(shards.setdefault(shard, index.empty()), item)
+
+    assert shards["day/2023-10-31"] == {"a": {"ann": 7200.0, "bob": 60.0}}
+    assert shards["day/2023-11-01"] == {"a": {"ann": 7200.0}}
+    assert shards["month/2023-11"] == {"a": {"ann": 7200.0}}
+
+
+def test_report_updated_on_stop(new_project):
+    timer = LocalTimer(new_project)
+    for task in ("a", "b", "a"):
+        timer.start(task)
+        timer.stop(task)
+
+    report = timer.report("month")
+    (bucket,) = report
+
+    assert bucket == datetime.now().strftime("%Y-%m")
+    assert sorted(report[bucket]) == ["a", "b"]
+    assert timer.report("day", first="9999-01-01") == {}
+    with pytest.raises(TimerException):
+        timer.report("year")
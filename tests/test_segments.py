@@ -0,0 +1,236 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import zlib
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from tracker.cli import CompactCommand
+from tracker import segments
+from tracker.config import Config
+from tracker.segments import (
+    AUTO_COMPACT_ENV,
+    compact,
+    compact_task,
+    pending_files,
+    read_header,
+    segment_dirs,
+    segment_files,
+)
+from tracker.stats import StatsIndex
+from tracker.store import TextStore
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    generate_project(cfg.current_project, tasks=3, intervals=200, users=3)
+    yield cfg
+    cfg.delete()
+
+
+def test_compact_keeps_results(new_config):
+    project = new_config.current_project
+    timer = LocalTimer(project)
+    before = (timer.summary(), timer.details(), timer.tasks())
+
+    segments = compact(project)
+    timer.start("task0")
+    timer.stop("task0")
+    compacted = LocalTimer(project)
+
+    assert len(segments) == 3
+    assert compacted.tasks() == before[2]
+    summary = compacted.summary()
+    assert summary["task1"] == before[0]["task1"]
+    assert summary["task0"]["time"] >= before[0]["task0"]["time"]
+    details = compacted.details()
+    assert details["task2"] == before[1]["task2"]
+    assert details["task0"][:-1] == before[1]["task0"]
+
+
+def test_segment_header(new_config):
+    project = new_config.current_project
+    lines = (project.finished_timers_path / "_1.txt").read_text()
+    durations = [
+        float(line.split(";")[0].split(":")[2]) for line in lines.split()
+    ]
+
+    compact(project)
+    header = read_header(segment_files(segment_dirs(project)["_1"])[0])
+
+    assert header["task"] == "_1"
+    assert header["count"] == len(durations)
+    assert header["seconds"] == sum(int(d) for d in durations)
+    assert sum(header["users"].values()) == pytest.approx(sum(durations))
+    assert header["first"] < header["last"]
+
+
+def test_summary_reads_headers_only(new_config):
+    project = new_config.current_project
+    compact(project)
+    timer = LocalTimer(project)
+
+    timer.summary()
+
+    # Only the segment headers and the empty live files were read.
+    assert timer.bytes_read == 0
+
+
+def test_indexes_rebuild_from_segments(new_config):
+    project = new_config.current_project
+    compact(project)
+
+    stats = LocalTimer(project).stats()
+
+    assert sum(s.count for s in stats["task0"].values()) == 200
+    assert list(StatsIndex(LocalTimer(project)).sketches()) == [
+        "_0",
+        "_1",
+        "_2",
+    ]
+
+
+def test_auto_compact(monkeypatch, new_config):
+    project = new_config.current_project
+    monkeypatch.setenv(AUTO_COMPACT_ENV, "1")
+    timer = LocalTimer(project)
+
+    timer.start("fresh")
+    timer.stop("fresh")
+
+    assert (project.finished_timers_path / "_3.txt").stat().st_size == 0
+    assert len(segment_files(segment_dirs(project)["_3"])) == 1
+
+
+def test_compact_command(new_config, capsys):
+    CompactCommand(new_config).run(["--min-size", "999999999"])
+    CompactCommand(new_config).run([])
+
+    assert capsys.readouterr().out.splitlines() == [
+        "Compacted 0 segment(s).",
+        "Compacted 3 segment(s).",
+    ]
+
+
+def test_cold_tier(monkeypatch, new_config):
+    project = new_config.current_project
+    timer = LocalTimer(project)
+    summary, details = timer.summary(), timer.details()
+    cutoff = time.time() - 180 * 86400
+
+    compact(project, cold_before=cutoff)
+    names = [p.name for p in segment_files(segment_dirs(project)["_0"])]
+    headers = [
+        read_header(p) for p in segment_files(segment_dirs(project)["_0"])
+    ]
+
+    assert names == ["000000-0.seg", "000000-1.seg"]
+    assert headers[0]["compression"] == "zlib" and headers[0]["last"] < cutoff
+    assert headers[1]["compression"] is None
+    assert LocalTimer(project).summary() == summary
+    assert LocalTimer(project).details() == details
+
+    decompressed = []
+    real_decompress = zlib.decompress
+    monkeypatch.setattr(
+        zlib,
+        "decompress",
+        lambda data: decompressed.append(1) or real_decompress(data),
+    )
+    recent = LocalTimer(project).details(since=cutoff)
+    assert not decompressed
+    assert 0 < sum(map(len, recent.values())) < 600
+    LocalTimer(project).details(until=cutoff)
+    assert len(decompressed) == 3
+
+
+def test_freeze_existing_segments(new_config):
+    project = new_config.current_project
+    details = LocalTimer(project).details()
+    compact(project)
+
+    frozen = compact(project, cold_before=time.time() + 1)
+
+    assert len(frozen) == 3
+    assert all(read_header(p)["compression"] == "zlib" for p in frozen)
+    assert LocalTimer(project).details() == details
+
+
+def test_crash_before_pending_removed(monkeypatch, new_config):
+    project = new_config.current_project
+    summary, details = (
+        LocalTimer(project).summary(),
+        LocalTimer(project).details(),
+    )
+    cutoff = time.time() - 180 * 86400
+    real_unlink = Path.unlink
+
+    def crash(path, *args, **kwargs):
+        if path.suffix == ".pending":
+            raise OSError("crash")
+        real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", crash)
+    with pytest.raises(OSError):
+        compact(project, cold_before=cutoff)
+    monkeypatch.undo()
+    directory = segment_dirs(project)["_0"]
+
+    assert list(directory.glob("*.pending"))
+    assert not pending_files(directory)
+    assert LocalTimer(project).summary() == summary
+    assert LocalTimer(project).details() == details
+    compact(project)
+    assert not list(directory.glob("*.pending"))
+    assert len(segment_files(directory)) == 2
+    assert LocalTimer(project).details() == details
+
+
+def test_crash_between_segments(monkeypatch, new_config):
+    project = new_config.current_project
+    details = LocalTimer(project).details()
+    cutoff = time.time() - 180 * 86400
+    real_write = segments._write_segment
+
+    def crash(path, header, body):
+        if path.stem.endswith("-1"):
+            raise OSError("crash")
+        real_write(path, header, body)
+
+    monkeypatch.setattr(segments, "_write_segment", crash)
+    with pytest.raises(OSError):
+        compact(project, cold_before=cutoff)
+    monkeypatch.undo()
+    directory = segment_dirs(project)["_0"]
+
+    assert sorted(p.name for p in directory.iterdir()) == [
+        "000000-0.seg",
+        "000000.pending",
+    ]
+    assert not segment_files(directory)
+    assert LocalTimer(project).details() == details
+    compact(project)
+    assert [p.name for p in segment_files(directory)] == ["000000.seg"]
+    assert LocalTimer(project).details() == details
+
+
+def _append_many(project, count):
+    store = TextStore(project)
+    for i in range(count):
+        store.append("_0", f"{i}:{i + 1}:1.0;worker")
+
+
+def test_compact_while_other_processes_stop(new_config):
+    project = new_config.current_project
+    before = len(LocalTimer(project).details()["task0"])
+
+    with ProcessPoolExecutor(max_workers=3) as pool:
+        appends = [pool.submit(_append_many, project, 300) for _ in range(3)]
+        while not all(future.done() for future in appends):
+            compact_task(project, "_0")
+        for future in appends:
+            future.result()
+    compact_task(project, "_0")
+
+    assert len(LocalTimer(project).details()["task0"]) == before + 900
@@ -0,0 +1,177 @@
+import random
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from tracker.config import Config
+from tracker.stats import (
+    RELATIVE_ACCURACY,
+    QuantileSketch,
+    StatsIndex,
+    merged,
+)
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def new_project():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg.current_project
+    cfg.delete()
+
+
+@pytest.fixture(scope="function")
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    yield server.app.test_client()
+
+
+def exact_quantile(values, fraction):
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def test_sketch_quantiles_within_accuracy():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(6, 1.5) for _ in range(5000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.count == len(values)
+    assert sketch.mean() == pytest.approx(sum(values) / len(values))
+    for fraction in (0.0, 0.5, 0.9, 0.99, 1.0):
+        expected = exact_quantile(values, fraction)
+        assert sketch.quantile(fraction) == pytest.approx(
+            expected, rel=RELATIVE_ACCURACY
+        )
+
+
+def test_sketch_merge_and_round_trip():
+    rng = random.Random(4)
+    shards = [[rng.uniform(0, 9000) for _ in range(700)] for _ in range(3)]
+    sketches = []
+    whole = QuantileSketch()
+    for shard in shards:
+        sketch = QuantileSketch()
+        for value in shard:
+            sketch.add(value)
+            whole.add(value)
+        sketches.append(QuantileSketch.from_dict(sketch.to_dict()))
+
+    combined = merged(sketches)
+
+    assert combined.bins == whole.bins
+    assert combined.count == whole.count
+    assert combined.quantile(0.9) == whole.quantile(0.9)
+    assert sum(combined.histogram()) == combined.count
+
+
+def test_stop_updates_index(new_project):
+    timer = LocalTimer(new_project)
+    for task in ("a", "a", "b"):
+        timer.start(task)
+        timer.stop(task)
+
+    stats = timer.stats()
+    assert {task: users[""].count for task, users in stats.items()} == {
+        "a": 2,
+        "b": 1,
+    }
+
+    StatsIndex(timer).path.unlink()
+    timer.start("a")
+    timer.stop("a")
+    assert timer.stats()["a"][""].count == 3
+
+
+def test_stop_rewrites_one_shard(new_project):
+    timer = LocalTimer(new_project)
+    for task in ("a", "b"):
+        timer.start(task)
+        timer.stop(task)
+    shards = new_project.path / "index" / "stats"
+    before = {path: path.stat().st_ino for path in shards.rglob("*.json")}
+
+    timer.start("b")
+    timer.stop("b")
+
+    changed = [
+        path
+        for path in shards.rglob("*.json")
+        if path.stat().st_ino != before.get(path)
+    ]
+    assert [path.parent.name for path in changed] == ["_1"]
+
+
+def test_rebuild_serializes_each_sketch_once(new_project, monkeypatch):
+    generate_project(new_project, tasks=3, intervals=200, users=2)
+    timer = LocalTimer(new_project)
+    encoded = []
+    to_dict = QuantileSketch.to_dict
+    monkeypatch.setattr(
+        QuantileSketch,
+        "to_dict",
+        lambda sketch: encoded.append(1) or to_dict(sketch),
+    )
+
+    StatsIndex(timer).ensure_built()
+
+    assert len(encoded) == len(StatsIndex(timer).shard_names()) == 6
+
+
+def test_multi_user_stop_keeps_other_timers(client):
+    key = client.post(
+        "/api/init", data={"project": "p", "username": "u"}
+    ).json["key"]
+    auth = (key, "")
+    for user in ("ann", "bob"):
+        client.post("/api/start", data={"label": "a", "user": user}, auth=auth)
+    client.post("/api/stop", data={"label": "a", "user": "ann"}, auth=auth)
+    stopped = client.post(
+        "/api/stop", data={"label": "a", "user": "bob"}, auth=auth
+    )
+
+    stats = client.get("/api/stats", auth=auth).json
+
+    assert stopped.json == {"result": "ok"}
+    assert stats["result"] == "ok"
+    assert sorted(stats["stats"]["a"]) == ["ann", "bob"]
+    assert stats["stats"]["a"]["ann"]["count"] == 1
+
+
+def test_stats_command(capsys):
+    from tracker.cli import StatsCommand
+
+    cfg = Config(base_path=Path("./.tracker_test"))
+    timer = LocalTimer(cfg.current_project)
+    timer.start("a")
+    timer.stop("a")
+    _ = capsys.readouterr()
+
+    StatsCommand(cfg).run(["--histogram"])
+    cfg.delete()
+    lines = capsys.readouterr().out.splitlines()
+
+    assert lines[0].startswith("a:")
+    assert "p90 00:00:00" in lines[0]
+    assert lines[1].split() == [
+        "<1m",
+        "1",
+        "<5m",
+        "0",
+        "<15m",
+        "0",
+        "<30m",
+        "0",
+        "<1h",
+        "0",
+        "<2h",
+        "0",
+        "<4h",
+        "0",
+        ">=4h",
+        "0",
+    ]
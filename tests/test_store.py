@@ -0,0 +1,156 @@
+import base64
+import threading
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from tracker.config import Config, Project
+from tracker.store import MemoryStore, TextStore
+from tracker.timer import DupStartException, LocalTimer, NoStartException
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+def test_capabilities(new_config):
+    text = TextStore(new_config.current_project)
+    assert text.capabilities == {"persistent", "ranges"}
+    assert not MemoryStore.capabilities
+
+
+@pytest.mark.parametrize(
+    "capabilities", [{"persistent"}, {"persistent", "ranges"}]
+)
+def test_server_ranged_times(monkeypatch, tmp_path, capabilities):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    monkeypatch.setattr(server, "timings_cache", type(server.timings_cache)())
+    monkeypatch.setattr(TextStore, "capabilities", frozenset(capabilities))
+    client = server.app.test_client()
+    key = client.post(
+        "/api/init", data={"project": "ranged", "username": "ann"}
+    ).json["key"]
+    token = base64.b64encode(f"{key}:".encode()).decode()
+    auth = {"Authorization": f"Basic {token}"}
+    form = {"label": "a", "user": "ann"}
+    client.post("/api/start", data=form, headers=auth)
+    client.post("/api/stop", data=form, headers=auth)
+
+    inside = client.get("/api/times?since=0", headers=auth).json
+    outside = client.get("/api/times?until=1", headers=auth).json
+
+    assert list(inside["timings"]) == ["a"]
+    assert outside["timings"] == {}
+    # Without "ranges", filtering the cached table beats rereading.
+    assert (key in server.timings_cache) == ("ranges" not in capabilities)
+
+
+def test_memory_timer_writes_nothing(new_config):
+    project = new_config.current_project
+    timer = LocalTimer(project, store=MemoryStore())
+    timer.start("a/b")
+    timer.start("c")
+    timer.stop("a/b")
+
+    assert timer.tasks() == (["c"], ["a/b"])
+    assert list(timer.details()) == ["a/b"]
+    assert list(timer.summary(depth=1)) == ["a"]
+    assert list(timer.stats()) == ["a/b"]
+    assert list(timer.user_times("")) == ["a/b"]
+    assert not any(project.finished_timers_path.iterdir())
+    assert not any(project.active_timers_path.iterdir())
+    assert not (project.path / "labels.json").exists()
+    assert timer.bytes_read == 0
+
+
+def test_memory_timer_errors(new_config):
+    timer = LocalTimer(new_config.current_project, store=MemoryStore())
+    timer.start("a")
+    with pytest.raises(DupStartException):
+        timer.start("a")
+    with pytest.raises(NoStartException):
+        timer.stop("b")
+
+
+def test_memory_copy_matches_text(new_config):
+    project = new_config.current_project
+    generate_project(project, tasks=4, intervals=50, users=3)
+    text = LocalTimer(project)
+    memory = LocalTimer(project, store=MemoryStore.copy_of(text.store))
+
+    assert memory.summary() == text.summary()
+    assert memory.details() == text.details()
+    assert memory.tasks() == text.tasks()
+    assert memory.report("day") == text.report("day")
+    assert memory.user_times("user1") == text.user_times("user1")
+
+    cutoff = sorted(text.table().starts)[25]
+    assert memory.details(since=cutoff) == text.details(since=cutoff)
+
+
+def test_memory_totals_follow_appends(new_config):
+    store = MemoryStore()
+    timer = LocalTimer(new_config.current_project, store=store)
+    fingerprint = timer.fingerprint()
+    store.append("_0", "0:90.5:90.5")
+    store.append("_0", "100:130.9:30.9")
+
+    assert store.totals() == {"_0": 120}
+    assert len(store.table()) == 2
+    assert timer.fingerprint() != fingerprint
+
+
+def test_server_memory_storage(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    monkeypatch.setattr(server, "SERVER_STORAGE", "memory")
+    monkeypatch.setattr(server, "memory_stores", {})
+    client = server.app.test_client()
+    key = client.post(
+        "/api/init", data={"project": "mem", "username": "ann"}
+    ).json["key"]
+    token = base64.b64encode(f"{key}:".encode()).decode()
+    auth = {"Authorization": f"Basic {token}"}
+    form = {"label": "a", "user": "ann"}
+    client.post("/api/start", data=form, headers=auth)
+    client.post("/api/stop", data=form, headers=auth)
+
+    times = client.get("/api/times", headers=auth).json
+    assert list(times["timings"]) == ["a"]
+    assert key in server.memory_stores
+    finished = tmp_path / "server" / "projects" / key / "finished-timers"
+    assert not any(finished.iterdir())
+
+
+@pytest.mark.parametrize("kind", ["text", "memory"])
+def test_users_stop_one_task_at_once(new_config, kind):
+    users = [f"user{i}" for i in range(8)]
+    shared = MemoryStore()
+    timers = []
+    for user in users:
+        project = Project("default", new_config, user=user)
+        store = shared if kind == "memory" else TextStore(project)
+        timers.append(LocalTimer(project, store=store))
+    for timer in timers:
+        timer.start("a")
+    barrier = threading.Barrier(len(timers))
+
+    def stop(timer):
+        barrier.wait()
+        timer.stop("a")
+
+    threads = [threading.Thread(target=stop, args=(t,)) for t in timers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert timers[0].tasks() == ([], ["a"])
+    assert sorted(user for _, user in timers[0].details()["a"]) == users
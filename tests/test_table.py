@@ -0,0 +1,42 @@
+import pickle
+from tracker.table import TimingTable
+
+
+def test_add_lines_and_details():
+    table = TimingTable()
+    table.add_lines("a", ["1.0:3.5:2.5;ann", "4:5:1;bob", ""])
+    table.add_lines("b", [b"10:20:10;ann"])
+    table.add_lines("c", [])
+
+    assert len(table) == 3
+    assert table.users == ["ann", "bob"]
+    assert list(table.starts) == [1.0, 4.0, 10.0]
+    assert table.details() == {
+        "a": [(2.5, "ann"), (1.0, "bob")],
+        "b": [(10.0, "ann")],
+        "c": [],
+    }
+
+
+def test_merge_with_prefix():
+    first, second = TimingTable(), TimingTable()
+    first.add_lines("a", ["0:1:1;ann"])
+    second.add_lines("a", ["0:2:2;bob", "0:3:3;ann"])
+
+    first.merge(second, prefix="other/")
+
+    assert first.tasks == ["a", "other/a"]
+    assert first.details()["other/a"] == [(2.0, "bob"), (3.0, "ann")]
+
+
+def test_round_trips():
+    table = TimingTable()
+    table.add_lines("a", ["0:1:1", "1:3:2"])
+
+    for copy in (
+        TimingTable.from_dict(table.to_dict()),
+        pickle.loads(pickle.dumps(table)),
+    ):
+        assert copy.to_dict() == table.to_dict()
+        copy.append("b", 5, 6, 1, "")
+        assert copy.tasks == ["a", "b"] and copy.users == [""]
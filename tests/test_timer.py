@@ -46,13 +46,13 @@ def test_fail_nostart_on_stop(new_project):
 def test_fail_start_illegal_task(new_project):
     t = LocalTimer(new_project)
     with pytest.raises(TimerException):
-        t.start("bogus/task")
+        t.start("bogus\ntask")
 
 
 def test_fail_stop_illegal_task(new_project):
     t = LocalTimer(new_project)
     with pytest.raises(TimerException):
-        t.stop("bogus/task")
+        t.stop("bogus\ntask")
 
 
 def test_tasks(new_project):
@@ -91,13 +91,13 @@ def test_remote_nostart_on_stop(new_remote_project):
 def test_remote_start_illegal_task(new_remote_project):
     t = RemoteTimer(new_remote_project)
     with pytest.raises(TimerException):
-        t.start("bogus/task")
+        t.start("bogus\ntask")
 
 
 def test_remote_stop_illegal_task(new_remote_project):
     t = RemoteTimer(new_remote_project)
     with pytest.raises(TimerException):
-        t.stop("bogus/task")
+        t.stop("bogus\ntask")
 
 
 def test_remote_tasks(new_remote_project):
@@ -0,0 +1,77 @@
+import json
+import pytest
+from pathlib import Path
+from tracker import tracing
+from tracker.config import Config
+from tracker.timer import LocalTimer
+
+
+@pytest.fixture(scope="function")
+def trace_file(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracing.configure(str(path))
+    yield path
+    tracing.configure(None)
+
+
+@pytest.fixture(scope="function")
+def new_project():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg.current_project
+    cfg.delete()
+
+
+def read_spans(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_no_spans_when_disabled(new_project):
+    LocalTimer(new_project).tasks()
+    assert tracing.inject() == {}
+
+
+def test_nested_spans(trace_file):
+    with tracing.span("outer") as outer:
+        headers = tracing.inject({"Accept": "x"})
+        with tracing.span("inner", size=3):
+            pass
+
+    inner, outer_record = read_spans(trace_file)
+    assert inner["name"] == "inner"
+    assert inner["attributes"] == {"size": 3}
+    assert inner["parent_id"] == outer_record["span_id"]
+    assert inner["trace_id"] == outer_record["trace_id"]
+    assert outer_record["parent_id"] is None
+    assert headers == {
+        "Accept": "x",
+        tracing.TRACE_HEADER: f"{outer.trace_id}-{outer.span_id}",
+    }
+
+
+def test_timer_spans(trace_file, new_project):
+    timer = LocalTimer(new_project)
+    timer.start("task1")
+    timer.stop("task1")
+    trace_file.unlink()
+
+    timer.summary()
+
+    read, summary = read_spans(trace_file)
+    assert summary["name"] == "timer.summary"
+    assert read["name"] == "storage.read"
+    assert read["parent_id"] == summary["span_id"]
+
+
+def test_server_continues_trace(trace_file, monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    client = server.app.test_client()
+
+    client.get("/", headers={tracing.TRACE_HEADER: "abc-def"})
+
+    (record,) = read_spans(trace_file)
+    assert record["name"] == "server.index"
+    assert record["trace_id"] == "abc"
+    assert record["parent_id"] == "def"
@@ -0,0 +1,120 @@
+import pytest
+from pathlib import Path
+from benchmarks.generate import generate_project
+from benchmarks.load_server import ServerThread
+from tracker.cli import DetailsCommand
+from tracker.config import Config, Project
+from tracker.timer import LocalTimer, RemoteTimer
+from tracker.users import UserIndex, user_file
+
+
+@pytest.fixture(scope="function")
+def new_config():
+    cfg = Config(base_path=Path("./.tracker_test"))
+    yield cfg
+    cfg.delete()
+
+
+@pytest.fixture(scope="function")
+def server_url(monkeypatch, tmp_path):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    from tracker.server import __main__ as server
+
+    monkeypatch.setattr(server, "SERVER_CONFIG_ROOT", tmp_path / "server")
+    with ServerThread(tmp_path / "server") as thread:
+        yield thread.url
+
+
+@pytest.fixture(scope="function")
+def shared(new_config):
+    generate_project(
+        new_config.current_project, tasks=3, intervals=100, users=4
+    )
+    return new_config.current_project
+
+
+def test_user_file():
+    assert user_file("") == "u.json"
+    assert user_file("a/b") == "u612f62.json"
+
+
+def test_user_times_match_table(shared):
+    timer = LocalTimer(shared)
+    table = timer.table()
+    times = timer.user_times("user1")
+
+    user = table.users.index("user1")
+    for task, entry in times.items():
+        code = table.tasks.index(task)
+        durations = [
+            table.durations[row]
+            for row in range(len(table))
+            if table.task_codes[row] == code and table.user_codes[row] == user
+        ]
+        assert entry["time"] == pytest.approx(sum(durations))
+        assert entry["count"] == len(durations)
+    assert LocalTimer(shared).user_times("nobody") == {}
+
+
+def test_user_index_read_alone(shared):
+    timer = LocalTimer(shared)
+    timer.user_times("user2")
+    timer = LocalTimer(shared)
+
+    timer.user_times("user2")
+
+    assert timer.bytes_read == 0
+    users_path = shared.path / "index" / "users"
+    # One rebuild writes every user's shard.
+    assert (users_path / user_file("user2")).exists()
+    assert (users_path / user_file("user3")).exists()
+
+
+def test_stop_updates_user_index(new_config):
+    project = Project("default", new_config, user="ann")
+    timer = LocalTimer(project)
+    timer.start("a")
+    timer.stop("a")
+    timer.start("a")
+    timer.stop("a")
+
+    assert UserIndex(timer).tasks()["_0"]["count"] == 2
+    assert timer.user_times("ann")["a"]["count"] == 2
+    assert timer.user_times("bob") == {}
+
+
+def test_details_user_command(shared, new_config, capsys):
+    DetailsCommand(new_config).run(["--user", "nobody"])
+    DetailsCommand(new_config).run(["--user=user0"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'No time tracked by "nobody" yet.'
+    assert lines[1].startswith("user0:   ")
+    assert [line.split()[0] for line in lines[2:]] == [
+        "task0",
+        "task1",
+        "task2",
+    ]
+
+
+def test_details_user_bad_args(new_config):
+    with pytest.raises(SystemExit):
+        DetailsCommand(new_config).run(["--user=a", "--all"])
+
+
+def test_remote_user_times(new_config, server_url):
+    Project(
+        "test", new_config, "remote", server_url, "tester/chester"
+    ).create()
+    project = Project("test", new_config, "remote")
+    timer = RemoteTimer(project)
+    assert timer.user_times("tester/chester") == {}
+    timer.start("a")
+    timer.stop("a")
+    timer.start("a")
+    timer.stop("a")
+
+    assert list(timer.user_times("tester/chester")) == ["a"]
+    assert timer.user_times("tester/chester")["a"]["count"] == 2
+    assert timer.user_times("someone") == {}
+    project.delete()